@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from api.services.audio_compression_service import compress_audio
+from api.services.stream_upload_service import open_stream_upload
 import json
 
 audio_compression_bp = Blueprint('audio_compression', __name__)
@@ -13,7 +14,7 @@ def compress_audio_endpoint():
     - Target file size (MB)
     - Target audio quality
     """
-    file = request.files.get('file')
+    file = request.files.get('file') or open_stream_upload(request.form.get('upload_id'))
     input_body_raw = request.form.get('input_body')
     
     if not file:
@@ -1,12 +1,13 @@
 from flask import Blueprint, request, jsonify
 from api.services.audio_to_audio_service import convert_audio_to_audio
+from api.services.stream_upload_service import open_stream_upload
 import json
 
 audio_to_audio_bp = Blueprint('audio_to_audio', __name__)
 
 @audio_to_audio_bp.route('/audio-to-audio', methods=['POST'])
 def audio_to_audio():
-    file = request.files.get('file')
+    file = request.files.get('file') or open_stream_upload(request.form.get('upload_id'))
     input_body_raw = request.form.get('input_body')
     
     if not file:
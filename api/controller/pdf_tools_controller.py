@@ -245,7 +245,9 @@ def upload_pdf_endpoint():
 def get_pdf_pages_endpoint(file_id):
     """Get PDF pages information with previews"""
     try:
-        result = get_pdf_pages(file_id)
+        # Optional ?grayscale=true for smaller, faster single-channel previews
+        grayscale = request.args.get('grayscale', 'false').lower() == 'true'
+        result = get_pdf_pages(file_id, grayscale=grayscale)
         return jsonify(result)
         
     except Exception as e:
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from api.services.video_compression_service import compress_video
+from api.services.stream_upload_service import open_stream_upload
 import json
 
 video_compression_bp = Blueprint('video_compression', __name__)
@@ -17,7 +18,7 @@ def compress_video_endpoint():
     - Two-pass encoding
     - Web optimization
     """
-    file = request.files.get('file')
+    file = request.files.get('file') or open_stream_upload(request.form.get('upload_id'))
     input_body_raw = request.form.get('input_body')
     
     if not file:
@@ -84,6 +85,12 @@ def compress_video_endpoint():
             'message': f'Failed to parse input_body: {str(e)}'
         }), 400
         
+    except ValueError as e:
+        return jsonify({
+            'error': 'Invalid options',
+            'message': str(e)
+        }), 400
+        
     except Exception as e:
         return jsonify({
             'error': 'Compression failed',
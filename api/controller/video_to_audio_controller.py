@@ -1,12 +1,13 @@
 from flask import Blueprint, request, jsonify
 from api.services.video_to_audio_service import convert_video_to_audio
+from api.services.stream_upload_service import open_stream_upload
 import json
 
 video_to_audio_bp = Blueprint('video_to_audio', __name__)
 
 @video_to_audio_bp.route('/video-to-audio', methods=['POST'])
 def video_to_audio():
-    file = request.files.get('file')
+    file = request.files.get('file') or open_stream_upload(request.form.get('upload_id'))
     input_body_raw = request.form.get('input_body')
     
     if not file:
@@ -52,6 +53,12 @@ def video_to_audio():
             'message': f'Failed to parse input_body: {str(e)}'
         }), 400
         
+    except ValueError as e:
+        return jsonify({
+            'error': 'Invalid options',
+            'message': str(e)
+        }), 400
+        
     except Exception as e:
         return jsonify({
             'error': 'Conversion failed',
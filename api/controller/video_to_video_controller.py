@@ -1,12 +1,13 @@
 from flask import Blueprint, request, jsonify
 from api.services.video_to_video_service import convert_video
+from api.services.stream_upload_service import open_stream_upload
 import json
 
 video_to_video_bp = Blueprint('video_to_video', __name__)
 
 @video_to_video_bp.route('/video-to-video', methods=['POST'])
 def video_to_video():
-    file = request.files.get('file')
+    file = request.files.get('file') or open_stream_upload(request.form.get('upload_id'))
     input_body_raw = request.form.get('input_body')
     
     if not file:
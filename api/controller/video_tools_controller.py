@@ -1,12 +1,13 @@
 from flask import Blueprint, request, jsonify
 from api.services.video_tools_service import crop_video, trim_video
+from api.services.stream_upload_service import open_stream_upload
 import json
 
 video_tools_bp = Blueprint('video_tools', __name__)
 
 @video_tools_bp.route('/crop-video', methods=['POST'])
 def crop_video_endpoint():
-    file = request.files.get('file')
+    file = request.files.get('file') or open_stream_upload(request.form.get('upload_id'))
     input_body_raw = request.form.get('input_body')
     
     if not file:
@@ -60,7 +61,7 @@ def crop_video_endpoint():
 
 @video_tools_bp.route('/trim-video', methods=['POST'])
 def trim_video_endpoint():
-    file = request.files.get('file')
+    file = request.files.get('file') or open_stream_upload(request.form.get('upload_id'))
     input_body_raw = request.form.get('input_body')
     
     if not file:
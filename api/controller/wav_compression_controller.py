@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from api.services.wav_compression_service import compress_wav
+from api.services.wav_compression_service import compress_wav_batch
 import os
 
 wav_compression_bp = Blueprint('wav_compression', __name__)
@@ -10,7 +10,7 @@ def compress_wav_endpoint():
     Compress WAV audio files
     
     Request:
-    - file: WAV file to compress
+    - file: WAV file to compress (repeat the field to compress several in one go)
     - input_body: JSON with compression options
     
     Example input_body:
@@ -39,8 +39,8 @@ def compress_wav_endpoint():
         if 'file' not in request.files:
             return jsonify({'success': False, 'error': 'No file provided'}), 400
         
-        file = request.files['file']
-        if file.filename == '':
+        files = request.files.getlist('file')
+        if any(file.filename == '' for file in files):
             return jsonify({'success': False, 'error': 'No file selected'}), 400
         
         # Get input_body from form data
@@ -49,7 +49,7 @@ def compress_wav_endpoint():
         input_body = json.loads(input_body_str)
         
         # Call the compression service
-        result = compress_wav(file, input_body)
+        result = compress_wav_batch(files, input_body)
         
         return jsonify(result)
         
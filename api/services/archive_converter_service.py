@@ -12,6 +12,14 @@ from pathlib import Path
 EXPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'static', 'archives')
 SUPPORTED_FORMATS = ['7z', 'gz', 'rar', 'tar', 'targz', 'tgz', 'zip']
 
+# Files whose content is already compressed; deflating them again costs CPU for no gain
+STORED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.avif',
+    '.mp3', '.aac', '.ogg', '.m4a', '.mp4', '.mkv', '.webm', '.mov', '.avi',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar',
+    '.pdf', '.docx', '.xlsx', '.pptx', '.odt', '.epub',
+}
+
 # Ensure export directory exists
 os.makedirs(EXPORT_DIR, exist_ok=True)
 
@@ -217,7 +225,10 @@ def create_archive(source_dir, output_path, format_type, options):
                     for file in files:
                         file_path = os.path.join(root, file)
                         arcname = os.path.relpath(file_path, source_dir)
-                        zip_ref.write(file_path, arcname)
+                        if os.path.splitext(file)[1].lower() in STORED_EXTENSIONS:
+                            zip_ref.write(file_path, arcname, compress_type=zipfile.ZIP_STORED)
+                        else:
+                            zip_ref.write(file_path, arcname)
         
         elif format_type == 'tar':
             with tarfile.open(output_path, 'w') as tar_ref:
@@ -1,12 +1,29 @@
 import os
 import uuid
-import tempfile
 import json
 import fitz  # PyMuPDF
-from PIL import Image
-import io
 import base64
+import io
 import zipfile
+import shutil
+import sys
+import logging
+import mmap
+import multiprocessing
+import threading
+import time
+import atexit
+import zlib
+import re
+import struct
+import tempfile
+from collections import namedtuple, defaultdict, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat, groupby
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
 
 EXPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'static', 'documents')
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'static', 'uploads')
@@ -18,6 +35,115 @@ os.makedirs(PREVIEW_DIR, exist_ok=True)
 
 SUPPORTED_PDF_FORMATS = ['pdf']
 
+# EXPORT_DIR with a trailing separator, for building output paths in per-page loops
+EXPORT_PREFIX = EXPORT_DIR.rstrip(os.sep) + os.sep
+
+# Split outputs are written in batches of at most this many files / bytes
+WRITE_BATCH_SIZE = 64
+WRITE_BATCH_BYTES = 64 * 1024 * 1024
+
+# PyMuPDF save options for each merge compression level
+MERGE_SAVE_OPTIONS = {
+    'none': {},
+    'low': {'garbage': 1, 'deflate': True},
+    'medium': {'garbage': 2, 'deflate': True},
+    'high': {'garbage': 4, 'deflate': True, 'deflate_images': True, 'deflate_fonts': True, 'clean': True}
+}
+
+# PyMuPDF save options for each page extraction compression level (unknown levels save uncompressed)
+EXTRACT_SAVE_OPTIONS = {
+    'none': {},
+    'low': {'garbage': 1, 'deflate': True},
+    'medium': {'garbage': 2, 'deflate': True},
+    'high': {'garbage': 3, 'deflate': True, 'clean': True}
+}
+
+# Save options for a merge of several uploaded files: drop duplicated fonts/images
+# and unused objects coming from the different inputs
+MERGE_PDFS_SAVE_OPTIONS = {'garbage': 4, 'deflate': True, 'clean': True}
+
+# Save options for tools that rewrite a whole document (flatten, rotate, unlock)
+REWRITE_SAVE_OPTIONS = {'garbage': 3, 'deflate': True}
+
+# Save options after select() on a source document: garbage collection drops the
+# objects only the removed pages used (level 3's duplicate merging costs more
+# than it saves here)
+SELECT_SAVE_OPTIONS = {'garbage': 2}
+
+# Uploads up to this size are validated in memory before anything is written;
+# larger ones are streamed to disk first so they are never held in memory whole
+UPLOAD_IN_MEMORY_MAX_BYTES = 100 * 1024 * 1024
+
+# Copy buffer for uploads streamed to disk (Werkzeug's default is 16 KiB)
+UPLOAD_COPY_BUFFER_SIZE = 8 * 1024 * 1024
+
+# One comma-separated part of a page ranges string: "N-M" or "N", surrounded by optional whitespace
+PAGE_RANGE_PATTERN = re.compile(r'(?:^|,)\s*(?:(\+?\d+)\s*-\s*(\+?\d+)|(\+?\d+))\s*(?=,|$)')
+
+# Lightweight records for split outputs, converted to dicts only for the response
+SplitOutput = namedtuple('SplitOutput', 'filename download_url pages file_id')
+ConfigSplitOutput = namedtuple('ConfigSplitOutput', 'filename download_url title pages config_id')
+
+# ASCII characters removed from split configuration titles when building filenames
+TITLE_DELETE_TABLE = str.maketrans('', '', ''.join(
+    chr(c) for c in range(128) if not (chr(c).isalnum() or chr(c) in ' -_')
+))
+
+# Worker processes used for per-page preview rendering and image extraction
+PROCESS_POOL_MAX_WORKERS = min(os.cpu_count() or 1, 4)
+
+# Documents with at least this many pages are processed in the worker pool
+PREVIEW_PARALLEL_MIN_PAGES = 8
+IMAGE_EXTRACT_PARALLEL_MIN_PAGES = 8
+
+# Image extraction hands out smaller page blocks so pages with many images do not
+# leave other workers idle, and finished blocks reach the ZIP while others still run
+IMAGE_EXTRACT_BLOCKS_PER_WORKER = 4
+
+# Shared process pool, created on first use. Workers are started from a clean
+# forkserver (spawn where that is unavailable) rather than forked from a
+# multi-threaded server process that may hold _doc_cache or logging locks
+PROCESS_POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+_process_executor = None
+_process_executor_lock = threading.Lock()
+
+# Threads that encode and write preview PNGs while the next page renders (none on a
+# single CPU, where there is nothing to overlap), and how many rendered previews may
+# wait for them before rendering pauses
+PREVIEW_WRITE_WORKERS = 2 if (os.cpu_count() or 1) > 1 else 0
+PREVIEW_WRITE_QUEUE = 4
+_preview_write_executor = None
+
+# Longest side of a preview image in pixels (normal pages stay at half size, large
+# formats such as posters are scaled further down)
+PREVIEW_MAX_SIDE = 450
+
+# Half-size preview matrix shared by every page that is not scaled further down
+PREVIEW_MATRIX = fitz.Matrix(0.5, 0.5)
+
+# zlib level for preview PNGs (fastest; previews are throwaway thumbnails)
+PREVIEW_PNG_COMPRESS_LEVEL = 1
+
+# PNG color types for opaque gray and RGB pixmaps (alpha samples are premultiplied,
+# which PNG does not support, so those go through PyMuPDF's encoder)
+PNG_COLOR_TYPES = {1: 0, 3: 2}
+
+# Pillow's libjpeg-turbo encoder is several times faster than Pixmap.tobytes("jpeg")
+# at the same quality, so extracted images are encoded from the raw samples with it
+PIL_PIXMAP_MODES = {(1, 0): 'L', (3, 0): 'RGB', (4, 1): 'RGBa'}
+
+# JPEG settings for re-encoded images: quality 85 with optimized Huffman tables and
+# progressive scans makes files about half the size of quality 95
+EXTRACT_JPEG_SAVE_OPTIONS = {'quality': 85, 'optimize': True, 'progressive': True}
+
+# Parsed uploads kept open between requests (at most this many, for this many seconds)
+DOC_CACHE_MAX_SIZE = 64
+DOC_CACHE_TTL = 300
+
+# file_id -> (document, upload mtime, time it was released), oldest release first
+_doc_cache = OrderedDict()
+_doc_cache_lock = threading.Lock()
+
 def upload_pdf_file(file):
     """Upload PDF file and return file_id for processing"""
     try:
@@ -27,12 +153,26 @@ def upload_pdf_file(file):
         # Save uploaded file
         filename = f"{file_id}.pdf"
         file_path = os.path.join(UPLOAD_DIR, filename)
-        file.save(file_path)
         
-        # Validate PDF by opening it
-        pdf_doc = fitz.open(file_path)
-        total_pages = len(pdf_doc)
-        pdf_doc.close()
+        # Find the upload size without reading it
+        file.stream.seek(0, os.SEEK_END)
+        upload_size = file.stream.tell()
+        file.stream.seek(0)
+        
+        if upload_size <= UPLOAD_IN_MEMORY_MAX_BYTES:
+            # Validate PDF from memory and only write it once it opened
+            pdf_bytes = file.read()
+            pdf_doc = fitz.open(stream=pdf_bytes, filetype='pdf')
+            total_pages = len(pdf_doc)
+            pdf_doc.close()
+            _write_file_bytes(file_path, pdf_bytes)
+        else:
+            file.save(file_path, buffer_size=UPLOAD_COPY_BUFFER_SIZE)
+            
+            # Validate PDF by opening it
+            pdf_doc = fitz.open(file_path)
+            total_pages = len(pdf_doc)
+            pdf_doc.close()
         
         return {
             'success': True,
@@ -51,8 +191,228 @@ def upload_pdf_file(file):
                 pass
         raise Exception(f"PDF upload failed: {str(e)}")
 
-def get_pdf_pages(file_id):
-    """Get PDF pages information with previews"""
+def _open_upload_document(file_path):
+    """Open an uploaded PDF from a read-only memory map of the file"""
+    # Memory-map the upload so PyMuPDF reads straight from the page cache
+    with open(file_path, 'rb') as f:
+        source_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return fitz.open(stream=memoryview(source_map), filetype='pdf')
+    except Exception:
+        source_map.close()
+        raise
+
+def _close_upload_document(pdf_doc):
+    """Close a document from _open_upload_document and unmap its file"""
+    # The document keeps the memoryview it was opened from in .stream
+    source_view = pdf_doc.stream
+    pdf_doc.close()
+    if isinstance(source_view, memoryview):
+        source_map = source_view.obj
+        source_view.release()
+        source_map.close()
+
+def _checkout_document(file_id):
+    """Take an upload's parsed document from the cache, or open it; the caller owns it until released"""
+    file_path = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
+    mtime = os.stat(file_path).st_mtime
+    
+    # Documents are not shared: a checked-out document is removed from the cache, so a
+    # concurrent request for the same file simply opens its own copy
+    with _doc_cache_lock:
+        entry = _doc_cache.pop(file_id, None)
+    if entry is not None:
+        pdf_doc, cached_mtime, released_at = entry
+        if cached_mtime == mtime and time.monotonic() - released_at < DOC_CACHE_TTL:
+            return pdf_doc
+        _close_upload_document(pdf_doc)
+    
+    return _open_upload_document(file_path)
+
+def _release_document(file_id, pdf_doc):
+    """Return a checked-out document to the cache, closing whatever no longer fits"""
+    try:
+        mtime = os.stat(os.path.join(UPLOAD_DIR, f"{file_id}.pdf")).st_mtime
+    except OSError:
+        # The upload is gone; do not keep its document around
+        _close_upload_document(pdf_doc)
+        return
+    
+    now = time.monotonic()
+    evicted = []
+    with _doc_cache_lock:
+        # Another request may have released a copy of the same file meanwhile
+        previous = _doc_cache.pop(file_id, None)
+        if previous is not None:
+            evicted.append(previous[0])
+        _doc_cache[file_id] = (pdf_doc, mtime, now)
+        
+        # Drop expired entries (oldest first) and anything over the size limit
+        while _doc_cache:
+            oldest_id, (oldest_doc, _, released_at) = next(iter(_doc_cache.items()))
+            if len(_doc_cache) <= DOC_CACHE_MAX_SIZE and now - released_at < DOC_CACHE_TTL:
+                break
+            del _doc_cache[oldest_id]
+            evicted.append(oldest_doc)
+    
+    for evicted_doc in evicted:
+        _close_upload_document(evicted_doc)
+
+@atexit.register
+def _close_document_cache():
+    """Close every cached document when the process exits"""
+    with _doc_cache_lock:
+        entries = list(_doc_cache.values())
+        _doc_cache.clear()
+    for pdf_doc, _, _ in entries:
+        _close_upload_document(pdf_doc)
+
+def _png_chunk(chunk_type, data):
+    """Build one PNG chunk (length, type, data, CRC)"""
+    return (struct.pack('>I', len(data)) + chunk_type + data
+            + struct.pack('>I', zlib.crc32(chunk_type + data)))
+
+def _save_preview_png(pix, preview_path):
+    """Write a pixmap as PNG using fast zlib compression"""
+    # Written under a temporary name and renamed into place, so a concurrent request
+    # or a worker killed mid-write never leaves a truncated preview at preview_path
+    temp_path = f"{preview_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        color_type = None if pix.alpha else PNG_COLOR_TYPES.get(pix.n)
+        if color_type is None:
+            # Alpha or unusual colorspace: let PyMuPDF's own encoder handle it
+            pix.save(temp_path, output='png')
+        else:
+            # Raw scanlines, each prefixed with filter type 0 (none)
+            stride = pix.stride
+            samples = pix.samples_mv
+            raw = b''.join([b'\x00' + samples[y * stride:(y + 1) * stride] for y in range(pix.height)])
+            
+            header = struct.pack('>IIBBBBB', pix.width, pix.height, 8, color_type, 0, 0, 0)
+            with open(temp_path, 'wb') as f:
+                f.write(b'\x89PNG\r\n\x1a\n')
+                f.write(_png_chunk(b'IHDR', header))
+                f.write(_png_chunk(b'IDAT', zlib.compress(raw, PREVIEW_PNG_COMPRESS_LEVEL)))
+                f.write(_png_chunk(b'IEND', b''))
+        os.replace(temp_path, preview_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+@lru_cache(maxsize=512)
+def _preview_size(preview_path):
+    """Read (width, height) from the header of a preview PNG already on disk"""
+    with open(preview_path, 'rb') as f:
+        header = f.read(24)
+    if len(header) < 24 or not header.startswith(b'\x89PNG'):
+        raise ValueError(f"Incomplete preview image: {preview_path}")
+    return struct.unpack('>II', header[16:24])
+
+def _render_preview_pages(pdf_doc, file_id, page_numbers, grayscale=False, background_writes=True):
+    """Render and save preview images for the given 0-based page numbers (PNG writes in the write threads when background_writes is set)"""
+    pages = []
+    
+    # Grayscale previews are separate files so both variants can be cached
+    preview_suffix = '_gray' if grayscale else ''
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+    
+    # Preview writes still running in the write threads
+    pending_saves = deque()
+    
+    for page_num in page_numbers:
+        preview_filename = f"{file_id}_page_{page_num + 1}{preview_suffix}.png"
+        preview_path = os.path.join(PREVIEW_DIR, preview_filename)
+        
+        # Uploaded files never change, and previews only appear at their final path once
+        # fully written, so a preview already on disk is reused as is
+        size = None
+        if os.path.exists(preview_path):
+            try:
+                size = _preview_size(preview_path)
+            except (OSError, ValueError):
+                size = None
+        
+        if size is None:
+            page = pdf_doc[page_num]
+            
+            # Create preview image: half size, but never longer than PREVIEW_MAX_SIDE pixels
+            page_rect = page.rect
+            scale = min(0.5, PREVIEW_MAX_SIDE / max(page_rect.width, page_rect.height, 1))
+            mat = PREVIEW_MATRIX if scale == 0.5 else fitz.Matrix(scale, scale)  # Scale down for preview
+            pix = page.get_pixmap(matrix=mat, colorspace=colorspace, alpha=False)
+            
+            # Save preview image in the background and go on rendering the next page
+            if PREVIEW_WRITE_WORKERS and background_writes:
+                if len(pending_saves) >= PREVIEW_WRITE_QUEUE:
+                    pending_saves.popleft().result()
+                pending_saves.append(_get_preview_write_executor().submit(_save_preview_png, pix, preview_path))
+            else:
+                _save_preview_png(pix, preview_path)
+            size = (pix.width, pix.height)
+        
+        # Create preview URL
+        preview_url = f"/static/previews/{preview_filename}"
+        
+        pages.append({
+            'page_number': page_num + 1,
+            'preview_url': preview_url,
+            'width': size[0],
+            'height': size[1]
+        })
+    
+    # Every preview must be on disk before its URL is returned
+    for pending_save in pending_saves:
+        pending_save.result()
+    
+    return pages
+
+def _get_preview_write_executor():
+    """Return the preview write thread pool, starting it on first use"""
+    global _preview_write_executor
+    if _preview_write_executor is None:
+        _preview_write_executor = ThreadPoolExecutor(max_workers=PREVIEW_WRITE_WORKERS)
+    return _preview_write_executor
+
+def _render_preview_chunk(file_path, file_id, page_numbers, grayscale=False):
+    """Worker entry point: render previews for a block of pages from its own document handle"""
+    # fitz documents cannot be shared between processes, so each worker opens the file itself
+    pdf_doc = fitz.open(file_path)
+    try:
+        # Write synchronously: the workers already run in parallel, and a write thread pool
+        # inherited from the server process would have no threads in a forked child
+        return _render_preview_pages(pdf_doc, file_id, page_numbers, grayscale, background_writes=False)
+    finally:
+        pdf_doc.close()
+
+def _get_process_executor():
+    """Return the shared process pool, starting it on first use"""
+    global _process_executor
+    with _process_executor_lock:
+        if _process_executor is None:
+            _process_executor = ProcessPoolExecutor(
+                max_workers=PROCESS_POOL_MAX_WORKERS,
+                mp_context=multiprocessing.get_context(PROCESS_POOL_START_METHOD))
+        return _process_executor
+
+def _discard_process_executor(executor):
+    """Drop a broken process pool (e.g. a worker killed for memory) so the next call starts a new one"""
+    global _process_executor
+    with _process_executor_lock:
+        if _process_executor is executor:
+            _process_executor = None
+    executor.shutdown(wait=False)
+
+def _page_chunks(total_pages, blocks_per_worker=1):
+    """Split the page numbers into contiguous blocks, blocks_per_worker for each pool worker"""
+    chunk_size = -(-total_pages // (PROCESS_POOL_MAX_WORKERS * blocks_per_worker))
+    return [range(start, min(start + chunk_size, total_pages))
+            for start in range(0, total_pages, chunk_size)]
+
+def get_pdf_pages(file_id, grayscale=False):
+    """Get PDF pages information with previews (single-channel gray previews when grayscale is set)"""
     try:
         # Construct file path
         filename = f"{file_id}.pdf"
@@ -61,39 +421,30 @@ def get_pdf_pages(file_id):
         if not os.path.exists(file_path):
             raise Exception("PDF file not found")
         
-        # Open PDF
-        pdf_doc = fitz.open(file_path)
+        # Open PDF (reusing the parsed document from an earlier request when possible)
+        pdf_doc = _checkout_document(file_id)
         total_pages = len(pdf_doc)
         
-        pages = []
-        
-        for page_num in range(total_pages):
-            page = pdf_doc[page_num]
-            
-            # Create preview image
-            mat = fitz.Matrix(0.5, 0.5)  # Scale down for preview
-            pix = page.get_pixmap(matrix=mat)
-            
-            # Convert to PIL Image
-            img_data = pix.tobytes("png")
-            img = Image.open(io.BytesIO(img_data))
+        if PROCESS_POOL_MAX_WORKERS > 1 and total_pages >= PREVIEW_PARALLEL_MIN_PAGES:
+            _release_document(file_id, pdf_doc)
             
-            # Save preview image
-            preview_filename = f"{file_id}_page_{page_num + 1}.png"
-            preview_path = os.path.join(PREVIEW_DIR, preview_filename)
-            img.save(preview_path, "PNG")
-            
-            # Create preview URL
-            preview_url = f"/static/previews/{preview_filename}"
-            
-            pages.append({
-                'page_number': page_num + 1,
-                'preview_url': preview_url,
-                'width': pix.width,
-                'height': pix.height
-            })
-        
-        pdf_doc.close()
+            # One contiguous block of pages per worker; workers encode and save the
+            # images themselves so only the small page records come back
+            pages = []
+            executor = _get_process_executor()
+            try:
+                for chunk_pages in executor.map(
+                        _render_preview_chunk, repeat(file_path), repeat(file_id), _page_chunks(total_pages),
+                        repeat(grayscale)):
+                    pages.extend(chunk_pages)
+            except BrokenProcessPool:
+                _discard_process_executor(executor)
+                raise
+        else:
+            try:
+                pages = _render_preview_pages(pdf_doc, file_id, range(total_pages), grayscale)
+            finally:
+                _release_document(file_id, pdf_doc)
         
         return {
             'success': True,
@@ -107,6 +458,7 @@ def get_pdf_pages(file_id):
 
 def split_pdf_by_file_id(input_body):
     """Split PDF using file_id with enhanced split modes"""
+    pdf_doc = None
     try:
         file_id = input_body['file_id']
         split_task = input_body['tasks']['split']
@@ -126,8 +478,8 @@ def split_pdf_by_file_id(input_body):
         page_ranges = options.get('page_ranges', [])
         pages_per_file = options.get('pages_per_file', 1)
         
-        # Open PDF
-        pdf_doc = fitz.open(file_path)
+        # Open PDF (reusing the parsed document from an earlier request when possible)
+        pdf_doc = _checkout_document(file_id)
         total_pages = len(pdf_doc)
         
         output_files = []
@@ -135,15 +487,20 @@ def split_pdf_by_file_id(input_body):
         if split_mode == 'manual':
             # Manual selection - split each selected page into individual files
             if selected_pages:
+                # Pages already written in this request (a repeated page gives the same file)
+                written_pages = set()
                 for page_num in selected_pages:
                     if 1 <= page_num <= total_pages:
-                        new_doc = fitz.open()
-                        new_doc.insert_pdf(pdf_doc, from_page=page_num-1, to_page=page_num-1)
-                        
                         output_filename_gen = f"{output_filename}_page_{page_num}.pdf"
-                        output_path = os.path.join(EXPORT_DIR, output_filename_gen)
-                        new_doc.save(output_path)
-                        new_doc.close()
+                        
+                        if page_num not in written_pages:
+                            new_doc = fitz.open()
+                            new_doc.insert_pdf(pdf_doc, from_page=page_num-1, to_page=page_num-1)
+                            
+                            output_path = os.path.join(EXPORT_DIR, output_filename_gen)
+                            new_doc.save(output_path)
+                            new_doc.close()
+                            written_pages.add(page_num)
                         
                         output_files.append({
                             'filename': output_filename_gen,
@@ -176,15 +533,22 @@ def split_pdf_by_file_id(input_body):
         
         elif split_mode == 'fixed_pages':
             # Split every N pages
+            # Parts are copied out with insert_pdf: reopening the source and
+            # select()-ing a range measured slower and keeps the dropped
+            # pages' objects unless the save also runs garbage collection
             for i in range(0, total_pages, pages_per_file):
                 end_page = min(i + pages_per_file, total_pages)
-                new_doc = fitz.open()
-                new_doc.insert_pdf(pdf_doc, from_page=i, to_page=end_page-1)
-                
                 output_filename_gen = f"{output_filename}_part_{i//pages_per_file + 1}.pdf"
                 output_path = os.path.join(EXPORT_DIR, output_filename_gen)
-                new_doc.save(output_path)
-                new_doc.close()
+                
+                if i == 0 and end_page == total_pages:
+                    # The only part holds every page: reuse the uploaded file as is
+                    shutil.copyfile(file_path, output_path)
+                else:
+                    new_doc = fitz.open()
+                    new_doc.insert_pdf(pdf_doc, from_page=i, to_page=end_page-1)
+                    new_doc.save(output_path)
+                    new_doc.close()
                 
                 output_files.append({
                     'filename': output_filename_gen,
@@ -203,15 +567,18 @@ def split_pdf_by_file_id(input_body):
                 else:  # Even pages
                     even_pages.append(page_num - 1)  # Convert to 0-based index
             
+            # Serialize the source once; both outputs are pruned copies of it
+            pdf_bytes = pdf_doc.tobytes()
+            
             # Create odd pages PDF
             if odd_pages:
-                odd_doc = fitz.open()
-                for page_index in odd_pages:
-                    odd_doc.insert_pdf(pdf_doc, from_page=page_index, to_page=page_index)
+                # Reopen the serialized source and keep only the odd pages
+                odd_doc = fitz.open("pdf", pdf_bytes)
+                odd_doc.select(odd_pages)
                 
                 odd_filename = f"{output_filename}_odd_pages.pdf"
                 odd_path = os.path.join(EXPORT_DIR, odd_filename)
-                odd_doc.save(odd_path)
+                odd_doc.save(odd_path, garbage=1)  # Drop objects of the deselected pages
                 odd_doc.close()
                 
                 output_files.append({
@@ -222,13 +589,13 @@ def split_pdf_by_file_id(input_body):
             
             # Create even pages PDF
             if even_pages:
-                even_doc = fitz.open()
-                for page_index in even_pages:
-                    even_doc.insert_pdf(pdf_doc, from_page=page_index, to_page=page_index)
+                # Reopen the serialized source and keep only the even pages
+                even_doc = fitz.open("pdf", pdf_bytes)
+                even_doc.select(even_pages)
                 
                 even_filename = f"{output_filename}_even_pages.pdf"
                 even_path = os.path.join(EXPORT_DIR, even_filename)
-                even_doc.save(even_path)
+                even_doc.save(even_path, garbage=1)  # Drop objects of the deselected pages
                 even_doc.close()
                 
                 output_files.append({
@@ -236,18 +603,23 @@ def split_pdf_by_file_id(input_body):
                     'download_url': f'/static/documents/{even_filename}',
                     'pages': f'Even pages ({len(even_pages)} pages)'
                 })
+            
+            del pdf_bytes
         
         elif split_mode == 'split_half':
             # Split in half
             mid_point = (total_pages + 1) // 2
             
+            # Serialize the source once; each half is a pruned copy of it
+            pdf_bytes = pdf_doc.tobytes()
+            
             # First half
-            first_half_doc = fitz.open()
-            first_half_doc.insert_pdf(pdf_doc, from_page=0, to_page=mid_point-1)
+            first_half_doc = fitz.open("pdf", pdf_bytes)
+            first_half_doc.select(list(range(0, mid_point)))
             
             first_half_filename = f"{output_filename}_first_half.pdf"
             first_half_path = os.path.join(EXPORT_DIR, first_half_filename)
-            first_half_doc.save(first_half_path)
+            first_half_doc.save(first_half_path, garbage=1)
             first_half_doc.close()
             
             output_files.append({
@@ -258,12 +630,12 @@ def split_pdf_by_file_id(input_body):
             
             # Second half
             if mid_point < total_pages:
-                second_half_doc = fitz.open()
-                second_half_doc.insert_pdf(pdf_doc, from_page=mid_point, to_page=total_pages-1)
+                second_half_doc = fitz.open("pdf", pdf_bytes)
+                second_half_doc.select(list(range(mid_point, total_pages)))
                 
                 second_half_filename = f"{output_filename}_second_half.pdf"
                 second_half_path = os.path.join(EXPORT_DIR, second_half_filename)
-                second_half_doc.save(second_half_path)
+                second_half_doc.save(second_half_path, garbage=1)
                 second_half_doc.close()
                 
                 output_files.append({
@@ -271,6 +643,8 @@ def split_pdf_by_file_id(input_body):
                     'download_url': f'/static/documents/{second_half_filename}',
                     'pages': f'{mid_point+1}-{total_pages}'
                 })
+            
+            del pdf_bytes
         
         elif split_mode == 'extract_all':
             # Extract all pages as separate PDFs
@@ -289,18 +663,24 @@ def split_pdf_by_file_id(input_body):
                     'pages': f'{page_num}'
                 })
         
-        pdf_doc.close()
+        # Hand the source back to the document cache
+        _release_document(file_id, pdf_doc)
+        pdf_doc = None
         
         # Create ZIP file if multiple files
         if len(output_files) > 1:
             zip_filename = f"{output_filename}_split.zip"
             zip_path = os.path.join(EXPORT_DIR, zip_filename)
             
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            # Store entries as-is: PDF streams are already Flate-compressed
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf:
                 for output_file in output_files:
                     file_path = os.path.join(EXPORT_DIR, output_file['filename'])
-                    if os.path.exists(file_path):
+                    # Let the open inside write() detect a missing file instead of a separate stat
+                    try:
                         zipf.write(file_path, output_file['filename'])
+                    except FileNotFoundError:
+                        continue
             
             return {
                 'success': True,
@@ -320,32 +700,26 @@ def split_pdf_by_file_id(input_body):
         
     except Exception as e:
         raise Exception(f"PDF split failed: {str(e)}")
+    finally:
+        if pdf_doc is not None:
+            _release_document(file_id, pdf_doc)
 
 def parse_page_ranges(ranges_str, total_pages):
     """Parse page ranges string into list of tuples"""
     ranges = []
-    parts = ranges_str.split(',')
     
-    for part in parts:
-        part = part.strip()
-        if '-' in part:
-            # Range like "1-3"
-            start, end = part.split('-')
-            try:
-                start_page = int(start.strip())
-                end_page = int(end.strip())
-                if 1 <= start_page <= end_page <= total_pages:
-                    ranges.append((start_page, end_page))
-            except ValueError:
-                continue
-        else:
+    # One regex pass over the string; parts that are not a page or a range are skipped
+    for match in PAGE_RANGE_PATTERN.finditer(ranges_str):
+        start, end, single = match.groups()
+        if single is not None:
             # Single page like "5"
-            try:
-                page_num = int(part)
-                if 1 <= page_num <= total_pages:
-                    ranges.append((page_num, page_num))
-            except ValueError:
-                continue
+            start_page = end_page = int(single)
+        else:
+            # Range like "1-3"
+            start_page, end_page = int(start), int(end)
+        
+        if 1 <= start_page <= end_page <= total_pages:
+            ranges.append((start_page, end_page))
     
     return ranges
 
@@ -375,14 +749,12 @@ def merge_pdfs(files, input_body):
         merger = fitz.open()
         
         for pdf_file in pdf_files:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_input:
-                pdf_file.save(temp_input.name)
-                pdf_doc = fitz.open(temp_input.name)
-                merger.insert_pdf(pdf_doc)
-                pdf_doc.close()
-                os.unlink(temp_input.name)
+            # Open each upload straight from memory instead of via a temporary file
+            pdf_doc = fitz.open(stream=pdf_file.read(), filetype='pdf')
+            merger.insert_pdf(pdf_doc)
+            pdf_doc.close()
         
-        merger.save(output_path)
+        merger.save(output_path, **MERGE_PDFS_SAVE_OPTIONS)
         merger.close()
         
         return {
@@ -398,10 +770,8 @@ def merge_pdfs(files, input_body):
 
 def split_pdf(file, input_body):
     """Split PDF into multiple files"""
-    # Save uploaded file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
+    # Read the uploaded file into memory; PyMuPDF opens it from the bytes directly
+    pdf_bytes = file.read()
 
     try:
         # Validate input structure
@@ -417,7 +787,7 @@ def split_pdf(file, input_body):
         page_ranges = options.get('page_ranges', [])  # List of page ranges like [[1,3], [5,7]]
         
         # Open PDF
-        pdf_doc = fitz.open(input_path)
+        pdf_doc = fitz.open(stream=pdf_bytes, filetype='pdf')
         total_pages = len(pdf_doc)
         
         output_files = []
@@ -469,20 +839,11 @@ def split_pdf(file, input_body):
         
     except Exception as e:
         raise Exception(f"PDF split failed: {str(e)}")
-    finally:
-        # Clean up temporary file
-        if 'input_path' in locals():
-            try:
-                os.unlink(input_path)
-            except:
-                pass
 
 def flatten_pdf(file, input_body):
     """Flatten PDF (convert annotations and form fields to content)"""
-    # Save uploaded file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
+    # Read the uploaded file into memory; PyMuPDF opens it from the bytes directly
+    pdf_bytes = file.read()
 
     try:
         # Validate input structure
@@ -490,7 +851,7 @@ def flatten_pdf(file, input_body):
             raise Exception("Invalid input structure: missing 'tasks' or 'flatten'")
         
         # Open PDF
-        pdf_doc = fitz.open(input_path)
+        pdf_doc = fitz.open(stream=pdf_bytes, filetype='pdf')
         
         # Flatten annotations and form fields
         for page_num in range(len(pdf_doc)):
@@ -501,7 +862,7 @@ def flatten_pdf(file, input_body):
         # Save flattened PDF
         output_filename = str(uuid.uuid4()) + '.pdf'
         output_path = os.path.join(EXPORT_DIR, output_filename)
-        pdf_doc.save(output_path)
+        pdf_doc.save(output_path, **REWRITE_SAVE_OPTIONS)
         pdf_doc.close()
         
         return {
@@ -513,20 +874,11 @@ def flatten_pdf(file, input_body):
         
     except Exception as e:
         raise Exception(f"PDF flatten failed: {str(e)}")
-    finally:
-        # Clean up temporary file
-        if 'input_path' in locals():
-            try:
-                os.unlink(input_path)
-            except:
-                pass
 
 def resize_pdf(file, input_body):
     """Resize PDF pages to specified dimensions"""
-    # Save uploaded file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
+    # Read the uploaded file into memory; PyMuPDF opens it from the bytes directly
+    pdf_bytes = file.read()
 
     try:
         # Validate input structure
@@ -545,11 +897,14 @@ def resize_pdf(file, input_body):
             raise Exception("Either width/height or scale must be specified")
         
         # Open PDF
-        pdf_doc = fitz.open(input_path)
+        pdf_doc = fitz.open(stream=pdf_bytes, filetype='pdf')
         
         # Create new PDF with resized pages
         new_doc = fitz.open()
         
+        # Content scaling is the same for every page
+        mat = fitz.Matrix(scale, scale)
+        
         for page_num in range(len(pdf_doc)):
             page = pdf_doc[page_num]
             
@@ -564,7 +919,6 @@ def resize_pdf(file, input_body):
             new_page = new_doc.new_page(width=new_width, height=new_height)
             
             # Copy content with scaling
-            mat = fitz.Matrix(scale, scale)
             new_page.show_pdf_page(new_page.rect, pdf_doc, page_num, matrix=mat)
         
         # Save resized PDF
@@ -583,20 +937,11 @@ def resize_pdf(file, input_body):
         
     except Exception as e:
         raise Exception(f"PDF resize failed: {str(e)}")
-    finally:
-        # Clean up temporary file
-        if 'input_path' in locals():
-            try:
-                os.unlink(input_path)
-            except:
-                pass
 
 def unlock_pdf(file, input_body):
     """Remove password protection from PDF"""
-    # Save uploaded file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
+    # Read the uploaded file into memory; PyMuPDF opens it from the bytes directly
+    pdf_bytes = file.read()
 
     try:
         # Validate input structure
@@ -609,22 +954,18 @@ def unlock_pdf(file, input_body):
         # Get password if provided
         password = options.get('password', '')
         
-        # Open PDF
-        try:
-            pdf_doc = fitz.open(input_path)
-        except:
-            # Try with password
-            pdf_doc = fitz.open(input_path, password=password)
+        # Open PDF (a damaged file raises fitz.FileDataError here)
+        pdf_doc = fitz.open(stream=pdf_bytes, filetype='pdf')
         
-        # Create new unprotected PDF
-        new_doc = fitz.open()
-        new_doc.insert_pdf(pdf_doc)
+        # Authenticate encrypted documents with the provided password
+        if pdf_doc.needs_pass and not pdf_doc.authenticate(password):
+            pdf_doc.close()
+            raise Exception("Invalid password")
         
-        # Save unprotected PDF
+        # Save unprotected PDF straight from the opened document, dropping the encryption
         output_filename = str(uuid.uuid4()) + '.pdf'
         output_path = os.path.join(EXPORT_DIR, output_filename)
-        new_doc.save(output_path)
-        new_doc.close()
+        pdf_doc.save(output_path, encryption=fitz.PDF_ENCRYPT_NONE, **REWRITE_SAVE_OPTIONS)
         pdf_doc.close()
         
         return {
@@ -636,18 +977,11 @@ def unlock_pdf(file, input_body):
         
     except Exception as e:
         raise Exception(f"PDF unlock failed: {str(e)}")
-    finally:
-        # Clean up temporary file
-        if 'input_path' in locals():
-            try:
-                os.unlink(input_path)
-            except:
-                pass
 
 def rotate_pdf(file_id, input_body):
     """Rotate PDF pages"""
-    print(f"DEBUG: Starting rotate_pdf function")
-    print(f"DEBUG: Input body: {input_body}")
+    logger.debug("Starting rotate_pdf function")
+    logger.debug("Input body: %s", input_body)
     
     try:
         # Validate input structure
@@ -657,32 +991,32 @@ def rotate_pdf(file_id, input_body):
         rotate_task = input_body['tasks']['rotate']
         options = rotate_task.get('options', {})
         
-        print(f"DEBUG: Options received: {options}")
+        logger.debug("Options received: %s", options)
         
         # Check if we have the new per-page rotation format or legacy format
         pages_rotations = options.get('pages', [])
         legacy_angle = options.get('angle', None)
         legacy_page_range = options.get('page_range', None)
         
-        print(f"DEBUG: Pages rotations: {pages_rotations} (type: {type(pages_rotations)})")
-        print(f"DEBUG: Legacy angle: {legacy_angle}, Legacy page range: {legacy_page_range}")
+        logger.debug("Pages rotations: %s (type: %s)", pages_rotations, type(pages_rotations))
+        logger.debug("Legacy angle: %s, Legacy page range: %s", legacy_angle, legacy_page_range)
         
         # Open PDF
         filename = f"{file_id}.pdf"
-        print(f"DEBUG: Opening PDF file: {os.path.join(UPLOAD_DIR, filename)}")
+        logger.debug("Opening PDF file: %s", os.path.join(UPLOAD_DIR, filename))
         pdf_doc = fitz.open(os.path.join(UPLOAD_DIR, filename))
-        print(f"DEBUG: PDF opened successfully, total pages: {len(pdf_doc)}")
+        logger.debug("PDF opened successfully, total pages: %s", len(pdf_doc))
         
         # Apply rotation
-        print(f"DEBUG: Starting rotation process")
+        logger.debug("Starting rotation process")
         
         if pages_rotations:
             # New per-page rotation format - recompose PDF with selected pages
-            print(f"DEBUG: Using new per-page rotation format - recomposing PDF with {len(pages_rotations)} page(s)")
+            logger.debug("Using new per-page rotation format - recomposing PDF with %s page(s)", len(pages_rotations))
             
             # Create a new PDF document
             new_pdf = fitz.open()
-            print(f"DEBUG: Created new PDF document for recomposition")
+            logger.debug("Created new PDF document for recomposition")
             
             for i, page_rotation in enumerate(pages_rotations):
                 page_number = page_rotation.get('page_number', 1)  # 1-based in frontend
@@ -691,7 +1025,7 @@ def rotate_pdf(file_id, input_body):
                 # Convert to 0-based index for PyMuPDF
                 page_index = page_number - 1
                 
-                print(f"DEBUG: Processing page {page_number} (index {page_index}) with rotation {rotation_angle}° - position {i + 1} in output")
+                logger.debug("Processing page %s (index %s) with rotation %s° - position %s in output", page_number, page_index, rotation_angle, i + 1)
                 
                 if 0 <= page_index < len(pdf_doc):
                     # Get the source page
@@ -708,56 +1042,56 @@ def rotate_pdf(file_id, input_body):
                     new_rotation = (original_rotation + rotation_angle) % 360
                     new_page.set_rotation(new_rotation)
                     
-                    print(f"DEBUG: Page {page_number} -> Output position {i + 1} - Original rotation: {original_rotation}°, Added: {rotation_angle}°, Final: {new_rotation}°")
+                    logger.debug("Page %s -> Output position %s - Original rotation: %s°, Added: %s°, Final: %s°", page_number, i + 1, original_rotation, rotation_angle, new_rotation)
                 else:
-                    print(f"DEBUG: Warning - Page {page_number} is out of range (PDF has {len(pdf_doc)} pages), skipping")
+                    logger.warning("Page %s is out of range (PDF has %s pages), skipping", page_number, len(pdf_doc))
             
             # Close original PDF and use the new one
             pdf_doc.close()
             pdf_doc = new_pdf
-            print(f"DEBUG: PDF recomposition complete - final document has {len(pdf_doc)} pages")
+            logger.debug("PDF recomposition complete - final document has %s pages", len(pdf_doc))
                     
         elif legacy_angle is not None:
             # Legacy format with single angle and page range
-            print(f"DEBUG: Using legacy rotation format - angle: {legacy_angle}°, range: {legacy_page_range}")
+            logger.debug("Using legacy rotation format - angle: %s°, range: %s", legacy_angle, legacy_page_range)
             
             if legacy_page_range == 'all' or legacy_page_range is None:
-                print(f"DEBUG: Rotating all pages ({len(pdf_doc)} pages)")
+                logger.debug("Rotating all pages (%s pages)", len(pdf_doc))
                 for page_num in range(len(pdf_doc)):
                     page = pdf_doc[page_num]
                     original_rotation = page.rotation
                     page.set_rotation(legacy_angle)
-                    print(f"DEBUG: Page {page_num + 1} - Original rotation: {original_rotation}°, New rotation: {legacy_angle}°")
+                    logger.debug("Page %s - Original rotation: %s°, New rotation: %s°", page_num + 1, original_rotation, legacy_angle)
             else:
-                print(f"DEBUG: Rotating specific pages: {legacy_page_range}")
+                logger.debug("Rotating specific pages: %s", legacy_page_range)
                 # Apply to specific pages
                 for page_num in legacy_page_range:
                     if 0 <= page_num < len(pdf_doc):
                         page = pdf_doc[page_num]
                         original_rotation = page.rotation
                         page.set_rotation(legacy_angle)
-                        print(f"DEBUG: Page {page_num + 1} - Original rotation: {original_rotation}°, New rotation: {legacy_angle}°")
+                        logger.debug("Page %s - Original rotation: %s°, New rotation: %s°", page_num + 1, original_rotation, legacy_angle)
                     else:
-                        print(f"DEBUG: Warning - Page {page_num + 1} is out of range (PDF has {len(pdf_doc)} pages)")
+                        logger.warning("Page %s is out of range (PDF has %s pages)", page_num + 1, len(pdf_doc))
         else:
             # No rotation specified
-            print(f"DEBUG: No rotation parameters found in input")
+            logger.debug("No rotation parameters found in input")
             raise Exception("No rotation parameters specified. Expected either 'pages' array or 'angle' parameter.")
         
         # Save rotated PDF
         output_filename = str(uuid.uuid4()) + '.pdf'
         output_path = os.path.join(EXPORT_DIR, output_filename)
-        print(f"DEBUG: Saving rotated PDF to: {output_path}")
+        logger.debug("Saving rotated PDF to: %s", output_path)
         
         try:
-            pdf_doc.save(output_path)
-            print(f"DEBUG: PDF saved successfully")
+            pdf_doc.save(output_path, **REWRITE_SAVE_OPTIONS)
+            logger.debug("PDF saved successfully")
         except Exception as e:
-            print(f"DEBUG: Error saving PDF: {str(e)}")
+            logger.exception("Error saving PDF: %s", e)
             raise Exception(f"Failed to save rotated PDF: {str(e)}")
         
         pdf_doc.close()
-        print(f"DEBUG: PDF document closed")
+        logger.debug("PDF document closed")
         
         # Prepare result message based on operation type
         if pages_rotations:
@@ -773,15 +1107,15 @@ def rotate_pdf(file_id, input_body):
             'pages_processed': len(pages_rotations) if pages_rotations else len(pdf_doc)
         }
         
-        print(f"DEBUG: Returning result: {result}")
+        logger.debug("Returning result: %s", result)
         return result
         
     except Exception as e:
-        print(f"DEBUG: Exception occurred: {str(e)}")
+        logger.exception("Exception occurred: %s", e)
         raise Exception(f"PDF rotate failed: {str(e)}")
     finally:
         # Clean up temporary file
-        print(f"DEBUG: Cleaning up temporary files")
+        logger.debug("Cleaning up temporary files")
         # if 'filename' in locals():
         #     try:
         #         os.unlink(os.path.join(UPLOAD_DIR, filename))
@@ -792,10 +1126,8 @@ def rotate_pdf(file_id, input_body):
 
 def protect_pdf(file, input_body):
     """Add password protection to PDF"""
-    # Save uploaded file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
+    # Read the uploaded file into memory; PyMuPDF opens it from the bytes directly
+    pdf_bytes = file.read()
 
     try:
         # Validate input structure
@@ -811,22 +1143,22 @@ def protect_pdf(file, input_body):
         permissions = options.get('permissions', 0)  # PDF permissions
         
         # Open PDF
-        pdf_doc = fitz.open(input_path)
+        pdf_doc = fitz.open(stream=pdf_bytes, filetype='pdf')
         
-        # Set encryption
+        # Save protected PDF, encrypting in the same save
+        output_filename = str(uuid.uuid4()) + '.pdf'
+        output_path = os.path.join(EXPORT_DIR, output_filename)
         if user_password or owner_password:
             pdf_doc.save(
-                input_path,
+                output_path,
                 encryption=fitz.PDF_ENCRYPT_AES_256,
                 user_pw=user_password,
                 owner_pw=owner_password,
-                permissions=permissions
+                permissions=permissions,
+                deflate=True
             )
-        
-        # Save protected PDF
-        output_filename = str(uuid.uuid4()) + '.pdf'
-        output_path = os.path.join(EXPORT_DIR, output_filename)
-        pdf_doc.save(output_path)
+        else:
+            pdf_doc.save(output_path)
         pdf_doc.close()
         
         return {
@@ -838,20 +1170,11 @@ def protect_pdf(file, input_body):
         
     except Exception as e:
         raise Exception(f"PDF protection failed: {str(e)}")
-    finally:
-        # Clean up temporary file
-        if 'input_path' in locals():
-            try:
-                os.unlink(input_path)
-            except:
-                pass
 
 def extract_image_from_pdf(file, input_body):
     """Extract images from PDF pages"""
-    # Save uploaded file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
+    # Read the uploaded file into memory; PyMuPDF opens it from the bytes directly
+    pdf_bytes = file.read()
 
     try:
         # Validate input structure
@@ -866,7 +1189,7 @@ def extract_image_from_pdf(file, input_body):
         image_format = options.get('image_format', 'png')
         
         # Open PDF
-        pdf_doc = fitz.open(input_path)
+        pdf_doc = fitz.open(stream=pdf_bytes, filetype='pdf')
         
         if page_number >= len(pdf_doc):
             raise Exception(f"Page number {page_number} is out of range")
@@ -880,21 +1203,22 @@ def extract_image_from_pdf(file, input_body):
         
         for img_index, img in enumerate(image_list):
             xref = img[0]
-            pix = fitz.Pixmap(pdf_doc, xref)
-            
-            if pix.n - pix.alpha < 4:  # GRAY or RGB
-                img_data = pix.tobytes("png")
-            else:  # CMYK: convert to RGB first
-                pix1 = fitz.Pixmap(fitz.csRGB, pix)
-                img_data = pix1.tobytes("png")
-                pix1 = None
-            
-            # Save image
             output_filename = str(uuid.uuid4()) + f'.{image_format}'
             output_path = os.path.join(EXPORT_DIR, output_filename)
             
-            with open(output_path, 'wb') as f:
-                f.write(img_data)
+            # A JPEG request for a gray/RGB JPEG is served with the stored bytes
+            img_data = _embedded_jpeg(pdf_doc, img) if image_format in ('jpg', 'jpeg') else None
+            if img_data is not None:
+                with open(output_path, 'wb') as f:
+                    f.write(img_data)
+            else:
+                pix = fitz.Pixmap(pdf_doc, xref)
+                
+                if pix.n - pix.alpha >= 4:  # CMYK: convert to RGB first
+                    pix = fitz.Pixmap(fitz.csRGB, pix)
+                
+                # Save image (PNG data, written by the pixmap without an intermediate bytes copy)
+                pix.save(output_path, output="png")
             
             extracted_images.append({
                 'filename': output_filename,
@@ -914,134 +1238,199 @@ def extract_image_from_pdf(file, input_body):
         
     except Exception as e:
         raise Exception(f"Image extraction failed: {str(e)}")
+
+def _pixmap_jpeg(pix, output=None):
+    """Encode a gray, RGB or RGBA pixmap as JPEG with Pillow, into output if given"""
+    from PIL import Image
+    
+    # 'RGBa' tells PIL the samples are premultiplied, so dropping the alpha
+    # channel restores the original colors (PyMuPDF cannot write JPEG with alpha)
+    pil_img = Image.frombytes(PIL_PIXMAP_MODES[(pix.n, pix.alpha)], (pix.width, pix.height), pix.samples)
+    if pil_img.mode == 'RGBa':
+        pil_img = pil_img.convert('RGB')
+    
+    if output is not None:
+        pil_img.save(output, format='JPEG', **EXTRACT_JPEG_SAVE_OPTIONS)
+        return None
+    
+    img_buffer = io.BytesIO()
+    pil_img.save(img_buffer, format='JPEG', **EXTRACT_JPEG_SAVE_OPTIONS)
+    return img_buffer.getvalue()
+
+def _embedded_jpeg(pdf_doc, img):
+    """Return the stored JPEG of a gray/RGB image entry from get_images(), or None if it needs decoding"""
+    if img[8] != 'DCTDecode':
+        return None
+    img_info = pdf_doc.extract_image(img[0])
+    if not img_info or img_info['ext'] != 'jpeg' or img_info['colorspace'] not in (1, 3):
+        return None
+    return img_info['image']
+
+def _extract_page_images(pdf_doc, page_num, zip_file=None):
+    """Convert the images of one page to JPEG, returning ([(zip entry name, data)], images found)
+
+    With zip_file given, each image is written into the archive as soon as it is
+    encoded and the returned data is None.
+    """
+    logger.debug("Processing page %s/%s", page_num + 1, len(pdf_doc))
+    page = pdf_doc[page_num]
+    
+    # Get images from page
+    image_list = page.get_images()
+    page_image_count = len(image_list)
+    logger.debug("Found %s images on page %s", page_image_count, page_num + 1)
+    
+    # Target colorspace for CMYK and other images, looked up once per page
+    cs_rgb = fitz.csRGB
+    
+    images = []
+    for img_index, img in enumerate(image_list):
+        logger.debug("Processing image %s/%s on page %s", img_index + 1, page_image_count, page_num + 1)
+        xref = img[0]
+        img_filename = f"page_{page_num + 1}_image_{img_index + 1}.jpg"
+        
+        # Gray/RGB JPEGs go into the ZIP as stored, without a decode and re-encode
+        img_data = _embedded_jpeg(pdf_doc, img)
+        if img_data is not None:
+            if zip_file is not None:
+                zip_file.writestr(img_filename, img_data)
+                img_data = None
+            images.append((img_filename, img_data))
+            continue
+        
+        pix = fitz.Pixmap(pdf_doc, xref)
+        jpeg_pix = None
+        
+        try:
+            # Handle different image formats with robust alpha channel removal
+            logger.debug("Image format: n=%s, alpha=%s", pix.n, pix.alpha)
+            
+            if pix.n == 1:  # GRAY
+                logger.debug("Image is GRAY format")
+                jpeg_pix = pix
+            elif pix.n == 3:  # RGB
+                logger.debug("Image is RGB format")
+                jpeg_pix = pix
+            elif pix.n == 4:  # RGBA or CMYK
+                if pix.alpha:  # RGBA
+                    logger.debug("Image is RGBA format, removing alpha channel")
+                    jpeg_pix = pix
+                else:  # CMYK
+                    logger.debug("Image is CMYK format, converting to RGB")
+                    jpeg_pix = fitz.Pixmap(cs_rgb, pix)
+            else:
+                logger.debug("Unknown image format (n=%s), converting to RGB", pix.n)
+                # Convert to RGB as fallback
+                jpeg_pix = fitz.Pixmap(cs_rgb, pix)
+            
+            if zip_file is None:
+                img_data = _pixmap_jpeg(jpeg_pix)
+            else:
+                # Encode straight into the archive entry rather than a separate buffer
+                with zip_file.open(img_filename, 'w') as zip_entry:
+                    _pixmap_jpeg(jpeg_pix, zip_entry)
+            images.append((img_filename, img_data))
+            
+            logger.debug("Image %s on page %s processed successfully", img_index + 1, page_num + 1)
+            
+        except Exception as img_error:
+            logger.warning("Error processing image %s on page %s: %s", img_index + 1, page_num + 1, img_error)
+            # Continue with next image instead of failing completely
+            continue
+        finally:
+            jpeg_pix = None
+            pix = None
+    
+    # Decoded images stay in MuPDF's store (up to 256 MB by default) although each
+    # one is only extracted once; empty it after every page that had images
+    if page_image_count:
+        fitz.TOOLS.store_shrink(100)
+    
+    return images, page_image_count
+
+def _extract_images_chunk(file_path, page_numbers):
+    """Worker entry point: extract the images of a block of pages from its own document handle"""
+    # Only the path crosses the process boundary; each block opens the spooled upload itself
+    pdf_doc = fitz.open(file_path)
+    try:
+        return [_extract_page_images(pdf_doc, page_num) for page_num in page_numbers]
     finally:
-        # Clean up temporary file
-        if 'input_path' in locals():
-            try:
-                os.unlink(input_path)
-            except:
-                pass
+        pdf_doc.close()
 
 def extract_all_images_from_pdf(file):
     """Extract all images from all pages of PDF and return as ZIP file"""
-    print(f"[DEBUG] Starting image extraction for file: {file.filename}")
+    logger.debug("Starting image extraction for file: %s", file.filename)
+    
+    # Read the uploaded file into memory; PyMuPDF opens it from the bytes directly
+    pdf_bytes = file.read()
+    logger.debug("File read into memory: %s bytes", len(pdf_bytes))
     
-    # Save uploaded file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
-        print(f"[DEBUG] File saved to temporary path: {input_path}")
+    # Copy of the upload on disk for the pool workers (parallel extraction only)
+    spool_path = None
 
     try:
         # Open PDF
-        print("[DEBUG] Opening PDF document...")
-        pdf_doc = fitz.open(input_path)
+        logger.debug("Opening PDF document...")
+        pdf_doc = fitz.open(stream=pdf_bytes, filetype='pdf')
         total_pages = len(pdf_doc)
-        print(f"[DEBUG] PDF opened successfully. Total pages: {total_pages}")
+        logger.debug("PDF opened successfully. Total pages: %s", total_pages)
         
         # Create ZIP file
         zip_filename = str(uuid.uuid4()) + '.zip'
         zip_path = os.path.join(EXPORT_DIR, zip_filename)
-        print(f"[DEBUG] Creating ZIP file: {zip_path}")
+        logger.debug("Creating ZIP file: %s", zip_path)
         
         extracted_count = 0
         total_images_found = 0
         
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            # Extract images from each page
-            for page_num in range(total_pages):
-                print(f"[DEBUG] Processing page {page_num + 1}/{total_pages}")
-                page = pdf_doc[page_num]
-                
-                # Get images from page
-                image_list = page.get_images()
-                page_image_count = len(image_list)
-                print(f"[DEBUG] Found {page_image_count} images on page {page_num + 1}")
+        if PROCESS_POOL_MAX_WORKERS > 1 and total_pages >= IMAGE_EXTRACT_PARALLEL_MIN_PAGES:
+            pdf_doc.close()
+            
+            # Workers get a path rather than the bytes, which would otherwise be
+            # pickled through the pool's pipes once for every block
+            spool_fd, spool_path = tempfile.mkstemp(suffix='.pdf')
+            with os.fdopen(spool_fd, 'wb') as spool_file:
+                spool_file.write(pdf_bytes)
+            
+            # Pixmap conversion and JPEG encoding run in the workers; the ZIP is
+            # only written here, one page's images at a time and in page order
+            executor = _get_process_executor()
+            page_results = (page_result
+                            for chunk in executor.map(
+                                _extract_images_chunk, repeat(spool_path),
+                                _page_chunks(total_pages, IMAGE_EXTRACT_BLOCKS_PER_WORKER))
+                            for page_result in chunk)
+        else:
+            executor = None
+            page_results = None
+        
+        # Store entries as-is: every entry is a JPEG, which deflate cannot shrink
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zip_file:
+            if page_results is None:
+                # Serial extraction encodes each image straight into its ZIP entry
+                page_results = (_extract_page_images(pdf_doc, page_num, zip_file) for page_num in range(total_pages))
+            
+            # Add each page's images to the ZIP
+            for images, page_image_count in page_results:
                 total_images_found += page_image_count
-                
-                for img_index, img in enumerate(image_list):
-                    print(f"[DEBUG] Processing image {img_index + 1}/{page_image_count} on page {page_num + 1}")
-                    xref = img[0]
-                    pix = fitz.Pixmap(pdf_doc, xref)
-                    
-                    try:
-                        # Handle different image formats with robust alpha channel removal
-                        print(f"[DEBUG] Image format: n={pix.n}, alpha={pix.alpha}")
-                        
-                        if pix.n == 1:  # GRAY
-                            print(f"[DEBUG] Image is GRAY format")
-                            img_data = pix.tobytes("jpeg")
-                        elif pix.n == 3:  # RGB
-                            print(f"[DEBUG] Image is RGB format")
-                            img_data = pix.tobytes("jpeg")
-                        elif pix.n == 4:  # RGBA or CMYK
-                            if pix.alpha:  # RGBA
-                                print(f"[DEBUG] Image is RGBA format, removing alpha channel")
-                                # Create RGB version without alpha - more robust approach
-                                try:
-                                    # First try direct RGB conversion
-                                    rgb_pix = fitz.Pixmap(fitz.csRGB, pix)
-                                    img_data = rgb_pix.tobytes("jpeg")
-                                    rgb_pix = None
-                                except Exception as rgb_error:
-                                    print(f"[DEBUG] Direct RGB conversion failed: {rgb_error}")
-                                    # Fallback: convert to PIL Image and back to remove alpha
-                                    import io
-                                    from PIL import Image
-                                    
-                                    # Convert to PIL Image
-                                    img_bytes = pix.tobytes("png")
-                                    pil_img = Image.open(io.BytesIO(img_bytes))
-                                    
-                                    # Convert to RGB (removes alpha)
-                                    if pil_img.mode in ('RGBA', 'LA', 'P'):
-                                        pil_img = pil_img.convert('RGB')
-                                    
-                                    # Convert back to bytes
-                                    img_buffer = io.BytesIO()
-                                    pil_img.save(img_buffer, format='JPEG', quality=95)
-                                    img_data = img_buffer.getvalue()
-                                    img_buffer.close()
-                            else:  # CMYK
-                                print(f"[DEBUG] Image is CMYK format, converting to RGB")
-                                rgb_pix = fitz.Pixmap(fitz.csRGB, pix)
-                                img_data = rgb_pix.tobytes("jpeg")
-                                rgb_pix = None
-                        else:
-                            print(f"[DEBUG] Unknown image format (n={pix.n}), converting to RGB")
-                            # Convert to RGB as fallback
-                            rgb_pix = fitz.Pixmap(fitz.csRGB, pix)
-                            img_data = rgb_pix.tobytes("jpeg")
-                            rgb_pix = None
-                        
-                        # Create filename for ZIP
-                        img_filename = f"page_{page_num + 1}_image_{img_index + 1}.jpg"
-                        print(f"[DEBUG] Adding to ZIP: {img_filename}")
-                        
-                        # Add to ZIP file
+                for img_filename, img_data in images:
+                    logger.debug("Adding to ZIP: %s", img_filename)
+                    if img_data is not None:
                         zip_file.writestr(img_filename, img_data)
-                        extracted_count += 1
-                        
-                        print(f"[DEBUG] Image {img_index + 1} on page {page_num + 1} processed successfully")
-                        
-                    except Exception as img_error:
-                        print(f"[DEBUG] Error processing image {img_index + 1} on page {page_num + 1}: {img_error}")
-                        # Continue with next image instead of failing completely
-                        continue
-                    finally:
-                        pix = None
+                    extracted_count += 1
         
-        pdf_doc.close()
-        print(f"[DEBUG] PDF document closed")
-        print(f"[DEBUG] Total images found: {total_images_found}")
-        print(f"[DEBUG] Total images extracted: {extracted_count}")
+        if not pdf_doc.is_closed:
+            pdf_doc.close()
+        logger.debug("PDF document closed")
+        logger.debug("Total images found: %s", total_images_found)
+        logger.debug("Total images extracted: %s", extracted_count)
         
         if extracted_count == 0:
-            print("[DEBUG] No images found in the PDF")
+            logger.debug("No images found in the PDF")
             raise Exception("No images found in the PDF")
         
-        print(f"[DEBUG] ZIP file created successfully: {zip_path}")
-        print(f"[DEBUG] Extraction completed successfully")
+        logger.debug("ZIP file created successfully: %s", zip_path)
+        logger.debug("Extraction completed successfully")
         
         return {
             'success': True,
@@ -1052,25 +1441,24 @@ def extract_all_images_from_pdf(file):
             'total_pages': total_pages
         }
         
+    except BrokenProcessPool as e:
+        # A worker died (e.g. killed for memory); later extractions get a fresh pool
+        _discard_process_executor(executor)
+        raise Exception(f"Image extraction failed: {str(e)}")
     except Exception as e:
-        print(f"[DEBUG] Error occurred: {str(e)}")
+        logger.exception("Error occurred: %s", e)
         raise Exception(f"Image extraction failed: {str(e)}")
     finally:
-        # Clean up temporary file
-        if 'input_path' in locals():
+        if spool_path:
             try:
-                os.unlink(input_path)
-                print(f"[DEBUG] Temporary file cleaned up: {input_path}")
-            except:
-                print(f"[DEBUG] Failed to clean up temporary file: {input_path}")
+                os.remove(spool_path)
+            except OSError:
                 pass
 
 def remove_pdf_pages(file, input_body):
     """Remove specific pages from PDF"""
-    # Save uploaded file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
+    # Read the uploaded file into memory; PyMuPDF opens it from the bytes directly
+    pdf_bytes = file.read()
 
     try:
         # Validate input structure
@@ -1087,27 +1475,23 @@ def remove_pdf_pages(file, input_body):
             raise Exception("No pages specified for removal")
         
         # Open PDF
-        pdf_doc = fitz.open(input_path)
+        pdf_doc = fitz.open(stream=pdf_bytes, filetype='pdf')
         total_pages = len(pdf_doc)
         
-        # Convert to 0-based indexing
-        pages_to_remove = [p - 1 for p in pages_to_remove if 1 <= p <= total_pages]
+        # Convert to 0-based indexing (a set: repeated pages count once)
+        pages_to_remove = {p - 1 for p in pages_to_remove if 1 <= p <= total_pages}
         
         if not pages_to_remove:
             raise Exception("No valid pages to remove")
         
-        # Create new PDF without specified pages
-        new_doc = fitz.open()
-        
-        for page_num in range(total_pages):
-            if page_num not in pages_to_remove:
-                new_doc.insert_pdf(pdf_doc, from_page=page_num, to_page=page_num)
+        # Keep the remaining pages in the opened document itself instead of
+        # copying them one by one into a new one
+        pdf_doc.select([page_num for page_num in range(total_pages) if page_num not in pages_to_remove])
         
         # Save modified PDF
         output_filename = str(uuid.uuid4()) + '.pdf'
         output_path = os.path.join(EXPORT_DIR, output_filename)
-        new_doc.save(output_path)
-        new_doc.close()
+        pdf_doc.save(output_path, **SELECT_SAVE_OPTIONS)
         pdf_doc.close()
         
         return {
@@ -1119,13 +1503,6 @@ def remove_pdf_pages(file, input_body):
         
     except Exception as e:
         raise Exception(f"PDF page removal failed: {str(e)}")
-    finally:
-        # Clean up temporary file
-        if 'input_path' in locals():
-            try:
-                os.unlink(input_path)
-            except:
-                pass
 
 def remove_pages_by_file_id(file_id, page_ids):
     """Remove specific pages from PDF using file_id and page_ids"""
@@ -1141,27 +1518,23 @@ def remove_pages_by_file_id(file_id, page_ids):
         pdf_doc = fitz.open(file_path)
         total_pages = len(pdf_doc)
         
-        # Convert page_ids to 0-based indexing and validate
-        pages_to_remove = []
+        # Convert page_ids to 0-based indexing and validate (a set: repeated pages count once)
+        pages_to_remove = set()
         for page_id in page_ids:
             if isinstance(page_id, int) and 1 <= page_id <= total_pages:
-                pages_to_remove.append(page_id - 1)
+                pages_to_remove.add(page_id - 1)
         
         if not pages_to_remove:
             raise Exception("No valid pages to remove")
         
-        # Create new PDF without specified pages
-        new_doc = fitz.open()
-        
-        for page_num in range(total_pages):
-            if page_num not in pages_to_remove:
-                new_doc.insert_pdf(pdf_doc, from_page=page_num, to_page=page_num)
+        # Keep the remaining pages in the opened document itself instead of
+        # copying them one by one into a new one
+        pdf_doc.select([page_num for page_num in range(total_pages) if page_num not in pages_to_remove])
         
         # Save modified PDF
         output_filename = str(uuid.uuid4()) + '.pdf'
         output_path = os.path.join(EXPORT_DIR, output_filename)
-        new_doc.save(output_path)
-        new_doc.close()
+        pdf_doc.save(output_path, **SELECT_SAVE_OPTIONS)
         pdf_doc.close()
         
         return {
@@ -1176,10 +1549,8 @@ def remove_pages_by_file_id(file_id, page_ids):
 
 def extract_pdf_pages(file, input_body):
     """Extract specific pages from PDF"""
-    # Save uploaded file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
+    # Read the uploaded file into memory; PyMuPDF opens it from the bytes directly
+    pdf_bytes = file.read()
 
     try:
         # Validate input structure
@@ -1196,7 +1567,7 @@ def extract_pdf_pages(file, input_body):
             raise Exception("No page ranges specified for extraction")
         
         # Open PDF
-        pdf_doc = fitz.open(input_path)
+        pdf_doc = fitz.open(stream=pdf_bytes, filetype='pdf')
         total_pages = len(pdf_doc)
         
         extracted_files = []
@@ -1236,16 +1607,10 @@ def extract_pdf_pages(file, input_body):
         
     except Exception as e:
         raise Exception(f"PDF page extraction failed: {str(e)}")
-    finally:
-        # Clean up temporary file
-        if 'input_path' in locals():
-            try:
-                os.unlink(input_path)
-            except:
-                pass
 
 def extract_pages_by_file_id(file_id, page_ranges, merge_output=False, compression_level='none', password=''):
     """Extract pages from PDF using file_id"""
+    pdf_doc = None
     try:
         # Construct file path
         filename = f"{file_id}.pdf"
@@ -1254,12 +1619,12 @@ def extract_pages_by_file_id(file_id, page_ranges, merge_output=False, compressi
         if not os.path.exists(file_path):
             raise Exception("PDF file not found")
         
-        # Open PDF
+        # Open PDF (without a password, reusing the parsed document from an earlier request)
         try:
             if password:
                 pdf_doc = fitz.open(file_path, password=password)
             else:
-                pdf_doc = fitz.open(file_path)
+                pdf_doc = _checkout_document(file_id)
         except:
             raise Exception("Failed to open PDF. Check if password is correct.")
         
@@ -1279,32 +1644,24 @@ def extract_pages_by_file_id(file_id, page_ranges, merge_output=False, compressi
         # Remove duplicates and sort
         valid_pages = sorted(list(set(valid_pages)))
         
+        # Save options for the chosen compression level
+        save_options = EXTRACT_SAVE_OPTIONS.get(compression_level, {})
+        
         if merge_output:
             # Extract all selected pages into one PDF
+            # Copy each run of consecutive pages with a single insert_pdf call
             new_doc = fitz.open()
-            for page_index in valid_pages:
-                new_doc.insert_pdf(pdf_doc, from_page=page_index, to_page=page_index)
+            for _, run in groupby(enumerate(valid_pages), lambda item: item[1] - item[0]):
+                run = [page_index for _, page_index in run]
+                new_doc.insert_pdf(pdf_doc, from_page=run[0], to_page=run[-1])
             
             # Save merged PDF with compression if specified
             output_filename = str(uuid.uuid4()) + '.pdf'
             output_path = os.path.join(EXPORT_DIR, output_filename)
             
-            if compression_level != 'none':
-                # Apply compression based on level
-                if compression_level == 'low':
-                    new_doc.save(output_path, garbage=1, deflate=True)
-                elif compression_level == 'medium':
-                    new_doc.save(output_path, garbage=2, deflate=True)
-                elif compression_level == 'high':
-                    new_doc.save(output_path, garbage=3, deflate=True, clean=True)
-                else:
-                    new_doc.save(output_path)
-            else:
-                new_doc.save(output_path)
+            new_doc.save(output_path, **save_options)
             new_doc.close()
             
-            pdf_doc.close()
-            
             return {
                 'success': True,
                 'message': f'Extracted {len(valid_pages)} pages into single PDF',
@@ -1314,74 +1671,247 @@ def extract_pages_by_file_id(file_id, page_ranges, merge_output=False, compressi
         else:
             # Extract each page as separate PDF and create a ZIP file
             extracted_files = []
-            temp_files = []  # Track temporary files for cleanup
             
-            try:
+            zip_filename = str(uuid.uuid4()) + '.zip'
+            zip_path = os.path.join(EXPORT_DIR, zip_filename)
+            
+            # Each page PDF is serialized in memory and goes straight into the ZIP;
+            # entries are stored as-is since PDF streams are already compressed
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf:
                 for page_index in valid_pages:
                     new_doc = fitz.open()
                     new_doc.insert_pdf(pdf_doc, from_page=page_index, to_page=page_index)
-                    
-                    # Save individual PDF with compression if specified
-                    output_filename = str(uuid.uuid4()) + '.pdf'
-                    output_path = os.path.join(EXPORT_DIR, output_filename)
-                    
-                    if compression_level != 'none':
-                        # Apply compression based on level
-                        if compression_level == 'low':
-                            new_doc.save(output_path, garbage=1, deflate=True)
-                        elif compression_level == 'medium':
-                            new_doc.save(output_path, garbage=2, deflate=True)
-                        elif compression_level == 'high':
-                            new_doc.save(output_path, garbage=3, deflate=True, clean=True)
-                        else:
-                            new_doc.save(output_path)
-                    else:
-                        new_doc.save(output_path)
+                    page_bytes = new_doc.tobytes(**save_options)
                     new_doc.close()
                     
-                    temp_files.append(output_path)
+                    # Add file to ZIP with descriptive name
+                    zipf.writestr(f'page_{page_index + 1}.pdf', page_bytes)
                     
+                    output_filename = str(uuid.uuid4()) + '.pdf'
                     extracted_files.append({
                         'filename': output_filename,
                         'download_url': f'/download/documents/{output_filename}',
                         'page': page_index + 1
                     })
-                
-                # Create ZIP file containing all extracted PDFs
-                zip_filename = str(uuid.uuid4()) + '.zip'
-                zip_path = os.path.join(EXPORT_DIR, zip_filename)
-                
-                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for i, file_path in enumerate(temp_files):
-                        # Add file to ZIP with descriptive name
-                        page_num = valid_pages[i] + 1
-                        zip_name = f'page_{page_num}.pdf'
-                        zipf.write(file_path, zip_name)
-                
-                pdf_doc.close()
-                
-                return {
-                    'success': True,
-                    'message': f'Extracted {len(extracted_files)} pages as separate PDFs in ZIP file',
-                    'download_url': f'/download/documents/{zip_filename}',
-                    'extracted_files': extracted_files,
-                    'zip_filename': zip_filename
-                }
-                
-            finally:
-                # Clean up individual PDF files after creating ZIP
-                for temp_file in temp_files:
-                    try:
-                        if os.path.exists(temp_file):
-                            os.unlink(temp_file)
-                    except:
-                        pass
+            
+            return {
+                'success': True,
+                'message': f'Extracted {len(extracted_files)} pages as separate PDFs in ZIP file',
+                'download_url': f'/download/documents/{zip_filename}',
+                'extracted_files': extracted_files,
+                'zip_filename': zip_filename
+            }
         
     except Exception as e:
         raise Exception(f"PDF page extraction failed: {str(e)}")
+    finally:
+        if pdf_doc is not None:
+            if password:
+                pdf_doc.close()
+            else:
+                _release_document(file_id, pdf_doc)
+
+def _open_cached_source(source_cache, file_id):
+    """Open an uploaded PDF once per request and reuse the parsed document"""
+    source_doc = source_cache.get(file_id)
+    if source_doc is None:
+        # Construct file path
+        filename = f"{file_id}.pdf"
+        file_path = os.path.join(UPLOAD_DIR, filename)
+        
+        if not os.path.exists(file_path):
+            raise Exception(f"PDF file not found for file_id: {file_id}")
+        
+        source_doc = _checkout_document(file_id)
+        source_cache[file_id] = source_doc
+    return source_doc
+
+def _close_cached_sources(source_cache):
+    """Hand every source document of the request back to the process-wide cache"""
+    for file_id, source_doc in source_cache.items():
+        _release_document(file_id, source_doc)
+    source_cache.clear()
+
+def _safe_title(title):
+    """Keep only letters, digits, spaces, dashes and underscores and use underscores for spaces"""
+    if title.isascii():
+        # Single C-level pass over the string
+        safe_title = title.translate(TITLE_DELETE_TABLE)
+    else:
+        # Non-ASCII letters are kept as well, which a fixed table cannot express
+        safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_'))
+    return safe_title.rstrip().replace(' ', '_')
+
+def _is_strict_int(value):
+    """True for int values; bools (an int subclass in Python) are rejected"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _parse_page_entry(page_info, index):
+    """Validate a {'file_id', 'page_number'} page entry and return both values"""
+    try:
+        file_id = page_info['file_id']
+    except KeyError:
+        raise Exception(f"Missing file_id in page data at index {index}")
+    except TypeError:
+        raise Exception(f"Page data at index {index} must be a dictionary")
+    
+    page_number = page_info.get('page_number', 1)
+    if not _is_strict_int(page_number):
+        raise Exception(f"page_number must be an integer in page data at index {index}")
+    
+    return file_id, page_number
+
+def _predict_multi_output(split_mode, split_configurations=None, files_data=None,
+                          page_ranges=None, pages_per_file=1, source_cache=None):
+    """Return True when a split request can produce more than one output file"""
+    if split_configurations:
+        # Every non-empty configuration produces at most one output
+        return sum(1 for config in split_configurations
+                   if isinstance(config, dict) and config.get('pages')) > 1
+    
+    expected_outputs = 0
+    for file_id, page_numbers in (files_data or {}).items():
+        total_pages = len(_open_cached_source(source_cache, file_id))
+        valid_pages = [p for p in page_numbers if 1 <= p <= total_pages]
+        if not valid_pages:
+            continue
+        
+        if split_mode == 'manual':
+            expected_outputs += len(valid_pages)
+        elif split_mode == 'page_range':
+            expected_outputs += len(page_ranges or [])
+        elif split_mode == 'fixed_pages':
+            expected_outputs += -(-total_pages // pages_per_file) if pages_per_file > 0 else 0
+        elif split_mode in ('odd_even', 'split_half'):
+            expected_outputs += 2 if total_pages > 1 else 1
+        elif split_mode == 'extract_all':
+            expected_outputs += total_pages
+        
+        if expected_outputs > 1:
+            return True
+    return False
+
+def _write_file_bytes(output_path, data):
+    """Write a buffer to disk with a single open/write/close sequence"""
+    fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+    finally:
+        os.close(fd)
+
+def _uring_write_all(outputs):
+    """Write (path, bytes) pairs through a single io_uring; returns False when io_uring is unavailable"""
+    try:
+        import liburing
+    except ImportError:
+        return False
+    
+    ring = liburing.Ring()
+    cqe = liburing.Cqe()
+    try:
+        liburing.io_uring_queue_init(WRITE_BATCH_SIZE, ring)
+    except OSError:
+        # Kernel without io_uring support (or blocked by seccomp)
+        return False
+    
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    try:
+        for batch_start in range(0, len(outputs), WRITE_BATCH_SIZE):
+            batch = outputs[batch_start:batch_start + WRITE_BATCH_SIZE]
+            fds = []
+            try:
+                # Queue one write per output and submit them together
+                for index, (output_path, data) in enumerate(batch):
+                    fd = os.open(output_path, flags, 0o644)
+                    fds.append(fd)
+                    sqe = liburing.io_uring_get_sqe(ring)
+                    liburing.io_uring_prep_write(sqe, fd, data, 0)
+                    sqe.user_data = index
+                liburing.io_uring_submit_and_wait(ring, len(batch))
+                
+                # Reap the completions in bulk
+                completed = 0
+                while completed < len(batch):
+                    liburing.io_uring_wait_cqe(ring, cqe)
+                    ready = liburing.io_uring_cq_ready(ring)
+                    for i in range(ready):
+                        index, written = cqe[i].user_data, cqe[i].res
+                        output_path, data = batch[index]
+                        if written < 0:
+                            raise OSError(-written, os.strerror(-written), output_path)
+                        # Finish short writes synchronously
+                        while written < len(data):
+                            written += os.pwrite(fds[index], memoryview(data)[written:], written)
+                    liburing.io_uring_cq_advance(ring, ready)
+                    completed += ready
+            finally:
+                for fd in fds:
+                    os.close(fd)
+    except (AttributeError, TypeError):
+        # Incompatible liburing binding; the caller rewrites every file
+        return False
+    finally:
+        liburing.io_uring_queue_exit(ring)
+    return True
+
+def _flush_pending_writes(pending_writes):
+    """Write the queued split outputs to disk, batched through io_uring on Linux"""
+    if not pending_writes:
+        return
+    if not (sys.platform.startswith('linux') and _uring_write_all(pending_writes)):
+        for output_path, data in pending_writes:
+            _write_file_bytes(output_path, data)
+    pending_writes.clear()
+
+def _copy_split_source(file_id, output_path, zipf=None, write_file=True):
+    """Use the uploaded file itself for a split output that contains every page"""
+    source_path = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
+    if write_file:
+        shutil.copyfile(source_path, output_path)
+    if zipf is not None:
+        zipf.write(source_path, os.path.basename(output_path))
+
+# Split outputs are always built in a fresh fitz.open() document. Recycling
+# targets through a pool with delete_pages() keeps the removed pages' objects
+# in the xref, so each reuse makes the next save larger and slower (and would
+# carry one request's objects into another request's file).
+def _save_split_output(doc, output_path, zipf=None, pending_writes=None, write_file=True, **save_options):
+    """Serialize a split output once and reuse the bytes for the file and the request ZIP"""
+    pdf_bytes = doc.tobytes(**save_options)
+    # For ZIP-only requests the archive entry is the only copy
+    if write_file and pending_writes is None:
+        _write_file_bytes(output_path, pdf_bytes)
+    elif write_file:
+        # Queue the write so several outputs go to disk in one batch
+        pending_writes.append((output_path, pdf_bytes))
+        if (len(pending_writes) >= WRITE_BATCH_SIZE
+                or sum(len(data) for _, data in pending_writes) >= WRITE_BATCH_BYTES):
+            _flush_pending_writes(pending_writes)
+    if zipf is not None:
+        zipf.writestr(os.path.basename(output_path), pdf_bytes)
+
+def _close_split_zip(zipf, zip_path, keep=True):
+    """Close the split ZIP, removing it when it is not part of the response"""
+    if zipf is None:
+        return
+    zipf.close()
+    if not keep:
+        try:
+            os.unlink(zip_path)
+        except OSError:
+            pass
 
 def split_pdfs_by_file_ids(input_body):
     """Split multiple PDFs using file_ids with enhanced split modes and split configurations"""
+    # Parsed source documents keyed by file_id, shared by every output of this request
+    source_cache = {}
+    # ZIP archive filled as each output is saved (only opened when several outputs are expected)
+    zipf = None
+    # Split outputs waiting to be written to disk in one batch
+    pending_writes = []
     try:
         # Validate input structure
         if 'tasks' not in input_body or 'split' not in input_body['tasks']:
@@ -1397,6 +1927,8 @@ def split_pdfs_by_file_ids(input_body):
         selected_pages = options.get('pages', [])
         page_ranges = options.get('page_ranges', [])
         pages_per_file = options.get('pages_per_file', 1)
+        # Only deliver the ZIP (no individual files) when several outputs are produced
+        zip_only = options.get('zip_only', False)
         
         # Check if we have split configurations (new method) or pages (old method)
         if split_configurations:
@@ -1409,6 +1941,13 @@ def split_pdfs_by_file_ids(input_body):
             
             output_files = []
             
+            # Open the ZIP up front so each output is added right after it is saved
+            zip_filename = f"{output_filename}_split.zip"
+            zip_path = os.path.join(EXPORT_DIR, zip_filename)
+            if _predict_multi_output(split_mode, split_configurations=split_configurations):
+                zipf = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED)
+            write_files = zipf is None or not zip_only
+            
             # Process each split configuration
             for config_index, config in enumerate(split_configurations):
                 if not isinstance(config, dict):
@@ -1439,15 +1978,8 @@ def split_pdfs_by_file_ids(input_body):
                     if not file_id:
                         raise Exception(f"Missing file_id in page data for configuration {config_index}")
                     
-                    # Construct file path
-                    filename = f"{file_id}.pdf"
-                    file_path = os.path.join(UPLOAD_DIR, filename)
-                    
-                    if not os.path.exists(file_path):
-                        raise Exception(f"PDF file not found for file_id: {file_id}")
-                    
-                    # Open source PDF
-                    source_doc = fitz.open(file_path)
+                    # Reuse the source PDF if another page or configuration already opened it
+                    source_doc = _open_cached_source(source_cache, file_id)
                     total_pages = len(source_doc)
                     
                     # Validate page number
@@ -1461,44 +1993,40 @@ def split_pdfs_by_file_ids(input_body):
                             last_page = new_doc[-1]
                             # Set rotation (rotation should be 0, 90, 180, or 270)
                             last_page.set_rotation(rotation)
-                    
-                    source_doc.close()
                 
                 # Save the new document
                 if len(new_doc) > 0:
                     # Create a safe filename from the title
-                    safe_title = "".join(c for c in config_title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                    safe_title = safe_title.replace(' ', '_')
+                    safe_title = _safe_title(config_title)
                     
                     output_filename_gen = f"{output_filename}_{safe_title}_{config_index + 1}.pdf"
-                    output_path = os.path.join(EXPORT_DIR, output_filename_gen)
-                    new_doc.save(output_path)
+                    output_path = EXPORT_PREFIX + output_filename_gen
+                    _save_split_output(new_doc, output_path, zipf, pending_writes, write_files)
                     
-                    output_files.append({
-                        'filename': output_filename_gen,
-                        'download_url': f'/static/documents/{output_filename_gen}',
-                        'title': config_title,
-                        'pages': len(new_doc),
-                        'config_id': config_id
-                    })
+                    output_files.append(ConfigSplitOutput(
+                        filename=output_filename_gen,
+                        download_url=f'/static/documents/{output_filename_gen}',
+                        title=config_title,
+                        pages=len(new_doc),
+                        config_id=config_id
+                    ))
                 
                 new_doc.close()
             
-            # Create ZIP file if multiple files
-            if len(output_files) > 1:
-                zip_filename = f"{output_filename}_split.zip"
-                zip_path = os.path.join(EXPORT_DIR, zip_filename)
-                
-                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for output_file in output_files:
-                        file_path = os.path.join(EXPORT_DIR, output_file['filename'])
-                        if os.path.exists(file_path):
-                            zipf.write(file_path, output_file['filename'])
-                
+            _flush_pending_writes(pending_writes)
+            
+            # Finish the ZIP that was filled while splitting (in ZIP-only mode it
+            # holds the only copy, so it is kept even for a single output)
+            return_zip = len(output_files) > 1 or (output_files and not write_files)
+            _close_split_zip(zipf, zip_path, keep=return_zip)
+            zipf = None
+            if not write_files:
+                output_files = [output_file._replace(download_url=None) for output_file in output_files]
+            if return_zip:
                 return {
                     'success': True,
                     'message': f'PDFs split successfully into {len(output_files)} files',
-                    'output_files': output_files,
+                    'output_files': [output_file._asdict() for output_file in output_files],
                     'zip_filename': zip_filename,
                     'download_url': f'/static/documents/{zip_filename}'
                 }
@@ -1507,8 +2035,8 @@ def split_pdfs_by_file_ids(input_body):
                 return {
                     'success': True,
                     'message': 'PDFs split successfully',
-                    'output_files': output_files,
-                    'download_url': output_files[0]['download_url'] if output_files else None
+                    'output_files': [output_file._asdict() for output_file in output_files],
+                    'download_url': output_files[0].download_url if output_files else None
                 }
         
         else:
@@ -1523,46 +2051,31 @@ def split_pdfs_by_file_ids(input_body):
             if len(selected_pages) == 0:
                 raise Exception("At least one page must be specified for splitting")
             
-            # Validate each page entry
+            # Group pages by file_id, validating each entry on the way
+            files_data = defaultdict(list)
             for i, page_info in enumerate(selected_pages):
-                if not isinstance(page_info, dict):
-                    raise Exception(f"Page data at index {i} must be a dictionary")
-                
-                if 'file_id' not in page_info:
-                    raise Exception(f"Missing file_id in page data at index {i}")
-                
-                if 'page_number' in page_info and not isinstance(page_info['page_number'], int):
-                    raise Exception(f"page_number must be an integer in page data at index {i}")
-            
-            # Group pages by file_id
-            files_data = {}
-            for page_info in selected_pages:
-                file_id = page_info.get('file_id')
-                page_number = page_info.get('page_number', 1)
-                
-                if file_id not in files_data:
-                    files_data[file_id] = []
+                file_id, page_number = _parse_page_entry(page_info, i)
                 files_data[file_id].append(page_number)
             
             output_files = []
             
+            # Open the ZIP up front so each output is added right after it is saved
+            zip_filename = f"{output_filename}_split.zip"
+            zip_path = os.path.join(EXPORT_DIR, zip_filename)
+            if _predict_multi_output(split_mode, files_data=files_data, page_ranges=page_ranges,
+                                     pages_per_file=pages_per_file, source_cache=source_cache):
+                zipf = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED)
+            write_files = zipf is None or not zip_only
+            
             # Process each file
             for file_id, page_numbers in files_data.items():
-                # Construct file path
-                filename = f"{file_id}.pdf"
-                file_path = os.path.join(UPLOAD_DIR, filename)
-                
-                if not os.path.exists(file_path):
-                    raise Exception(f"PDF file not found for file_id: {file_id}")
-                
-                # Open PDF
-                pdf_doc = fitz.open(file_path)
+                # Open PDF (closed together with the rest of the cache)
+                pdf_doc = _open_cached_source(source_cache, file_id)
                 total_pages = len(pdf_doc)
                 
                 # Validate page numbers
                 valid_pages = [p for p in page_numbers if 1 <= p <= total_pages]
                 if not valid_pages:
-                    pdf_doc.close()
                     continue
                 
                 if split_mode == 'manual':
@@ -1572,16 +2085,16 @@ def split_pdfs_by_file_ids(input_body):
                         new_doc.insert_pdf(pdf_doc, from_page=page_num-1, to_page=page_num-1)
                         
                         output_filename_gen = f"{output_filename}_file_{file_id}_page_{page_num}.pdf"
-                        output_path = os.path.join(EXPORT_DIR, output_filename_gen)
-                        new_doc.save(output_path)
+                        output_path = EXPORT_PREFIX + output_filename_gen
+                        _save_split_output(new_doc, output_path, zipf, pending_writes, write_files)
                         new_doc.close()
                         
-                        output_files.append({
-                            'filename': output_filename_gen,
-                            'download_url': f'/static/documents/{output_filename_gen}',
-                            'pages': f'{page_num}',
-                            'file_id': file_id
-                        })
+                        output_files.append(SplitOutput(
+                            filename=output_filename_gen,
+                            download_url=f'/static/documents/{output_filename_gen}',
+                            pages=f'{page_num}',
+                            file_id=file_id
+                        ))
                 
                 elif split_mode == 'page_range':
                     # Split by page ranges
@@ -1596,16 +2109,29 @@ def split_pdfs_by_file_ids(input_body):
                                 new_doc.insert_pdf(pdf_doc, from_page=start_page-1, to_page=end_page-1)
                                 
                                 output_filename_gen = f"{output_filename}_file_{file_id}_range_{i+1}.pdf"
-                                output_path = os.path.join(EXPORT_DIR, output_filename_gen)
-                                new_doc.save(output_path)
+                                output_path = EXPORT_PREFIX + output_filename_gen
+                                _save_split_output(new_doc, output_path, zipf, pending_writes, write_files)
                                 new_doc.close()
                                 
-                                output_files.append({
-                                    'filename': output_filename_gen,
-                                    'download_url': f'/static/documents/{output_filename_gen}',
-                                    'pages': f'{start_page}-{end_page}',
-                                    'file_id': file_id
-                                })
+                                output_files.append(SplitOutput(
+                                    filename=output_filename_gen,
+                                    download_url=f'/static/documents/{output_filename_gen}',
+                                    pages=f'{start_page}-{end_page}',
+                                    file_id=file_id
+                                ))
+                
+                elif split_mode == 'fixed_pages' and pages_per_file >= total_pages:
+                    # The only part would hold every page: reuse the uploaded file as is
+                    output_filename_gen = f"{output_filename}_file_{file_id}_part_1.pdf"
+                    output_path = EXPORT_PREFIX + output_filename_gen
+                    _copy_split_source(file_id, output_path, zipf, write_files)
+                    
+                    output_files.append(SplitOutput(
+                        filename=output_filename_gen,
+                        download_url=f'/static/documents/{output_filename_gen}',
+                        pages=f'1-{total_pages}',
+                        file_id=file_id
+                    ))
                 
                 elif split_mode == 'fixed_pages':
                     # Split every N pages
@@ -1615,16 +2141,16 @@ def split_pdfs_by_file_ids(input_body):
                         new_doc.insert_pdf(pdf_doc, from_page=i, to_page=end_page-1)
                         
                         output_filename_gen = f"{output_filename}_file_{file_id}_part_{i//pages_per_file + 1}.pdf"
-                        output_path = os.path.join(EXPORT_DIR, output_filename_gen)
-                        new_doc.save(output_path)
+                        output_path = EXPORT_PREFIX + output_filename_gen
+                        _save_split_output(new_doc, output_path, zipf, pending_writes, write_files)
                         new_doc.close()
                         
-                        output_files.append({
-                            'filename': output_filename_gen,
-                            'download_url': f'/static/documents/{output_filename_gen}',
-                            'pages': f'{i+1}-{end_page}',
-                            'file_id': file_id
-                        })
+                        output_files.append(SplitOutput(
+                            filename=output_filename_gen,
+                            download_url=f'/static/documents/{output_filename_gen}',
+                            pages=f'{i+1}-{end_page}',
+                            file_id=file_id
+                        ))
                 
                 elif split_mode == 'odd_even':
                     # Split into odd and even pages
@@ -1637,78 +2163,101 @@ def split_pdfs_by_file_ids(input_body):
                         else:  # Even pages
                             even_pages.append(page_num - 1)  # Convert to 0-based index
                     
+                    # Serialize the source once; both outputs are pruned copies of it
+                    pdf_bytes = pdf_doc.tobytes()
+                    
                     # Create odd pages PDF
                     if odd_pages:
-                        odd_doc = fitz.open()
-                        for page_index in odd_pages:
-                            odd_doc.insert_pdf(pdf_doc, from_page=page_index, to_page=page_index)
+                        # Reopen the serialized source and keep only the odd pages
+                        odd_doc = fitz.open("pdf", pdf_bytes)
+                        odd_doc.select(odd_pages)
                         
                         odd_filename = f"{output_filename}_file_{file_id}_odd_pages.pdf"
-                        odd_path = os.path.join(EXPORT_DIR, odd_filename)
-                        odd_doc.save(odd_path)
+                        odd_path = EXPORT_PREFIX + odd_filename
+                        _save_split_output(odd_doc, odd_path, zipf, pending_writes, write_files, garbage=1)  # Drop objects of the deselected pages
                         odd_doc.close()
                         
-                        output_files.append({
-                            'filename': odd_filename,
-                            'download_url': f'/static/documents/{odd_filename}',
-                            'pages': f'Odd pages ({len(odd_pages)} pages)',
-                            'file_id': file_id
-                        })
+                        output_files.append(SplitOutput(
+                            filename=odd_filename,
+                            download_url=f'/static/documents/{odd_filename}',
+                            pages=f'Odd pages ({len(odd_pages)} pages)',
+                            file_id=file_id
+                        ))
                     
                     # Create even pages PDF
                     if even_pages:
-                        even_doc = fitz.open()
-                        for page_index in even_pages:
-                            even_doc.insert_pdf(pdf_doc, from_page=page_index, to_page=page_index)
+                        # Reopen the serialized source and keep only the even pages
+                        even_doc = fitz.open("pdf", pdf_bytes)
+                        even_doc.select(even_pages)
                         
                         even_filename = f"{output_filename}_file_{file_id}_even_pages.pdf"
-                        even_path = os.path.join(EXPORT_DIR, even_filename)
-                        even_doc.save(even_path)
+                        even_path = EXPORT_PREFIX + even_filename
+                        _save_split_output(even_doc, even_path, zipf, pending_writes, write_files, garbage=1)  # Drop objects of the deselected pages
                         even_doc.close()
                         
-                        output_files.append({
-                            'filename': even_filename,
-                            'download_url': f'/static/documents/{even_filename}',
-                            'pages': f'Even pages ({len(even_pages)} pages)',
-                            'file_id': file_id
-                        })
+                        output_files.append(SplitOutput(
+                            filename=even_filename,
+                            download_url=f'/static/documents/{even_filename}',
+                            pages=f'Even pages ({len(even_pages)} pages)',
+                            file_id=file_id
+                        ))
+                    
+                    del pdf_bytes
+                
+                elif split_mode == 'split_half' and total_pages <= 1:
+                    # A single page has no second half: reuse the uploaded file as the first half
+                    first_half_filename = f"{output_filename}_file_{file_id}_first_half.pdf"
+                    first_half_path = EXPORT_PREFIX + first_half_filename
+                    _copy_split_source(file_id, first_half_path, zipf, write_files)
+                    
+                    output_files.append(SplitOutput(
+                        filename=first_half_filename,
+                        download_url=f'/static/documents/{first_half_filename}',
+                        pages=f'1-{total_pages}',
+                        file_id=file_id
+                    ))
                 
                 elif split_mode == 'split_half':
                     # Split in half
                     mid_point = (total_pages + 1) // 2
                     
+                    # Serialize the source once; each half is a pruned copy of it
+                    pdf_bytes = pdf_doc.tobytes()
+                    
                     # First half
-                    first_half_doc = fitz.open()
-                    first_half_doc.insert_pdf(pdf_doc, from_page=0, to_page=mid_point-1)
+                    first_half_doc = fitz.open("pdf", pdf_bytes)
+                    first_half_doc.select(list(range(0, mid_point)))
                     
                     first_half_filename = f"{output_filename}_file_{file_id}_first_half.pdf"
-                    first_half_path = os.path.join(EXPORT_DIR, first_half_filename)
-                    first_half_doc.save(first_half_path)
+                    first_half_path = EXPORT_PREFIX + first_half_filename
+                    _save_split_output(first_half_doc, first_half_path, zipf, pending_writes, write_files, garbage=1)
                     first_half_doc.close()
                     
-                    output_files.append({
-                        'filename': first_half_filename,
-                        'download_url': f'/static/documents/{first_half_filename}',
-                        'pages': f'1-{mid_point}',
-                        'file_id': file_id
-                    })
+                    output_files.append(SplitOutput(
+                        filename=first_half_filename,
+                        download_url=f'/static/documents/{first_half_filename}',
+                        pages=f'1-{mid_point}',
+                        file_id=file_id
+                    ))
                     
                     # Second half
                     if mid_point < total_pages:
-                        second_half_doc = fitz.open()
-                        second_half_doc.insert_pdf(pdf_doc, from_page=mid_point, to_page=total_pages-1)
+                        second_half_doc = fitz.open("pdf", pdf_bytes)
+                        second_half_doc.select(list(range(mid_point, total_pages)))
                         
                         second_half_filename = f"{output_filename}_file_{file_id}_second_half.pdf"
-                        second_half_path = os.path.join(EXPORT_DIR, second_half_filename)
-                        second_half_doc.save(second_half_path)
+                        second_half_path = EXPORT_PREFIX + second_half_filename
+                        _save_split_output(second_half_doc, second_half_path, zipf, pending_writes, write_files, garbage=1)
                         second_half_doc.close()
                         
-                        output_files.append({
-                            'filename': second_half_filename,
-                            'download_url': f'/static/documents/{second_half_filename}',
-                            'pages': f'{mid_point+1}-{total_pages}',
-                            'file_id': file_id
-                        })
+                        output_files.append(SplitOutput(
+                            filename=second_half_filename,
+                            download_url=f'/static/documents/{second_half_filename}',
+                            pages=f'{mid_point+1}-{total_pages}',
+                            file_id=file_id
+                        ))
+                    
+                    del pdf_bytes
                 
                 elif split_mode == 'extract_all':
                     # Extract all pages as separate PDFs
@@ -1717,34 +2266,32 @@ def split_pdfs_by_file_ids(input_body):
                         new_doc.insert_pdf(pdf_doc, from_page=page_num-1, to_page=page_num-1)
                         
                         output_filename_gen = f"{output_filename}_file_{file_id}_page_{page_num}.pdf"
-                        output_path = os.path.join(EXPORT_DIR, output_filename_gen)
-                        new_doc.save(output_path)
+                        output_path = EXPORT_PREFIX + output_filename_gen
+                        _save_split_output(new_doc, output_path, zipf, pending_writes, write_files)
                         new_doc.close()
                         
-                        output_files.append({
-                            'filename': output_filename_gen,
-                            'download_url': f'/static/documents/{output_filename_gen}',
-                            'pages': f'{page_num}',
-                            'file_id': file_id
-                        })
+                        output_files.append(SplitOutput(
+                            filename=output_filename_gen,
+                            download_url=f'/static/documents/{output_filename_gen}',
+                            pages=f'{page_num}',
+                            file_id=file_id
+                        ))
                 
-                pdf_doc.close()
+                # Write this source's outputs in one batch
+                _flush_pending_writes(pending_writes)
             
-            # Create ZIP file if multiple files
-            if len(output_files) > 1:
-                zip_filename = f"{output_filename}_split.zip"
-                zip_path = os.path.join(EXPORT_DIR, zip_filename)
-                
-                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for output_file in output_files:
-                        file_path = os.path.join(EXPORT_DIR, output_file['filename'])
-                        if os.path.exists(file_path):
-                            zipf.write(file_path, output_file['filename'])
-                
+            # Finish the ZIP that was filled while splitting (in ZIP-only mode it
+            # holds the only copy, so it is kept even for a single output)
+            return_zip = len(output_files) > 1 or (output_files and not write_files)
+            _close_split_zip(zipf, zip_path, keep=return_zip)
+            zipf = None
+            if not write_files:
+                output_files = [output_file._replace(download_url=None) for output_file in output_files]
+            if return_zip:
                 return {
                     'success': True,
                     'message': f'PDFs split successfully into {len(output_files)} files',
-                    'output_files': output_files,
+                    'output_files': [output_file._asdict() for output_file in output_files],
                     'zip_filename': zip_filename,
                     'download_url': f'/static/documents/{zip_filename}'
                 }
@@ -1753,15 +2300,24 @@ def split_pdfs_by_file_ids(input_body):
                 return {
                     'success': True,
                     'message': 'PDFs split successfully',
-                    'output_files': output_files,
-                    'download_url': output_files[0]['download_url'] if output_files else None
+                    'output_files': [output_file._asdict() for output_file in output_files],
+                    'download_url': output_files[0].download_url if output_files else None
                 }
         
     except Exception as e:
         raise Exception(f"PDF split failed: {str(e)}")
+    finally:
+        # Discard a partially written ZIP if splitting failed
+        if zipf is not None:
+            _close_split_zip(zipf, zipf.filename, keep=False)
+        
+        # Close every source document opened during this request
+        _close_cached_sources(source_cache)
 
 def merge_pdfs_by_file_ids(input_body):
     """Merge PDFs using file_ids with support for page selection and rotation"""
+    # Parsed source documents keyed by file_id
+    source_cache = {}
     try:
         # Validate input structure
         if 'tasks' not in input_body or 'merge' not in input_body['tasks']:
@@ -1782,20 +2338,6 @@ def merge_pdfs_by_file_ids(input_body):
         if len(pages_data) == 0:
             raise Exception("At least one page must be specified for merging")
         
-        # Validate each page entry
-        for i, page_info in enumerate(pages_data):
-            if not isinstance(page_info, dict):
-                raise Exception(f"Page data at index {i} must be a dictionary")
-            
-            if 'file_id' not in page_info:
-                raise Exception(f"Missing file_id in page data at index {i}")
-            
-            if 'page_number' in page_info and not isinstance(page_info['page_number'], int):
-                raise Exception(f"page_number must be an integer in page data at index {i}")
-            
-            if 'rotation' in page_info and not isinstance(page_info['rotation'], int):
-                raise Exception(f"rotation must be an integer in page data at index {i}")
-        
         # Get output filename from options or generate one
         output_filename = options.get('output_filename', str(uuid.uuid4()) + '.pdf')
         if not output_filename.endswith('.pdf'):
@@ -1803,70 +2345,53 @@ def merge_pdfs_by_file_ids(input_body):
         
         output_path = os.path.join(EXPORT_DIR, output_filename)
         
-        # Merge PDFs
-        merger = fitz.open()
-        
-        for page_info in pages_data:
-            file_id = page_info.get('file_id')
-            page_number = page_info.get('page_number', 1)
+        # Group consecutive pages of the same file and rotation into runs
+        # of [file_id, rotation, first_page_index, last_page_index]
+        runs = []
+        for i, page_info in enumerate(pages_data):
+            # Validate the entry while grouping, so pages_data is walked only once
+            file_id, page_number = _parse_page_entry(page_info, i)
             rotation = page_info.get('rotation', 0)
+            if not _is_strict_int(rotation):
+                raise Exception(f"rotation must be an integer in page data at index {i}")
             
             if not file_id:
                 raise Exception("Missing file_id in page data")
             
-            # Construct file path
-            filename = f"{file_id}.pdf"
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            
-            if not os.path.exists(file_path):
-                raise Exception(f"PDF file not found for file_id: {file_id}")
-            
-            # Open PDF
-            pdf_doc = fitz.open(file_path)
+            # Open PDF (once per file_id for the whole merge)
+            pdf_doc = _open_cached_source(source_cache, file_id)
             total_pages = len(pdf_doc)
             
             # Validate page number
             if page_number < 1 or page_number > total_pages:
-                pdf_doc.close()
                 raise Exception(f"Invalid page number {page_number} for file {file_id} (total pages: {total_pages})")
             
             # Get the specific page (0-indexed)
             page_index = page_number - 1
-            page = pdf_doc[page_index]
             
-            # Apply rotation if specified
-            if rotation != 0:
-                # Create a new document with just this rotated page
-                temp_doc = fitz.open()
-                temp_doc.insert_pdf(pdf_doc, from_page=page_index, to_page=page_index)
-                
-                # Apply rotation to the page
-                temp_doc[0].set_rotation(rotation)
-                
-                # Insert the rotated page into the merger
-                merger.insert_pdf(temp_doc)
-                temp_doc.close()
+            last_run = runs[-1] if runs else None
+            if last_run and last_run[0] == file_id and last_run[1] == rotation and last_run[3] == page_index - 1:
+                last_run[3] = page_index
             else:
-                # Insert the page without rotation
-                merger.insert_pdf(pdf_doc, from_page=page_index, to_page=page_index)
+                runs.append([file_id, rotation, page_index, page_index])
+        
+        # Merge PDFs with a single insert per run
+        merger = fitz.open()
+        
+        for file_id, rotation, first_page, last_page in runs:
+            start_idx = len(merger)
+            merger.insert_pdf(source_cache[file_id], from_page=first_page, to_page=last_page)
             
-            pdf_doc.close()
+            # Apply rotation if specified to the pages we just added
+            if rotation:
+                for page_idx in range(start_idx, len(merger)):
+                    merger[page_idx].set_rotation(rotation)
         
         # Get compression level from options
         compression_level = options.get('compression_level', 'none')
         
-        # Save merged PDF with compression if specified
-        if compression_level != 'none':
-            if compression_level == 'low':
-                merger.save(output_path, garbage=1, deflate=True)
-            elif compression_level == 'medium':
-                merger.save(output_path, garbage=2, deflate=True)
-            elif compression_level == 'high':
-                merger.save(output_path, garbage=3, deflate=True, clean=True)
-            else:
-                merger.save(output_path)
-        else:
-            merger.save(output_path)
+        # Save merged PDF with compression if specified (unknown levels save uncompressed)
+        merger.save(output_path, **MERGE_SAVE_OPTIONS.get(compression_level, {}))
         
         merger.close()
         
@@ -1880,4 +2405,6 @@ def merge_pdfs_by_file_ids(input_body):
         }
         
     except Exception as e:
-        raise Exception(f"PDF merge failed: {str(e)}")
\ No newline at end of file
+        raise Exception(f"PDF merge failed: {str(e)}")
+    finally:
+        _close_cached_sources(source_cache)
@@ -0,0 +1,110 @@
+import os
+import re
+import time
+import uuid
+import shutil
+import tempfile
+from flask import after_this_request
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+
+# Raw uploads staged by /upload-stream until a conversion request picks them up by upload_id
+STREAM_UPLOAD_DIR = os.path.join(tempfile.gettempdir(), 'converter_stream_uploads')
+os.makedirs(STREAM_UPLOAD_DIR, exist_ok=True)
+
+# Copy buffer for writing the request body to disk
+STREAM_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Staged uploads nobody converted are removed after this long
+STREAM_UPLOAD_MAX_AGE = 60 * 60  # seconds
+
+# Present in an upload directory while its body is still streaming in or a conversion
+# is using it; such directories are only swept once the marker is this old (left
+# behind by a worker that died)
+IN_USE_MARKER = '.in-use'
+IN_USE_MAX_AGE = 24 * 60 * 60  # seconds
+
+UPLOAD_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+class StreamedUpload(FileStorage):
+    """A staged upload, shaped like the multipart FileStorage the conversion services take"""
+
+    def __init__(self, path):
+        super().__init__(stream=open(path, 'rb'), filename=os.path.basename(path))
+        self.path = path
+
+    def save(self, dst, buffer_size=16384):
+        if not isinstance(dst, str):
+            return super().save(dst, buffer_size)
+        # The bytes are already on disk: rename them into place (a copy only across filesystems)
+        self.stream.close()
+        shutil.move(self.path, dst)
+
+    def close(self):
+        self.stream.close()
+        shutil.rmtree(os.path.dirname(self.path), ignore_errors=True)
+
+def _remove_stale_uploads():
+    """Delete staged uploads older than STREAM_UPLOAD_MAX_AGE that are not in use"""
+    now = time.time()
+    for entry in os.scandir(STREAM_UPLOAD_DIR):
+        try:
+            if entry.stat().st_mtime >= now - STREAM_UPLOAD_MAX_AGE:
+                continue
+            try:
+                if os.stat(os.path.join(entry.path, IN_USE_MARKER)).st_mtime >= now - IN_USE_MAX_AGE:
+                    continue
+            except FileNotFoundError:
+                pass
+            shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            pass
+
+def stage_stream_upload(stream, filename):
+    """Write a raw request body to disk in one pass, returning the upload_id that refers to it"""
+    filename = secure_filename(filename or '')
+    if not os.path.splitext(filename)[1]:
+        raise ValueError("A filename with an extension is required")
+
+    _remove_stale_uploads()
+    upload_id = uuid.uuid4().hex
+    upload_dir = os.path.join(STREAM_UPLOAD_DIR, upload_id)
+    os.makedirs(upload_dir)
+    in_use_path = os.path.join(upload_dir, IN_USE_MARKER)
+    try:
+        open(in_use_path, 'x').close()
+        with open(os.path.join(upload_dir, filename), 'wb') as output:
+            shutil.copyfileobj(stream, output, STREAM_UPLOAD_CHUNK_SIZE)
+        # The max age counts from when the upload finished, not from when it started
+        os.utime(upload_dir)
+        os.remove(in_use_path)
+    except Exception:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise
+    return upload_id
+
+def open_stream_upload(upload_id):
+    """Get a staged upload by id as a FileStorage-like object, or None; it is removed after the request"""
+    if not upload_id or not UPLOAD_ID_PATTERN.fullmatch(upload_id):
+        return None
+    upload_dir = os.path.join(STREAM_UPLOAD_DIR, upload_id)
+    # Claim the upload so the stale sweep leaves it alone while it converts; an upload
+    # still streaming in or already claimed by another request is not available
+    try:
+        open(os.path.join(upload_dir, IN_USE_MARKER), 'x').close()
+        os.utime(upload_dir)
+        filenames = [name for name in os.listdir(upload_dir) if name != IN_USE_MARKER]
+    except OSError:
+        return None
+    if len(filenames) != 1:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return None
+
+    upload = StreamedUpload(os.path.join(upload_dir, filenames[0]))
+
+    @after_this_request
+    def remove_upload(response):
+        upload.close()
+        return response
+
+    return upload
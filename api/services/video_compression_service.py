@@ -1,21 +1,186 @@
 import os
+import re
+import json
+import hashlib
 import uuid
 import subprocess
 import tempfile
+import shutil
+import threading
+import contextlib
+from collections import deque, namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 EXPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'static', 'videos')
 os.makedirs(EXPORT_DIR, exist_ok=True)
 
+# NVIDIA hardware encoders for the codecs that have one
+NVENC_ENCODERS = {'h264': 'h264_nvenc', 'h265': 'hevc_nvenc'}
+
+# Codec of the CPU encoders that get_nvenc_command swaps for NVENC
+NVENC_SOFTWARE_ENCODERS = {'libx264': 'h264', 'libx265': 'h265'}
+
+# Encoder arguments and CRF offset for each 'speed' option; 'balanced' is the long-standing default.
+# Faster presets raise the CRF a little so the extra speed doesn't come with bigger files
+SPEED_PRESETS = {
+    'libx264': {'fast': (['-preset', 'veryfast'], 2), 'balanced': (['-preset', 'medium'], 0), 'quality': (['-preset', 'slow'], -2)},
+    'libx265': {'fast': (['-preset', 'veryfast'], 2), 'balanced': (['-preset', 'medium'], 0), 'quality': (['-preset', 'slow'], -2)},
+    'libvpx': {'fast': (['-deadline', 'good', '-cpu-used', '4'], 0), 'balanced': ([], 0), 'quality': (['-deadline', 'good', '-cpu-used', '0'], 0)},
+    'libvpx-vp9': {'fast': (['-deadline', 'good', '-cpu-used', '4', '-row-mt', '1'], 0), 'balanced': ([], 0), 'quality': (['-deadline', 'good', '-cpu-used', '0'], 0)},
+    'libsvtav1': {'fast': (['-preset', '12'], 0), 'balanced': (['-preset', '8'], 0), 'quality': (['-preset', '4'], 0)},
+    'libaom-av1': {'fast': (['-cpu-used', '8', '-row-mt', '1'], 0), 'balanced': ([], 0), 'quality': (['-cpu-used', '2'], 0)}
+}
+
+# NVENC presets for each 'speed' option ('balanced' matches the software encoders' 'medium')
+NVENC_PRESETS = {'fast': 'p2', 'balanced': 'p4', 'quality': 'p6'}
+
+# Encodes run at the same time, each with an equal share of the cores; more would only
+# fight over the CPU caches and finish later than queueing
+MAX_CONCURRENT_ENCODES = max(1, (os.cpu_count() or 4) // 4)
+ENCODE_THREADS = max(1, (os.cpu_count() or 4) // MAX_CONCURRENT_ENCODES)
+
+# Threads for each encoder of a segmented encode, which runs ENCODE_THREADS // SEGMENT_ENCODE_THREADS of them
+SEGMENT_ENCODE_THREADS = 2
+
+# Software encodes of inputs longer than this are split on keyframes and the segments encoded in parallel
+SEGMENT_THRESHOLD_SEC = 120
+SEGMENT_TIME_SEC = 30
+
+# Lines of FFmpeg's stderr kept for error messages; the rest of its log is discarded as it streams
+FFMPEG_STDERR_TAIL_LINES = 20
+
+# Copy buffer for saving the upload to disk (Werkzeug's default is 16 KiB)
+UPLOAD_COPY_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Upload extensions FFmpeg can demux from a pipe, with the demuxer to use. MP4/MOV are missing on
+# purpose: their index is often written at the end, which a pipe cannot seek to
+PIPE_INPUT_FORMATS = {
+    '.webm': 'webm',
+    '.mkv': 'matroska',
+    '.flv': 'flv',
+    '.ts': 'mpegts',
+    '.mts': 'mpegts',
+    '.mpg': 'mpeg',
+    '.mpeg': 'mpeg'
+}
+
+# Uploads are piped to FFmpeg in chunks of this size
+PIPE_INPUT_CHUNK_SIZE = 1024 * 1024
+
+# Codecs each output container can hold; anything else is replaced by the first (default) entry
+CONTAINER_CODECS = {
+    '.webm': (['vp8', 'vp9'], ['vorbis', 'opus']),
+    '.avi': (['h264', 'h265'], ['mp3', 'aac']),
+    '.mov': (['h264', 'h265'], ['aac', 'mp3']),
+    '.mkv': (['h264', 'h265', 'vp8', 'vp9'], ['aac', 'mp3', 'vorbis', 'opus']),
+    '.flv': (['h264', 'h265'], ['mp3', 'aac']),
+    '.wmv': (['h264', 'h265'], ['mp3', 'aac']),
+    '.m4v': (['h264', 'h265'], ['aac', 'mp3']),
+    '.3gp': (['h264', 'h265'], ['aac', 'mp3'])
+}
+
+# Everything needed to build the FFmpeg commands of one compression request
+CompressionJob = namedtuple(
+    'CompressionJob',
+    'input_path output_path output_format video_codec audio_codec compression_level video_bitrate '
+    'audio_bitrate width height fps_value remove_audio two_pass optimize_web speed mp4_mode'
+)
+
+# 'WIDTHxHEIGHT' resolution option; a negative side (e.g. -2x720) keeps the aspect ratio in FFmpeg's scale filter
+RESOLUTION_PATTERN = re.compile(r'(-?\d{1,5})x(-?\d{1,5})')
+
+# Frame rate option: a whole number of frames per second
+FPS_PATTERN = re.compile(r'\d{1,3}')
+
+# Bounds the numeric options are clamped to, so a request can't ask for a runaway encode
+VIDEO_BITRATE_RANGE = (100, 50000)  # kbps
+AUDIO_BITRATE_RANGE = (32, 512)  # kbps
+COMPRESSION_LEVEL_RANGE = (0, 63)  # CRF; x264/x265 stop at 51, VP8/VP9 at 63
+
+# Quality settings a request gets when it leaves them out; only a request at these
+# defaults may be answered with a stream copy of an upload already within the bitrates
+DEFAULT_COMPRESSION_LEVEL = 23
+DEFAULT_SPEED = 'balanced'
+
+# Muxer flags for MP4/MOV outputs. faststart moves the index (moov atom) to the front after encoding so
+# players can start before the download ends; fragmented writes a streamable file in one go
+MP4_MUX_ARGS = {
+    'faststart': ['-movflags', '+faststart'],
+    'fragmented': ['-movflags', '+frag_keyframe+empty_moov+default_base_moof', '-frag_duration', '1000000'],
+}
+
+# ffprobe codec names that differ from the option names
+PROBE_CODEC_NAMES = {'h265': 'hevc'}
+
+# Encoders for each video codec, preferred first
+VIDEO_ENCODER_CHOICES = {
+    'h264': ['libx264', 'libopenh264'],
+    'h265': ['libx265'],
+    'vp8': ['libvpx'],
+    'vp9': ['libvpx-vp9'],
+    'av1': ['libaom-av1', 'libsvtav1', 'librav1e']
+}
+
+# Finished compressions remembered for identical repeat requests
+COMPRESSION_CACHE_MAX_SIZE = 256
+
+# (upload SHA-256, job settings, hardwareAccel) -> (output filename, video encoder), least recently used first
+_compression_cache = OrderedDict()
+_compression_cache_lock = threading.Lock()
+
+_encode_semaphore = threading.BoundedSemaphore(MAX_CONCURRENT_ENCODES)
+
+def _list_ffmpeg_capabilities(flag):
+    """List the names ffmpeg prints for -encoders or -hwaccels, empty when ffmpeg cannot be run"""
+    try:
+        output = subprocess.run(['ffmpeg', '-hide_banner', flag], capture_output=True, text=True, timeout=30).stdout
+    except (OSError, subprocess.SubprocessError):
+        return frozenset()
+    
+    if flag == '-encoders':
+        # Encoder rows follow the legend's ' ------' line: ' V....D libx264   description'
+        rows = [row.split() for row in output.split(' ------', 1)[-1].splitlines()]
+        return frozenset(row[1] for row in rows if len(row) > 1)
+    # -hwaccels prints a header line, then one method per line
+    return frozenset(line.strip() for line in output.splitlines()[1:] if line.strip())
+
+# What this host's ffmpeg was built with, read once at import instead of per request
+_AVAILABLE_ENCODERS = _list_ffmpeg_capabilities('-encoders')
+_AVAILABLE_HWACCELS = _list_ffmpeg_capabilities('-hwaccels')
+
+def _probe_encoder(encoder):
+    """Check that ffmpeg lists an encoder and can actually open it (NVENC also needs a usable GPU)"""
+    if encoder not in _AVAILABLE_ENCODERS:
+        return False
+    
+    try:
+        # Static ffmpeg builds list NVENC even without a GPU, so encode a few test frames
+        test = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-f', 'lavfi', '-i', 'color=size=256x256:duration=0.2',
+             '-c:v', encoder, '-f', 'null', '-'],
+            capture_output=True, timeout=30
+        )
+        return test.returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+# Whether a GPU can actually run each NVENC encoder, also probed at import: hosts whose ffmpeg doesn't
+# list NVENC skip the test encode, and GPU hosts pay for it at start-up instead of in a request
+_HWACCEL_CAPS = {encoder: _probe_encoder(encoder) for encoder in NVENC_ENCODERS.values()}
+
+def is_encoder_available(encoder):
+    """Check an encoder against ffmpeg's encoder list; anything passes when the list could not be read"""
+    return not _AVAILABLE_ENCODERS or encoder in _AVAILABLE_ENCODERS
+
+@lru_cache(maxsize=None)
 def get_video_codec_params(codec):
     """Get codec-specific parameters for video compression"""
-    codec_map = {
-        'h264': 'libx264',
-        'h265': 'libx265', 
-        'vp8': 'libvpx',
-        'vp9': 'libvpx-vp9',
-        'av1': 'libaom-av1'
-    }
-    return codec_map.get(codec, 'libx264')
+    choices = VIDEO_ENCODER_CHOICES.get(codec, VIDEO_ENCODER_CHOICES['h264'])
+    for encoder in choices:
+        if is_encoder_available(encoder):
+            return encoder
+    return choices[0]
 
 def get_audio_codec_params(codec):
     """Get codec-specific parameters for audio compression"""
@@ -27,183 +192,538 @@ def get_audio_codec_params(codec):
     }
     return codec_map.get(codec, 'aac')
 
-def parse_resolution(resolution_str):
-    """Parse resolution string to width and height"""
-    if not resolution_str or resolution_str == 'original':
-        return None, None
+def run_ffmpeg(ffmpeg_cmd, duration=None, timeout=600, stdin_file=None):
+    """Run an FFmpeg command, logging its progress and keeping only the tail of stderr for errors.
+    stdin_file is streamed to FFmpeg's stdin for commands reading '-i pipe:0'"""
+    ffmpeg_cmd = ffmpeg_cmd[:1] + ['-nostats', '-progress', 'pipe:1'] + ffmpeg_cmd[1:]
+    process = subprocess.Popen(
+        ffmpeg_cmd, stdin=subprocess.PIPE if stdin_file is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        # FFmpeg echoes input metadata in whatever encoding the file used; a strict
+        # decode error would kill the stderr reader and leave FFmpeg blocked on the pipe
+        errors='replace'
+    )
+    
+    # Drain stderr on its own thread so a chatty encoder never blocks on a full pipe
+    stderr_tail = deque(maxlen=FFMPEG_STDERR_TAIL_LINES)
+    stderr_reader = threading.Thread(target=stderr_tail.extend, args=(process.stderr,), daemon=True)
+    stderr_reader.start()
+    
+    stdin_writer = None
+    if stdin_file is not None:
+        def feed_stdin():
+            try:
+                shutil.copyfileobj(stdin_file, process.stdin.buffer, PIPE_INPUT_CHUNK_SIZE)
+                process.stdin.close()
+            except OSError:
+                pass  # FFmpeg stopped reading; its exit status says why
+        stdin_writer = threading.Thread(target=feed_stdin, daemon=True)
+        stdin_writer.start()
+    
+    timed_out = threading.Event()
+    def kill():
+        timed_out.set()
+        process.kill()
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer:
+        timer.start()
     
     try:
-        width, height = resolution_str.split('x')
-        return int(width), int(height)
-    except:
-        return None, None
-
-def compress_video(file, input_body):
-    """Compress video with advanced compression settings"""
-    # Save uploaded file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
+        # -progress writes key=value lines; readline blocks until FFmpeg has something to report
+        reported = 0
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            if duration and key in ('out_time_us', 'out_time_ms') and value.isdigit():
+                percent = min(int(int(value) / 10000 / duration), 100)
+                if percent >= reported + 10:
+                    reported = percent - percent % 10
+                    print(f"FFmpeg progress: {reported}%")
+        process.wait()
+    finally:
+        if timer:
+            timer.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+    stderr_reader.join()
+    if stdin_writer:
+        stdin_writer.join()
+    
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(ffmpeg_cmd, timeout)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, ffmpeg_cmd, stderr=''.join(stderr_tail))
 
+def _drop_from_page_cache(path):
+    """Tell the kernel a file's cached pages won't be read again soon (no-op where fadvise is missing)"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
     try:
-        # Validate input structure
-        if 'tasks' not in input_body or 'compress' not in input_body['tasks']:
-            raise Exception("Invalid input structure: missing 'tasks' or 'compress'")
-        
-        compress_task = input_body['tasks']['compress']
-        options = compress_task.get('options', {})
-        if options is None:
-            options = {}
-        
-        # Get compression parameters with defaults
-        video_codec = options.get('videoCodec', 'h264')
-        video_bitrate = options.get('videoBitrate', 2000)  # kbps
-        compression_level = options.get('compressionLevel', 23)  # CRF value
-        resolution = options.get('resolution', 'original')
-        frame_rate = options.get('frameRate', 'original')
-        remove_audio = options.get('removeAudio', False)
-        audio_codec = options.get('audioCodec', 'aac')
-        audio_bitrate = options.get('audioBitrate', 128)  # kbps
-        two_pass = options.get('twoPassEncoding', False)
-        optimize_web = options.get('optimizeForWeb', True)
-        
-        # Generate output filename - ALWAYS preserve original extension for compression
-        input_ext = os.path.splitext(file.filename)[1].lower()
-        print(f"Original filename: {file.filename}, extracted extension: '{input_ext}'")
-        # For compression, always keep the same extension as the original file
-        # If no extension found, default to .mp4
-        if not input_ext:
-            input_ext = '.mp4'
-            print(f"No extension found, defaulting to: {input_ext}")
-        output_format = input_ext
-        output_filename = str(uuid.uuid4()) + output_format
-        output_path = os.path.join(EXPORT_DIR, output_filename)
-        print(f"Final output format: '{output_format}', filename: {output_filename}")
-        
-        # Adjust codec based on output format for compatibility
-        # For compression, we need to ensure the codec is compatible with the original format
-        if output_format == '.webm':
-            video_codec = 'vp8' if video_codec not in ['vp8', 'vp9'] else video_codec
-            audio_codec = 'vorbis' if audio_codec not in ['vorbis', 'opus'] else audio_codec
-        elif output_format == '.avi':
-            video_codec = 'h264' if video_codec not in ['h264', 'h265'] else video_codec
-            audio_codec = 'mp3' if audio_codec not in ['mp3', 'aac'] else audio_codec
-        elif output_format == '.mov':
-            video_codec = 'h264' if video_codec not in ['h264', 'h265'] else video_codec
-            audio_codec = 'aac' if audio_codec not in ['aac', 'mp3'] else audio_codec
-        elif output_format == '.mkv':
-            # MKV is a container format, can use various codecs
-            video_codec = 'h264' if video_codec not in ['h264', 'h265', 'vp8', 'vp9'] else video_codec
-            audio_codec = 'aac' if audio_codec not in ['aac', 'mp3', 'vorbis', 'opus'] else audio_codec
-        elif output_format == '.flv':
-            video_codec = 'h264' if video_codec not in ['h264', 'h265'] else video_codec
-            audio_codec = 'mp3' if audio_codec not in ['mp3', 'aac'] else audio_codec
-        elif output_format == '.wmv':
-            video_codec = 'h264' if video_codec not in ['h264', 'h265'] else video_codec
-            audio_codec = 'mp3' if audio_codec not in ['mp3', 'aac'] else audio_codec
-        elif output_format == '.m4v':
-            video_codec = 'h264' if video_codec not in ['h264', 'h265'] else video_codec
-            audio_codec = 'aac' if audio_codec not in ['aac', 'mp3'] else audio_codec
-        elif output_format == '.3gp':
-            video_codec = 'h264' if video_codec not in ['h264', 'h265'] else video_codec
-            audio_codec = 'aac' if audio_codec not in ['aac', 'mp3'] else audio_codec
-        # For any other format, use the user-selected codecs or defaults
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+def get_nvenc_encoder(codec):
+    """Get the NVENC encoder for a codec when this host can use it, otherwise None"""
+    encoder = NVENC_ENCODERS.get(codec)
+    return encoder if _HWACCEL_CAPS.get(encoder) else None
+
+def get_nvenc_command(ffmpeg_cmd, cuda_frames=False):
+    """Rewrite a command's libx264/libx265 outputs for NVENC: decode on the GPU and replace -preset/-crf/-threads/-tune
+    with NVENC's constant-quality mode. cuda_frames keeps decoded frames in GPU memory, for commands whose
+    filters all run on the GPU. Returns None when no output can use NVENC on this host"""
+    nvenc_cmd = []
+    args = list(ffmpeg_cmd)
+    i = 0
+    while i < len(args):
+        nvenc_encoder = None
+        if args[i] == '-c:v' and i + 1 < len(args) and args[i + 1] in NVENC_SOFTWARE_ENCODERS:
+            nvenc_encoder = get_nvenc_encoder(NVENC_SOFTWARE_ENCODERS[args[i + 1]])
+        if not nvenc_encoder:
+            nvenc_cmd.append(args[i])
+            i += 1
+            continue
         
-        # Build FFmpeg command for compression
-        ffmpeg_cmd = ['ffmpeg', '-y', '-i', input_path]
+        i += 2
+        cq = '23'
+        while i < len(args) and args[i] in ('-preset', '-crf', '-threads', '-tune'):
+            if args[i] == '-crf':
+                cq = args[i + 1]
+            i += 2
+        nvenc_cmd += ['-c:v', nvenc_encoder, '-preset', NVENC_PRESETS['balanced'], '-tune', 'hq',
+                      '-rc', 'vbr', '-cq', cq, '-b:v', '0']
+    if nvenc_cmd == args:
+        return None
+    
+    if 'cuda' in _AVAILABLE_HWACCELS:
+        input_index = nvenc_cmd.index('-i')
+        nvenc_cmd[input_index:input_index] = ['-hwaccel', 'cuda'] + (['-hwaccel_output_format', 'cuda'] if cuda_frames else [])
+    return nvenc_cmd
+
+def coerce_codecs(output_format, video_codec, audio_codec):
+    """Replace codecs the output container cannot hold with its default ones"""
+    if output_format not in CONTAINER_CODECS:
+        return video_codec, audio_codec
+    video_codecs, audio_codecs = CONTAINER_CODECS[output_format]
+    return (video_codec if video_codec in video_codecs else video_codecs[0],
+            audio_codec if audio_codec in audio_codecs else audio_codecs[0])
+
+def get_video_encode_args(job, nvenc_encoder=None, threads=ENCODE_THREADS):
+    """Get the input (decoder) and video output FFmpeg arguments, for NVENC when an encoder is given"""
+    video_codec, compression_level, speed = job.video_codec, job.compression_level, job.speed
+    if nvenc_encoder:
+        video_args = ['-c:v', nvenc_encoder, '-preset', NVENC_PRESETS.get(speed, NVENC_PRESETS['balanced']),
+                      '-rc', 'vbr', '-cq', str(compression_level), '-b:v', '0']
+        if 'cuda' in _AVAILABLE_HWACCELS:
+            # Decode on the GPU and keep frames in CUDA memory through scaling and encoding
+            input_args = ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda']
+            scale_filter = 'scale_cuda'
+        else:
+            input_args = []
+            scale_filter = 'scale'
+    else:
+        input_args = []
+        encoder = get_video_codec_params(video_codec)
+        video_args = ['-c:v', encoder]
+        scale_filter = 'scale'
         
-        # Video codec and compression settings
-        video_codec_param = get_video_codec_params(video_codec)
-        ffmpeg_cmd += ['-c:v', video_codec_param]
+        # Encoder preset for encoding speed vs compression efficiency
+        presets = SPEED_PRESETS.get(encoder, {})
+        speed_args, crf_offset = presets.get(speed) or presets.get('balanced', ([], 0))
+        crf = max(0, int(compression_level) + crf_offset) if crf_offset else compression_level
         
         # Compression level (CRF - lower is better quality, higher is smaller file)
         if video_codec in ['h264', 'h265']:
-            ffmpeg_cmd += ['-crf', str(compression_level)]
-            # Add preset for encoding speed vs compression efficiency
-            ffmpeg_cmd += ['-preset', 'medium']
+            video_args += ['-crf', str(crf)]
+            video_args += speed_args
         elif video_codec in ['vp8', 'vp9']:
             # For VP8/VP9, use quality-based encoding
-            ffmpeg_cmd += ['-crf', str(compression_level), '-b:v', '0']
+            video_args += ['-crf', str(crf), '-b:v', '0'] + speed_args
+        else:
+            video_args += speed_args
         
         # Video bitrate (if not using CRF-only encoding)
-        if video_codec not in ['h264', 'h265'] or two_pass:
-            ffmpeg_cmd += ['-b:v', f'{video_bitrate}k']
+        if video_codec not in ['h264', 'h265'] or job.two_pass:
+            video_args += ['-b:v', f'{job.video_bitrate}k']
         
-        # Resolution scaling
-        width, height = parse_resolution(resolution)
-        vf_filters = []
-        if width and height:
-            vf_filters.append(f'scale={width}:{height}')
+        # This encode's share of the cores, with the encoders' own thread pools held to it as well
+        video_args += ['-threads', str(threads)]
+        if encoder == 'libx264':
+            video_args += ['-x264-params', f'lookahead-threads={max(1, threads // 4)}:sliced-threads=0']
+        elif encoder == 'libx265':
+            video_args += ['-x265-params', f'pools={threads}']
+    
+    # Resolution scaling and frame rate
+    vf_filters = []
+    if job.width and job.height:
+        vf_filters.append(f'{scale_filter}={job.width}:{job.height}')
+    if job.fps_value:
+        vf_filters.append(f'fps={job.fps_value}')
+    # Pin 8-bit 4:2:0 after scaling, so 10-bit or 4:2:2 sources (ProRes, HDR) do not push H.264/H.265
+    # into a slower high-bit-depth profile that most players reject; CUDA frames keep the encoder's format
+    if video_codec in ['h264', 'h265'] and job.output_format != '.webm' and scale_filter == 'scale':
+        vf_filters.append('format=yuv420p')
+    
+    # Apply video filters
+    if vf_filters:
+        video_args += ['-vf', ','.join(vf_filters)]
+    
+    return input_args, video_args
+
+def get_audio_output_args(job):
+    """Get the FFmpeg audio arguments of a compression job"""
+    if job.remove_audio:
+        return ['-an']  # Remove audio
+    
+    audio_args = ['-c:a', get_audio_codec_params(job.audio_codec), '-b:a', f'{job.audio_bitrate}k']
+    
+    # Audio quality settings
+    if job.audio_codec == 'aac':
+        audio_args += ['-profile:a', 'aac_low']
+    elif job.audio_codec == 'mp3':
+        audio_args += ['-q:a', '2']  # High quality MP3
+    return audio_args
+
+def get_mp4_mux_args(output_format, mp4_mode=None):
+    """Get the streaming muxer arguments for an MP4/MOV output (with or without the leading dot)"""
+    if output_format.lstrip('.') not in ('mp4', 'mov'):
+        return []
+    return list(MP4_MUX_ARGS.get(mp4_mode, MP4_MUX_ARGS['faststart']))
+
+def get_container_args(job):
+    """Get the web optimization arguments for a job's output container"""
+    if not job.optimize_web:
+        return []
+    if job.output_format in ['.mp4', '.mov'] and job.mp4_mode == 'fragmented':
+        # Fragmented MP4 is streamable as written, without faststart's second pass over the whole file,
+        # but some older players and editors can't open it
+        return get_mp4_mux_args(job.output_format, 'fragmented')
+    if job.output_format == '.mp4':
+        return ['-movflags', '+faststart']  # Move metadata to beginning for MP4
+    if job.output_format == '.webm':
+        return ['-dash', '1']  # Enable DASH for WebM
+    if job.output_format == '.mkv':
+        return ['-fflags', '+genpts']  # Generate presentation timestamps for MKV
+    return []
+
+def build_ffmpeg_argv(job, nvenc_encoder=None, stream_copy=False, pass_number=None, passlog_file=None):
+    """Build the FFmpeg command for a compression job without running anything"""
+    if stream_copy:
+        return ['ffmpeg', '-y', '-i', job.input_path, '-c', 'copy'] + get_container_args(job) + [job.output_path]
+    
+    input_args, video_args = get_video_encode_args(job, nvenc_encoder)
+    ffmpeg_cmd = ['ffmpeg', '-y'] + input_args + ['-i', job.input_path] + video_args
+    
+    if pass_number == 1:
+        # First pass only gathers video statistics, so it skips audio and discards its output
+        return ffmpeg_cmd + ['-an', '-pass', '1', '-passlogfile', passlog_file, '-f', 'null', '-']
+    
+    ffmpeg_cmd += get_audio_output_args(job) + get_container_args(job)
+    if pass_number == 2:
+        ffmpeg_cmd += ['-pass', '2', '-passlogfile', passlog_file]
+    return ffmpeg_cmd + [job.output_path]
+
+def _probe_streams(input_path):
+    """Probe the input's streams and container with ffprobe, or None if it cannot be read"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_streams', '-show_format', input_path],
+            capture_output=True, text=True, timeout=60
+        )
+        if result.returncode != 0:
+            return None
+        return json.loads(result.stdout)
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+
+def _can_stream_copy(probe, video_codec, video_bitrate, audio_codec, audio_bitrate):
+    """Check whether the probed input already has the requested codecs within the target bitrates"""
+    if not probe:
+        return False
+    
+    streams = probe.get('streams', [])
+    video_streams = [s for s in streams if s.get('codec_type') == 'video']
+    audio_streams = [s for s in streams if s.get('codec_type') == 'audio']
+    if len(video_streams) != 1 or len(audio_streams) > 1:
+        return False
+    
+    try:
+        video = video_streams[0]
+        if video.get('codec_name') != PROBE_CODEC_NAMES.get(video_codec, video_codec):
+            return False
+        # Containers like MKV only report the overall bitrate, which also covers audio
+        source_video_bitrate = int(video.get('bit_rate') or probe.get('format', {}).get('bit_rate') or 0)
+        if not source_video_bitrate or source_video_bitrate > float(video_bitrate) * 1000:
+            return False
         
-        # Frame rate
-        if frame_rate != 'original' and frame_rate:
-            try:
-                fps_value = int(frame_rate)
-                vf_filters.append(f'fps={fps_value}')
-            except:
-                pass  # Keep original frame rate if invalid
+        if audio_streams:
+            audio = audio_streams[0]
+            if audio.get('codec_name') != PROBE_CODEC_NAMES.get(audio_codec, audio_codec):
+                return False
+            source_audio_bitrate = int(audio.get('bit_rate') or 0)
+            if not source_audio_bitrate or source_audio_bitrate > float(audio_bitrate) * 1000:
+                return False
+    except (TypeError, ValueError):
+        return False
+    
+    return True
+
+def _probe_duration(probe):
+    """Get the container duration in seconds from ffprobe output, 0 when unknown"""
+    try:
+        return float(probe.get('format', {}).get('duration') or 0) if probe else 0
+    except (TypeError, ValueError):
+        return 0
+
+def _encode_segments(input_path, output_path, video_args, output_args, workers, work_dir):
+    """Encode the video in keyframe-aligned segments in parallel, then stitch them and encode the audio once"""
+    with tempfile.TemporaryDirectory(dir=work_dir) as segment_dir:
+        # Split the video stream on existing keyframes without re-encoding
+        run_ffmpeg(
+            ['ffmpeg', '-y', '-i', input_path, '-map', '0:v:0', '-c', 'copy', '-f', 'segment',
+             '-segment_time', str(SEGMENT_TIME_SEC), '-reset_timestamps', '1',
+             os.path.join(segment_dir, 'seg_%03d.mkv')]
+        )
+        segments = sorted(name for name in os.listdir(segment_dir) if name.startswith('seg_'))
+        encoded = [os.path.join(segment_dir, 'enc_' + name[4:]) for name in segments]
         
-        # Apply video filters
-        if vf_filters:
-            ffmpeg_cmd += ['-vf', ','.join(vf_filters)]
+        # Each encode is its own ffmpeg process, so threads are enough to keep them running side by side
+        def encode(segment, encoded_path):
+            run_ffmpeg(['ffmpeg', '-y', '-i', os.path.join(segment_dir, segment), '-an'] + video_args + [encoded_path])
         
-        # Audio handling
-        if remove_audio:
-            ffmpeg_cmd += ['-an']  # Remove audio
-        else:
-            audio_codec_param = get_audio_codec_params(audio_codec)
-            ffmpeg_cmd += ['-c:a', audio_codec_param]
-            ffmpeg_cmd += ['-b:a', f'{audio_bitrate}k']
-            
-            # Audio quality settings
-            if audio_codec == 'aac':
-                ffmpeg_cmd += ['-profile:a', 'aac_low']
-            elif audio_codec == 'mp3':
-                ffmpeg_cmd += ['-q:a', '2']  # High quality MP3
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(encode, segment, path) for segment, path in zip(segments, encoded)]:
+                future.result()
         
-        # Web optimization (apply appropriate optimization based on format)
-        if optimize_web:
-            if output_format == '.mp4':
-                ffmpeg_cmd += ['-movflags', '+faststart']  # Move metadata to beginning for MP4
-            elif output_format == '.webm':
-                ffmpeg_cmd += ['-dash', '1']  # Enable DASH for WebM
-            elif output_format == '.mkv':
-                ffmpeg_cmd += ['-fflags', '+genpts']  # Generate presentation timestamps for MKV
+        concat_list = os.path.join(segment_dir, 'concat.txt')
+        with open(concat_list, 'w') as f:
+            f.writelines(f"file '{path}'\n" for path in encoded)
         
+        # Stitch the encoded video and take the audio from the original in one continuous encode
+        run_ffmpeg(
+            ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', concat_list, '-i', input_path,
+             '-map', '0:v', '-map', '1:a:0?', '-c:v', 'copy'] + output_args + [output_path]
+        )
+
+def clamp_number(value, name, low, high, cast=int):
+    """Convert a numeric option and clamp it to [low, high]; raises ValueError if it isn't a number"""
+    try:
+        number = cast(float(value))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Invalid {name}: {value!r}")
+    return max(low, min(high, number))
+
+def parse_resolution(resolution_str):
+    """Parse resolution string to width and height"""
+    if not isinstance(resolution_str, str) or resolution_str == 'original':
+        return None, None
+    return _parse_resolution_string(resolution_str)
+
+@lru_cache(maxsize=64)
+def _parse_resolution_string(resolution_str):
+    """Width and height of a 'WIDTHxHEIGHT' string; anything else keeps the original resolution"""
+    match = RESOLUTION_PATTERN.fullmatch(resolution_str)
+    if not match:
+        return None, None
+    return int(match.group(1)), int(match.group(2))
+
+def _encode_job(job, hardware_accel, work_dir):
+    """Run the FFmpeg commands for a compression job and return the video encoder that was used.
+    Pass logs and segments are written to work_dir, which the caller removes"""
+    # Codecs, bitrates and duration of the upload
+    probe = _probe_streams(job.input_path)
+    duration = _probe_duration(probe)
+    
+    # Nothing to scale or drop, no quality setting asked for (the CRF encode ignores videoBitrate, so an
+    # explicit compressionLevel must always encode) and the source is within the bitrates: remux it as is
+    stream_copy = False
+    if (job.width is None and job.fps_value is None and not job.remove_audio and not job.two_pass
+            and job.compression_level == DEFAULT_COMPRESSION_LEVEL and job.speed == DEFAULT_SPEED):
+        stream_copy = _can_stream_copy(probe, job.video_codec, job.video_bitrate, job.audio_codec, job.audio_bitrate)
+    
+    # Hardware encoding (NVENC) when available; two-pass encoding stays on the CPU encoders
+    nvenc_encoder = None
+    if hardware_accel and hardware_accel not in ('none', 'off') and not job.two_pass and not stream_copy:
+        nvenc_encoder = get_nvenc_encoder(job.video_codec)
+    
+    # Stream copies only move bytes; encodes wait for one of the MAX_CONCURRENT_ENCODES slots, held
+    # across both passes of a two-pass encode (NVENC too: consumer GPUs cap concurrent sessions)
+    encode_slot = contextlib.nullcontext() if stream_copy else _encode_semaphore
+    with encode_slot:
         # Two-pass encoding for better quality/size ratio
-        if two_pass and not remove_audio:
-            # First pass
-            pass1_cmd = ffmpeg_cmd + ['-pass', '1', '-f', 'null', '/dev/null']
+        if job.two_pass and not stream_copy:
+            # Pass logs go in the job's own directory so concurrent jobs don't share ffmpeg2pass-0.log
+            passlog_file = os.path.join(work_dir, 'ffmpeg2pass')
             try:
-                subprocess.run(pass1_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=600)
+                run_ffmpeg(build_ffmpeg_argv(job, pass_number=1, passlog_file=passlog_file), duration=duration)
             except subprocess.CalledProcessError as e:
                 raise Exception(f"Two-pass encoding failed on first pass: {e.stderr}")
-            
+        
             # Second pass
-            ffmpeg_cmd += ['-pass', '2']
+            ffmpeg_cmds = [build_ffmpeg_argv(job, pass_number=2, passlog_file=passlog_file)]
+        else:
+            ffmpeg_cmds = [build_ffmpeg_argv(job, nvenc_encoder, stream_copy)]
+        
+        # An input the GPU cannot decode fails the hardware run: encode it on the CPU instead
+        if nvenc_encoder:
+            ffmpeg_cmds.append(build_ffmpeg_argv(job))
         
-        # Output file
-        ffmpeg_cmd += [output_path]
+        # Long software encodes: split this job's threads over several smaller encoders
+        segment_workers = ENCODE_THREADS // SEGMENT_ENCODE_THREADS
+        if (not stream_copy and not job.two_pass and not nvenc_encoder and segment_workers > 1
+                and duration > SEGMENT_THRESHOLD_SEC):
+            print(f"Encoding {job.input_path} in {SEGMENT_TIME_SEC}s segments with {segment_workers} workers")
+            try:
+                _encode_segments(
+                    job.input_path, job.output_path, get_video_encode_args(job, threads=SEGMENT_ENCODE_THREADS)[1],
+                    get_audio_output_args(job) + get_container_args(job), segment_workers, work_dir
+                )
+                return get_video_codec_params(job.video_codec)
+            except subprocess.CalledProcessError as e:
+                print(f"Segmented encoding failed, encoding the whole file instead: {e.stderr}")
+            except subprocess.TimeoutExpired:
+                raise Exception("Video compression timed out. The file might be too large.")
+            except FileNotFoundError:
+                raise Exception("FFmpeg not found. Please install FFmpeg and ensure it's in your PATH.")
         
         # Run FFmpeg compression
-        print(f"Running FFmpeg compression: {' '.join(ffmpeg_cmd)}")
+        for attempt, ffmpeg_cmd in enumerate(ffmpeg_cmds, 1):
+            print(f"Running FFmpeg compression: {' '.join(ffmpeg_cmd)}")
+            try:
+                run_ffmpeg(ffmpeg_cmd, duration=duration, timeout=600)  # 10 minutes timeout for compression
+                print("FFmpeg compression completed")
+                break
+            except subprocess.CalledProcessError as e:
+                if attempt < len(ffmpeg_cmds):
+                    print(f"Hardware encoding failed, retrying with the software encoder: {e.stderr}")
+                    nvenc_encoder = None
+                    continue
+                print(f"FFmpeg compression failed: {e.stderr}")
+                raise Exception(f"Video compression failed: {e.stderr}")
+            except subprocess.TimeoutExpired:
+                raise Exception("Video compression timed out. The file might be too large.")
+            except FileNotFoundError:
+                raise Exception("FFmpeg not found. Please install FFmpeg and ensure it's in your PATH.")
+    
+    return 'copy' if stream_copy else nvenc_encoder or get_video_codec_params(job.video_codec)
+
+def _save_upload(file, output):
+    """Copy an upload into an open file with a large buffer, returning the SHA-256 of its contents"""
+    # Hashing in the same pass costs no extra read of the upload
+    digest = hashlib.sha256()
+    while True:
+        chunk = file.stream.read(UPLOAD_COPY_BUFFER_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        output.write(chunk)
+    return digest.hexdigest()
+
+def _reuse_cached_compression(cache_key, output_path):
+    """Link an earlier identical compression's output to output_path; returns its video encoder, or None"""
+    with _compression_cache_lock:
+        entry = _compression_cache.get(cache_key)
+        if entry is not None:
+            _compression_cache.move_to_end(cache_key)
+    if entry is None:
+        return None
+    
+    cached_filename, video_encoder = entry
+    try:
+        # Hard link where possible: no copy, and deleting either file leaves the other intact
+        os.link(os.path.join(EXPORT_DIR, cached_filename), output_path)
+    except OSError:
         try:
-            result = subprocess.run(
-                ffmpeg_cmd, 
-                check=True, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE, 
-                text=True, 
-                timeout=600  # 10 minutes timeout for compression
-            )
-            print(f"FFmpeg compression completed: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            print(f"FFmpeg compression failed: {e.stderr}")
-            raise Exception(f"Video compression failed: {e.stderr}")
-        except subprocess.TimeoutExpired:
-            raise Exception("Video compression timed out. The file might be too large.")
-        except FileNotFoundError:
-            raise Exception("FFmpeg not found. Please install FFmpeg and ensure it's in your PATH.")
+            shutil.copyfile(os.path.join(EXPORT_DIR, cached_filename), output_path)
+        except OSError:
+            # The earlier output has been deleted
+            with _compression_cache_lock:
+                _compression_cache.pop(cache_key, None)
+            return None
+    print(f"Reusing the output of an identical compression: {cached_filename}")
+    return video_encoder
+
+def _store_cached_compression(cache_key, output_filename, video_encoder):
+    """Remember a finished compression, forgetting the least recently used ones over the limit"""
+    with _compression_cache_lock:
+        _compression_cache[cache_key] = (output_filename, video_encoder)
+        _compression_cache.move_to_end(cache_key)
+        while len(_compression_cache) > COMPRESSION_CACHE_MAX_SIZE:
+            _compression_cache.popitem(last=False)
+
+def compress_video(file, input_body):
+    """Compress video with advanced compression settings"""
+    # Validate input structure and options before the upload is written, so a bad request fails fast
+    if 'tasks' not in input_body or 'compress' not in input_body['tasks']:
+        raise Exception("Invalid input structure: missing 'tasks' or 'compress'")
+    
+    compress_task = input_body['tasks']['compress']
+    options = compress_task.get('options', {})
+    if options is None:
+        options = {}
+    
+    # Get compression parameters with defaults
+    video_codec = options.get('videoCodec', 'h264')
+    video_bitrate = clamp_number(options.get('videoBitrate', 2000), 'videoBitrate', *VIDEO_BITRATE_RANGE)  # kbps
+    compression_level = clamp_number(options.get('compressionLevel', DEFAULT_COMPRESSION_LEVEL), 'compressionLevel', *COMPRESSION_LEVEL_RANGE)  # CRF value
+    resolution = options.get('resolution', 'original')
+    frame_rate = options.get('frameRate', 'original')
+    remove_audio = options.get('removeAudio', False)
+    audio_codec = options.get('audioCodec', 'aac')
+    audio_bitrate = clamp_number(options.get('audioBitrate', 128), 'audioBitrate', *AUDIO_BITRATE_RANGE)  # kbps
+    two_pass = options.get('twoPassEncoding', False)
+    optimize_web = options.get('optimizeForWeb', True)
+    hardware_accel = options.get('hardwareAccel', 'auto')  # 'auto' uses NVENC when the host has it
+    speed = options.get('speed', DEFAULT_SPEED)  # 'fast', 'balanced' or 'quality'
+    mp4_mode = options.get('mp4Mode', 'faststart')  # 'faststart' or 'fragmented' for MP4/MOV
+    
+    # Generate output filename - ALWAYS preserve original extension for compression
+    input_ext = os.path.splitext(file.filename)[1].lower()
+    print(f"Original filename: {file.filename}, extracted extension: '{input_ext}'")
+    # For compression, always keep the same extension as the original file
+    # If no extension found, default to .mp4
+    if not input_ext:
+        input_ext = '.mp4'
+        print(f"No extension found, defaulting to: {input_ext}")
+    output_format = input_ext
+    output_filename = str(uuid.uuid4()) + output_format
+    output_path = os.path.join(EXPORT_DIR, output_filename)
+    print(f"Final output format: '{output_format}', filename: {output_filename}")
+    
+    # Adjust codec based on output format for compatibility
+    # For compression, we need to ensure the codec is compatible with the original format
+    video_codec, audio_codec = coerce_codecs(output_format, video_codec, audio_codec)
+    
+    # Resolution scaling
+    width, height = parse_resolution(resolution)
+    
+    # Frame rate; anything but a whole number keeps the original frame rate
+    fps_value = None
+    if frame_rate != 'original' and FPS_PATTERN.fullmatch(str(frame_rate)) and int(frame_rate) > 0:
+        fps_value = int(frame_rate)
+    
+    # The upload, pass logs and segments all live in one directory per request, removed as a whole
+    work_dir = tempfile.TemporaryDirectory(prefix='compress_')
+    input_path = os.path.join(work_dir.name, 'input' + os.path.splitext(file.filename)[1])
+    with open(input_path, 'wb') as temp_input:
+        upload_sha256 = _save_upload(file, temp_input)
+
+    try:
+        job = CompressionJob(
+            input_path, output_path, output_format, video_codec, audio_codec, compression_level, video_bitrate,
+            audio_bitrate, width, height, fps_value, remove_audio, two_pass, optimize_web, speed, mp4_mode
+        )
+        
+        # Same upload with the same settings as an earlier request: reuse that output
+        cache_key = (upload_sha256, job._replace(input_path=None, output_path=None), hardware_accel)
+        video_encoder = _reuse_cached_compression(cache_key, output_path)
+        if video_encoder is None:
+            video_encoder = _encode_job(job, hardware_accel, work_dir.name)
+            _store_cached_compression(cache_key, output_filename, video_encoder)
         
         # Verify output file exists
         if not os.path.exists(output_path):
@@ -214,17 +734,8 @@ def compress_video(file, input_body):
         output_size = os.path.getsize(output_path)
         compression_ratio = (1 - output_size / input_size) * 100 if input_size > 0 else 0
         
-        # Clean up temp file
-        os.remove(input_path)
-        
-        # Clean up two-pass encoding files
-        log_files = [f'ffmpeg2pass-0.log', f'ffmpeg2pass-0.log.mbtree']
-        for log_file in log_files:
-            if os.path.exists(log_file):
-                try:
-                    os.remove(log_file)
-                except:
-                    pass  # Ignore cleanup errors
+        # The result is only read again when downloaded, so don't let it crowd other jobs out of the cache
+        _drop_from_page_cache(output_path)
         
         response_data = {
             'success': True,
@@ -241,13 +752,16 @@ def compress_video(file, input_body):
             },
             'settings_used': {
                 'video_codec': video_codec,
+                'video_encoder': video_encoder,
                 'video_bitrate': video_bitrate,
                 'compression_level': compression_level,
                 'resolution': resolution,
                 'audio_codec': audio_codec if not remove_audio else 'removed',
                 'audio_bitrate': audio_bitrate if not remove_audio else 0,
                 'two_pass': two_pass,
-                'web_optimized': optimize_web
+                'speed': speed,
+                'web_optimized': optimize_web,
+                'mp4_mode': mp4_mode
             },
             'message': f'Video compressed successfully. Size reduced by {compression_ratio:.1f}%'
         }
@@ -256,17 +770,8 @@ def compress_video(file, input_body):
         return response_data
         
     except Exception as e:
-        # Clean up temp file on error
-        if os.path.exists(input_path):
-            os.remove(input_path)
-        
-        # Clean up two-pass encoding files on error
-        log_files = [f'ffmpeg2pass-0.log', f'ffmpeg2pass-0.log.mbtree']
-        for log_file in log_files:
-            if os.path.exists(log_file):
-                try:
-                    os.remove(log_file)
-                except:
-                    pass
-        
-        raise Exception(f"Video compression error: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Video compression error: {str(e)}")
+    
+    finally:
+        # Clean up the upload and any intermediate files
+        work_dir.cleanup()
\ No newline at end of file
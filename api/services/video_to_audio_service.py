@@ -1,11 +1,31 @@
 import os
+import re
 import uuid
 import subprocess
 import tempfile
+from api.services.video_compression_service import run_ffmpeg, is_encoder_available, clamp_number, UPLOAD_COPY_BUFFER_SIZE, PIPE_INPUT_FORMATS
+
+try:
+    import av  # PyAV: libavformat/libavcodec in-process, optional
+except ImportError:
+    av = None
 
 EXPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'static', 'audios')
 os.makedirs(EXPORT_DIR, exist_ok=True)
 
+# Cut and trim times: [HH:]MM:SS[.ms] or plain seconds
+TIME_PATTERN = re.compile(r'(?:\d{1,3}:)?[0-5]?\d:[0-5]?\d(?:\.\d{1,3})?|\d{1,6}(?:\.\d{1,3})?')
+
+# Bounds the numeric options are clamped to, with the type they are converted to
+NUMERIC_OPTION_RANGES = {
+    'audio_bitrate': (8, 640, int),  # kbps
+    'audio_sample_rate': (8000, 192000, int),
+    'audio_channels': (1, 8, int),
+    'audio_filter_volume': (0, 1000, float),  # percent
+    'fade_in_duration': (0, 3600, float),  # seconds
+    'fade_out_duration': (0, 3600, float)
+}
+
 # Supported audio output formats for video-to-audio conversion
 SUPPORTED_FORMATS = ['aac', 'aiff', 'alac', 'amr', 'flac', 'm4a', 'mp3', 'ogg', 'wav', 'wma']
 
@@ -15,7 +35,7 @@ def get_default_audio_codec(output_format):
         'aac': 'aac',
         'aiff': 'pcm_s16be',
         'alac': 'alac',
-        'amr': 'amrnb',  # AMR Narrowband
+        'amr': 'libopencore_amrnb',  # AMR Narrowband
         'flac': 'flac',
         'm4a': 'aac',  # M4A typically uses AAC codec
         'mp3': 'libmp3lame',
@@ -60,12 +80,130 @@ def get_format_specific_options(output_format, ffmpeg_cmd):
     
     return ffmpeg_cmd
 
+def _seconds(timestamp):
+    """Convert an FFmpeg [HH:]MM:SS[.ms] or plain seconds timestamp to seconds"""
+    seconds = 0.0
+    for part in str(timestamp).split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def _in_process_settings(ffmpeg_args):
+    """Translate one output's FFmpeg arguments (and its input -ss/-to) into PyAV settings, or None if any of them has no equivalent"""
+    settings = {'filters': [], 'options': {}}
+    args = iter(ffmpeg_args)
+    for flag in args:
+        if flag == '-vn':
+            continue
+        value = next(args, None)
+        if value is None:
+            return None
+        if flag == '-c:a':
+            settings['codec'] = value
+        elif flag == '-b:a':
+            settings['bit_rate'] = int(float(value[:-1]) * 1000) if value.endswith('k') else int(value)
+        elif flag == '-ar':
+            settings['rate'] = int(value)
+        elif flag == '-ac':
+            settings['channels'] = int(value)
+        elif flag == '-af':
+            settings['filters'] += value.split(',')
+        elif flag == '-ss':
+            settings['start'] = value
+        elif flag == '-to':
+            settings['end'] = value
+        elif flag == '-compression_level':
+            settings['options']['compression_level'] = value
+        else:
+            return None
+    
+    # Input -ss/-to cut the range before any filter runs, and the result starts at zero
+    if 'start' in settings or 'end' in settings:
+        trim = ':'.join(f"{key}={_seconds(settings[key])}" for key in ('start', 'end') if key in settings)
+        settings['filters'] = [f'atrim={trim}', 'asetpts=PTS-STARTPTS'] + settings['filters']
+    return settings
+
+def _convert_in_process(source, source_format, output_path, settings):
+    """Decode the first audio stream and encode it to output_path with PyAV, without starting FFmpeg"""
+    with av.open(source, format=source_format) as input_container:
+        if not input_container.streams.audio:
+            raise Exception("No audio stream found in the video")
+        in_stream = input_container.streams.audio[0]
+        
+        # Jump to the keyframe before the cut like FFmpeg's input -ss; atrim drops the audio up to the exact start
+        if settings.get('start') and source_format is None:
+            input_container.seek(int(_seconds(settings['start']) * av.time_base))
+        
+        with av.open(output_path, 'w') as output_container:
+            out_stream = output_container.add_stream(settings['codec'], rate=settings.get('rate') or in_stream.rate)
+            if settings.get('channels'):
+                out_stream.layout = {1: 'mono', 2: 'stereo'}.get(settings['channels'], f"{settings['channels']}c")
+            else:
+                out_stream.layout = in_stream.layout
+            if settings.get('bit_rate'):
+                out_stream.bit_rate = settings['bit_rate']
+            out_stream.options = settings['options']
+            
+            # Same filter chain FFmpeg's -af would run
+            graph = None
+            if settings['filters']:
+                graph = av.filter.Graph()
+                node = graph.add_abuffer(template=in_stream)
+                for audio_filter in settings['filters']:
+                    name, _, filter_args = audio_filter.partition('=')
+                    next_node = graph.add(name, filter_args or None)
+                    node.link_to(next_node)
+                    node = next_node
+                node.link_to(graph.add('abuffersink'))
+                graph.configure()
+            
+            # Match the encoder's sample format, layout and rate, and its fixed frame size
+            resampler = av.AudioResampler(
+                format=out_stream.codec_context.codec.audio_formats[0].name,
+                layout=out_stream.layout, rate=out_stream.rate,
+                frame_size=out_stream.codec_context.frame_size or None
+            )
+            
+            def encode(frame):
+                for resampled in resampler.resample(frame):
+                    output_container.mux(out_stream.encode(resampled))
+            
+            def filtered(frame):
+                if graph is None:
+                    return [frame]
+                try:
+                    graph.push(frame)
+                except av.error.EOFError:
+                    return []  # The filters want no more input, e.g. atrim has reached its end
+                frames = []
+                while True:
+                    try:
+                        frames.append(graph.pull())
+                    except (av.error.BlockingIOError, av.error.EOFError):
+                        return frames
+            
+            for frame in input_container.decode(in_stream):
+                for filtered_frame in filtered(frame):
+                    encode(filtered_frame)
+            
+            # Flush the filters, the resampler and the encoder
+            if graph is not None:
+                for filtered_frame in filtered(None):
+                    encode(filtered_frame)
+            encode(None)
+            output_container.mux(out_stream.encode(None))
+
 def convert_video_to_audio(file, input_body):
     """Extract audio from video file and convert to specified audio format"""
-    # Save uploaded file to temporary location
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
+    # Validate options before the upload is written, so a bad request fails fast
+    options = _parse_audio_options(input_body['tasks']['convert'].get('options') or {})
+    
+    # Streamable uploads are piped straight into FFmpeg; others are saved to a temporary location
+    pipe_format = PIPE_INPUT_FORMATS.get(os.path.splitext(file.filename)[1].lower())
+    input_path = work_dir = None
+    if not pipe_format:
+        work_dir = tempfile.TemporaryDirectory(prefix='video_to_audio_')
+        input_path = os.path.join(work_dir.name, 'input' + os.path.splitext(file.filename)[1])
+        file.save(input_path, buffer_size=UPLOAD_COPY_BUFFER_SIZE)
 
     try:
         # Parse conversion task - support both old and new format
@@ -80,38 +218,28 @@ def convert_video_to_audio(file, input_body):
             input_format = 'unknown'
             output_format = convert_task.get('output_format', 'mp3').lower()
         
-        # Validate output format
-        if output_format not in SUPPORTED_FORMATS:
-            raise Exception(f"Unsupported output format: {output_format}. Supported formats: {', '.join(SUPPORTED_FORMATS)}")
+        # Several formats can be extracted from one decode of the video; output_format is the first of them
+        output_formats = [fmt.lower() for fmt in convert_task.get('output_formats') or [output_format]]
+        output_format = output_formats[0]
         
-        # Generate output filename and path
-        output_filename = str(uuid.uuid4()) + f'.{output_format}'
-        output_path = os.path.join(EXPORT_DIR, output_filename)
+        # Validate output formats
+        for fmt in output_formats:
+            if fmt not in SUPPORTED_FORMATS:
+                raise Exception(f"Unsupported output format: {fmt}. Supported formats: {', '.join(SUPPORTED_FORMATS)}")
 
-        # Parse options and convert new format to internal format
-        options = _parse_audio_options(convert_task.get('options', {}))
-        
-        # Build FFmpeg command - disable video stream with -vn
-        ffmpeg_cmd = ['ffmpeg', '-y', '-i', input_path, '-vn']
-        
-        # Set audio codec
-        audio_codec = options.get('audio_codec')
-        if not audio_codec or audio_codec == 'auto':
-            audio_codec = get_default_audio_codec(output_format)
-        ffmpeg_cmd += ['-c:a', audio_codec]
-        
-        # Add format-specific encoding options
-        ffmpeg_cmd = get_format_specific_options(output_format, ffmpeg_cmd)
+        # Options shared by every output
+        input_args = []
+        output_args = []
         
         # Audio quality settings (if specified)
         if options.get('audio_bitrate'):
-            ffmpeg_cmd += ['-b:a', f"{options['audio_bitrate']}k"]
+            output_args += ['-b:a', f"{options['audio_bitrate']}k"]
         
         if options.get('audio_sample_rate'):
-            ffmpeg_cmd += ['-ar', str(options['audio_sample_rate'])]
+            output_args += ['-ar', str(options['audio_sample_rate'])]
         
         if options.get('audio_channels'):
-            ffmpeg_cmd += ['-ac', str(options['audio_channels'])]
+            output_args += ['-ac', str(options['audio_channels'])]
         
         # Audio filters
         af_filters = []
@@ -135,50 +263,95 @@ def convert_video_to_audio(file, input_body):
         
         # Apply audio filters if any
         if af_filters:
-            ffmpeg_cmd += ['-af', ','.join(af_filters)]
+            output_args += ['-af', ','.join(af_filters)]
         
         # Extract specific time range from video - handle both cut_start/cut_end and trim_start/trim_end
         start_time = options.get('cut_start') or options.get('trim_start')
         end_time = options.get('cut_end') or options.get('trim_end')
         
+        # Seek on the input: FFmpeg jumps to the nearest keyframe instead of decoding everything
+        # before the cut, and -to stays in source time
         if start_time and start_time != "00:00:00.00" and start_time != "00:00:00":
-            ffmpeg_cmd += ['-ss', start_time]
+            input_args += ['-ss', start_time]
         
         if end_time and end_time != "00:00:00.00" and end_time != "00:00:00":
-            ffmpeg_cmd += ['-to', end_time]
+            input_args += ['-to', end_time]
         
-        # Add output path
-        ffmpeg_cmd += [output_path]
+        # Build FFmpeg command - one output group per format, each disabling the video stream with -vn
+        if pipe_format:
+            ffmpeg_cmd = ['ffmpeg', '-y'] + input_args + ['-f', pipe_format, '-i', 'pipe:0']
+        else:
+            ffmpeg_cmd = ['ffmpeg', '-y'] + input_args + ['-i', input_path]
+        outputs = []
+        for fmt in output_formats:
+            # Generate output filename and path
+            output_filename = str(uuid.uuid4()) + f'.{fmt}'
+            output_path = os.path.join(EXPORT_DIR, output_filename)
+            
+            # Set audio codec; an explicit codec only fits a single output format
+            audio_codec = options.get('audio_codec') if len(output_formats) == 1 else None
+            if not audio_codec or audio_codec == 'auto':
+                audio_codec = get_default_audio_codec(fmt)
+                # Fail before running FFmpeg when its build lacks the encoder (e.g. no libmp3lame)
+                if not is_encoder_available(audio_codec):
+                    raise Exception(f"Audio encoder '{audio_codec}' is not available in this FFmpeg build")
+            
+            # Add format-specific encoding options
+            output_cmd = get_format_specific_options(fmt, ['-vn', '-c:a', audio_codec])
+            ffmpeg_cmd += output_cmd + output_args + [output_path]
+            outputs.append({
+                'export_url': f"/export/audios/{output_filename}?ngrok-skip-browser-warning=true",
+                'download_url': f"/download/audios/{output_filename}?ngrok-skip-browser-warning=true",
+                'filename': output_filename,
+                'output_format': fmt,
+                'codec_used': audio_codec
+            })
         
-        # Execute FFmpeg conversion
-        result = subprocess.run(ffmpeg_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # A single output is converted in this process when PyAV can reproduce its options, saving
+        # an FFmpeg start-up that dominates short clips
+        in_process_settings = None
+        if av is not None and len(outputs) == 1:
+            in_process_settings = _in_process_settings(input_args + output_cmd + output_args)
         
-        # Clean up temporary file
-        os.remove(input_path)
+        if in_process_settings:
+            try:
+                _convert_in_process(file.stream if pipe_format else input_path, pipe_format, output_path, in_process_settings)
+            except av.error.FFmpegError as e:
+                # Leave the harder cases (e.g. encoders with fixed channel layouts) to the FFmpeg CLI, which
+                # negotiates formats itself; a piped upload has been consumed by now, so it cannot be retried
+                if pipe_format:
+                    raise Exception(f"FFmpeg conversion error: {e}")
+                print(f"In-process conversion failed, running FFmpeg instead: {e}")
+                in_process_settings = None
+        if not in_process_settings:
+            # Execute FFmpeg conversion
+            run_ffmpeg(ffmpeg_cmd, timeout=None, stdin_file=file.stream if pipe_format else None)
         
         # Return success response with download URL
-        return {
+        response = {
             'success': True,
-            'export_url': f"/export/audios/{output_filename}?ngrok-skip-browser-warning=true",
-            'download_url': f"/download/audios/{output_filename}?ngrok-skip-browser-warning=true",
-            'filename': output_filename,
+            'export_url': outputs[0]['export_url'],
+            'download_url': outputs[0]['download_url'],
+            'filename': outputs[0]['filename'],
             'output_format': output_format,
             'input_format': input_format,
-            'codec_used': audio_codec,
+            'codec_used': outputs[0]['codec_used'],
             'source_type': 'video'
         }
+        if len(outputs) > 1:
+            response['outputs'] = outputs
+        return response
         
     except subprocess.CalledProcessError as e:
-        # Clean up on FFmpeg error
-        if os.path.exists(input_path):
-            os.remove(input_path)
-        raise Exception(f"FFmpeg conversion error: {e.stderr.decode()}")
+        raise Exception(f"FFmpeg conversion error: {e.stderr}")
     
     except Exception as e:
-        # Clean up on any other error
-        if os.path.exists(input_path):
-            os.remove(input_path)
         raise Exception(f"Conversion error: {str(e)}")
+    
+    finally:
+        # Clean up the saved upload
+        if work_dir:
+            work_dir.cleanup()
 
 def _parse_audio_options(options):
     """Parse and convert new format options to internal format"""
@@ -204,4 +377,13 @@ def _parse_audio_options(options):
         if key in options:
             internal_options[key] = options[key]
     
+    # Values end up in FFmpeg arguments: times must look like times and numbers are kept in range
+    for key in ['cut_start', 'cut_end', 'trim_start', 'trim_end']:
+        value = internal_options.get(key)
+        if value and not (isinstance(value, str) and TIME_PATTERN.fullmatch(value)):
+            raise ValueError(f"Invalid {key}: {value!r}")
+    for key, (low, high, cast) in NUMERIC_OPTION_RANGES.items():
+        if internal_options.get(key) is not None:
+            internal_options[key] = clamp_number(internal_options[key], key, low, high, cast)
+    
     return internal_options 
\ No newline at end of file
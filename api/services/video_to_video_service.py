@@ -1,7 +1,11 @@
 import os
 import uuid
+import shutil
 import subprocess
 import tempfile
+from api.services.video_compression_service import (
+    run_ffmpeg, get_nvenc_command, get_mp4_mux_args, parse_resolution, SPEED_PRESETS, ENCODE_THREADS, UPLOAD_COPY_BUFFER_SIZE, PIPE_INPUT_FORMATS
+)
 
 EXPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'static', 'videos')
 os.makedirs(EXPORT_DIR, exist_ok=True)
@@ -12,54 +16,220 @@ SUPPORTED_FORMATS = [
 ]
 AUDIO_ONLY_FORMATS = ['mp3', 'wav', 'aac']
 
+# URLs returned for each converted file
+OUTPUT_URL_TEMPLATES = {
+    'export_url': '/export/videos/{}?ngrok-skip-browser-warning=true',
+    'download_url': '/download/videos/{}?ngrok-skip-browser-warning=true',
+    'ngrok_download_url': '/ngrok-download/videos/{}?ngrok-skip-browser-warning=true'
+}
+
+# Codecs used when a request leaves video_codec/audio_codec on 'auto'
+DEFAULT_VIDEO_CODECS = {
+    'wmv': 'wmv2',
+    'mp4': 'libx264',
+    'avi': 'mpeg4',
+    'mov': 'libx264',  # Use libx264 for compatibility and efficiency
+    'webm': 'libvpx',
+    'mkv': 'libx264'
+}
+DEFAULT_AUDIO_CODECS = {
+    'wmv': 'wmav2',
+    'mp4': 'aac',
+    'avi': 'mp3',
+    'mov': 'aac',
+    'webm': 'libvorbis',
+    'mkv': 'aac',
+    'mp3': 'libmp3lame',
+    'wav': 'pcm_s16le',
+    'aac': 'aac'
+}
+
+# libx264 speed for conversions. 'fast' (-preset veryfast) encodes about twice as fast as 'medium' for
+# files roughly 10-15% larger, the better trade for an API that answers while the client waits
+DEFAULT_SPEED = 'fast'
+
+# libx264's -tune values
+X264_TUNES = ('film', 'animation', 'grain', 'stillimage', 'fastdecode', 'zerolatency', 'psnr', 'ssim')
+
 def get_default_video_codec(output_format):
-    if output_format == 'wmv':
-        return 'wmv2'
-    elif output_format == 'mp4':
-        return 'libx264'
-    elif output_format == 'avi':
-        return 'mpeg4'
-    elif output_format == 'mov':
-        return 'libx264'  # Use libx264 for compatibility and efficiency
-    elif output_format == 'webm':
-        return 'libvpx'
-    elif output_format == 'mkv':
-        return 'libx264'
-    return 'libx264'
+    return DEFAULT_VIDEO_CODECS.get(output_format, 'libx264')
 
 def get_default_audio_codec(output_format):
-    if output_format == 'wmv':
-        return 'wmav2'
-    elif output_format == 'mp4':
-        return 'aac'
-    elif output_format == 'avi':
-        return 'mp3'
-    elif output_format == 'mov':
-        return 'aac'
-    elif output_format == 'webm':
-        return 'libvorbis'
-    elif output_format == 'mkv':
-        return 'aac'
-    elif output_format == 'mp3':
-        return 'libmp3lame'
-    elif output_format == 'wav':
-        return 'pcm_s16le'
-    elif output_format == 'aac':
-        return 'aac'
-    return 'aac'
-
-def add_x264_quality_params(ffmpeg_cmd, video_codec, output_format):
-    # Add CRF and preset for x264-based codecs to control file size and quality
+    return DEFAULT_AUDIO_CODECS.get(output_format, 'aac')
+
+def add_x264_quality_params(ffmpeg_cmd, video_codec, output_format, options):
+    # Add CRF and preset for x264-based codecs to control file size and quality, and hold the encoder
+    # to one request's share of the cores
     if video_codec == 'libx264' or (output_format in ['mp4', 'mov', 'mkv'] and video_codec == 'auto'):
-        ffmpeg_cmd += ['-preset', 'medium', '-crf', '23']
+        speed_args, _ = SPEED_PRESETS['libx264'].get(options.get('speed')) or SPEED_PRESETS['libx264'][DEFAULT_SPEED]
+        ffmpeg_cmd += speed_args + ['-crf', '23', '-threads', str(ENCODE_THREADS)]
+        # Optional content tuning (e.g. 'animation' for cartoons, 'stillimage' for slideshows)
+        tune = options.get('tune')
+        if tune:
+            if tune not in X264_TUNES:
+                raise Exception(f"Unsupported tune: {tune}. Supported tunes: {', '.join(X264_TUNES)}")
+            ffmpeg_cmd += ['-tune', tune]
     return ffmpeg_cmd
 
-def convert_video(file, input_body):
-    # Save uploaded file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
+def get_output_args(output_format, options):
+    """FFmpeg arguments of one output of a conversion, everything but the output path"""
+    is_audio_only = output_format in AUDIO_ONLY_FORMATS
+    output_args = []
 
+    if is_audio_only:
+        # Audio-only: disable video, set audio codec
+        audio_codec = options.get('audio_codec')
+        if not audio_codec or audio_codec == 'auto':
+            audio_codec = get_default_audio_codec(output_format)
+        output_args += ['-vn', '-c:a', audio_codec]
+        # Audio filters (volume, fade in/out)
+        af_filters = []
+        if options.get('audio_filter_volume') and options['audio_filter_volume'] != 100:
+            af_filters.append(f"volume={options['audio_filter_volume']/100}")
+        if options.get('audio_filter_fade_in'):
+            af_filters.append('afade=t=in:ss=0:d=3')
+        if options.get('audio_filter_fade_out'):
+            af_filters.append('afade=t=out:st=3:d=3')
+        if af_filters:
+            output_args += ['-af', ','.join(af_filters)]
+    else:
+        # Video+audio: set video and audio codecs, filters, etc.
+        video_codec = options.get('video_codec')
+        if not video_codec or video_codec == 'auto':
+            video_codec = get_default_video_codec(output_format)
+        output_args += ['-c:v', video_codec]
+        output_args = add_x264_quality_params(output_args, video_codec, output_format, options)
+        audio_codec = options.get('audio_codec')
+        if not audio_codec or audio_codec == 'auto':
+            audio_codec = get_default_audio_codec(output_format)
+        output_args += ['-c:a', audio_codec]
+
+        # Resolution (e.g., '1920x1080')
+        if options.get('resolution') and isinstance(options['resolution'], str) and 'x' in options['resolution']:
+            output_args += ['-s', options['resolution']]
+
+        # Target video bitrate in kbps
+        if options.get('bitrate'):
+            try:
+                bitrate_kbps = int(options['bitrate'])
+                if bitrate_kbps > 0:
+                    output_args += ['-b:v', f"{bitrate_kbps}k"]
+            except Exception:
+                pass
+
+        # Video filters (flip, rotate, fps, etc.)
+        vf_filters = []
+        if options.get('video_filter_flip') and options['video_filter_flip'] != 'no-change':
+            if options['video_filter_flip'] == 'horizontal':
+                vf_filters.append('hflip')
+            elif options['video_filter_flip'] == 'vertical':
+                vf_filters.append('vflip')
+        if options.get('video_filter_rotate') and options['video_filter_rotate'] != 'none':
+            if options['video_filter_rotate'] == '90':
+                vf_filters.append('transpose=1')
+            elif options['video_filter_rotate'] == '180':
+                vf_filters.append('hflip,vflip')  # Same turn as two transposes, in two cheap passes
+            elif options['video_filter_rotate'] == '270':
+                vf_filters.append('transpose=2')
+        if options.get('video_fps') and options['video_fps'] != 'no-change':
+            vf_filters.append(f"fps={options['video_fps']}")
+        if vf_filters:
+            output_args += ['-vf', ','.join(vf_filters)]
+        # Audio filters (volume, fade in/out)
+        af_filters = []
+        if options.get('audio_filter_volume') and options['audio_filter_volume'] != 100:
+            af_filters.append(f"volume={options['audio_filter_volume']/100}")
+        if options.get('audio_filter_fade_in'):
+            af_filters.append('afade=t=in:ss=0:d=3')
+        if options.get('audio_filter_fade_out'):
+            af_filters.append('afade=t=out:st=3:d=3')
+        if af_filters:
+            output_args += ['-af', ','.join(af_filters)]
+        # Remove video or audio
+        if options.get('video_audio_remove'):
+            if options['video_audio_remove'] == 'video':
+                output_args += ['-vn']
+            elif options['video_audio_remove'] == 'audio':
+                output_args += ['-an']
+        # Cut start/end
+        if options.get('cut_start') and options['cut_start'] != '00:00:00.00':
+            output_args += ['-ss', options['cut_start']]
+        if options.get('cut_end') and options['cut_end'] != '00:00:00.00':
+            output_args += ['-to', options['cut_end']]
+        # Explicitly set output format for some containers
+        if output_format == 'webm':
+            output_args += ['-f', 'webm']
+        elif output_format == 'mkv':
+            output_args += ['-f', 'matroska']
+        # Index at the front of MP4/MOV files (or fragments with options['mp4_mode'] == 'fragmented')
+        # so they stream before the download ends
+        output_args += get_mp4_mux_args(output_format, options.get('mp4_mode'))
+    return output_args
+
+def get_first_pass_args(output_args, passlog_file):
+    """Arguments of a two-pass encode's first pass: the video settings only, with the output discarded"""
+    first_pass_args = []
+    args = iter(output_args)
+    for arg in args:
+        if arg in ('-c:a', '-af', '-movflags', '-frag_duration', '-f'):
+            next(args)  # Audio and muxer settings mean nothing to the null output
+        else:
+            first_pass_args.append(arg)
+    return first_pass_args + ['-an', '-pass', '1', '-passlogfile', passlog_file, '-f', 'null', '-']
+
+def share_video_filters(output_args_list):
+    """Run the video filter chain once for every output that uses it, split between them in a
+    -filter_complex graph, instead of once per output. Returns the graph's arguments (empty when fewer
+    than two outputs filter video) and the outputs' arguments with their -vf swapped for -map"""
+    filtered = [index for index, output_args in enumerate(output_args_list)
+                if '-vf' in output_args and '-vn' not in output_args]
+    chains = {output_args_list[index][output_args_list[index].index('-vf') + 1] for index in filtered}
+    if len(filtered) < 2 or len(chains) != 1:
+        return [], output_args_list
+    
+    labels = [f'[v{number}]' for number in range(len(filtered))]
+    filter_graph = f"[0:v]{chains.pop()},split={len(filtered)}{''.join(labels)}"
+    output_args_list = list(output_args_list)
+    for index, label in zip(filtered, labels):
+        output_args = list(output_args_list[index])
+        vf_index = output_args.index('-vf')
+        # An explicit -map drops the default stream selection, so the first audio stream is mapped too
+        output_args[vf_index:vf_index + 2] = ['-map', label, '-map', '0:a:0?']
+        output_args_list[index] = output_args
+    return ['-filter_complex', filter_graph], output_args_list
+
+def keep_frames_on_gpu(nvenc_cmd):
+    """Turn an NVENC command's -s scaling into scale_cuda and keep decoded frames in GPU memory, so
+    frames never cross to the CPU between decoder, scaler and encoder. Returns None when an output
+    needs the frames on the CPU: a software encoder, a CPU video filter or a size scale_cuda can't take"""
+    if '-hwaccel' not in nvenc_cmd or '-vf' in nvenc_cmd or '-filter_complex' in nvenc_cmd:
+        return None
+    
+    gpu_cmd = []
+    args = iter(nvenc_cmd)
+    for arg in args:
+        if arg == '-c:v':
+            encoder = next(args)
+            if not encoder.endswith('_nvenc'):
+                return None
+            gpu_cmd += [arg, encoder]
+        elif arg == '-s':
+            width, height = parse_resolution(next(args))
+            if width is None:
+                return None
+            gpu_cmd += ['-vf', f'scale_cuda={width}:{height}']
+        else:
+            gpu_cmd.append(arg)
+    
+    hwaccel_index = gpu_cmd.index('-hwaccel')
+    gpu_cmd[hwaccel_index + 2:hwaccel_index + 2] = ['-hwaccel_output_format', 'cuda']
+    return gpu_cmd
+
+def convert_video(file, input_body):
+    # Streamable uploads are piped straight into FFmpeg; others are saved to a temporary file
+    pipe_format = PIPE_INPUT_FORMATS.get(os.path.splitext(file.filename)[1].lower())
+    input_path = None
+    passlog_dir = None
     try:
         # Validate input structure
         if 'tasks' not in input_body or 'convert' not in input_body['tasks']:
@@ -68,149 +238,134 @@ def convert_video(file, input_body):
         convert_task = input_body['tasks']['convert']
         output_format = convert_task.get('output_format', 'mp4').lower()
         
-        if output_format not in SUPPORTED_FORMATS:
-            raise Exception(f"Unsupported output format: {output_format}. Supported formats: {', '.join(SUPPORTED_FORMATS)}")
+        # Several formats are encoded from one decode of the video; output_format is the first of them
+        output_formats = [fmt.lower() for fmt in convert_task.get('output_formats') or [output_format]]
+        output_format = output_formats[0]
         
-        output_filename = str(uuid.uuid4()) + f'.{output_format}'
-        output_path = os.path.join(EXPORT_DIR, output_filename)
+        for fmt in output_formats:
+            if fmt not in SUPPORTED_FORMATS:
+                raise Exception(f"Unsupported output format: {fmt}. Supported formats: {', '.join(SUPPORTED_FORMATS)}")
 
         # Build ffmpeg command based on options
         options = convert_task.get('options', {})
         if options is None:
             options = {}  # Ensure options is always a dict
         
-        is_audio_only = output_format in AUDIO_ONLY_FORMATS
-        ffmpeg_cmd = ['ffmpeg', '-y', '-i', input_path]
-
-        if is_audio_only:
-            # Audio-only: disable video, set audio codec
-            audio_codec = options.get('audio_codec')
-            if not audio_codec or audio_codec == 'auto':
-                audio_codec = get_default_audio_codec(output_format)
-            ffmpeg_cmd += ['-vn', '-c:a', audio_codec]
-            # Audio filters (volume, fade in/out)
-            af_filters = []
-            if options.get('audio_filter_volume') and options['audio_filter_volume'] != 100:
-                af_filters.append(f"volume={options['audio_filter_volume']/100}")
-            if options.get('audio_filter_fade_in'):
-                af_filters.append('afade=t=in:ss=0:d=3')
-            if options.get('audio_filter_fade_out'):
-                af_filters.append('afade=t=out:st=3:d=3')
-            if af_filters:
-                ffmpeg_cmd += ['-af', ','.join(af_filters)]
+        # Outputs sharing the same video filters get them from one filter graph
+        filter_args, output_args_list = share_video_filters([get_output_args(fmt, options) for fmt in output_formats])
+        
+        # The upload only reaches the disk once the request is known to be valid
+        if not pipe_format:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_input:
+                file.save(temp_input.name, buffer_size=UPLOAD_COPY_BUFFER_SIZE)
+                input_path = temp_input.name
+        
+        # One output group per format, each with its own output file
+        # Filters get the same share of the cores as the encoder
+        ffmpeg_cmd = ['ffmpeg', '-y', '-filter_threads', str(ENCODE_THREADS)]
+        if pipe_format:
+            ffmpeg_cmd += ['-f', pipe_format, '-i', 'pipe:0']
         else:
-            # Video+audio: set video and audio codecs, filters, etc.
-            video_codec = options.get('video_codec')
-            if not video_codec or video_codec == 'auto':
-                video_codec = get_default_video_codec(output_format)
-            ffmpeg_cmd += ['-c:v', video_codec]
-            ffmpeg_cmd = add_x264_quality_params(ffmpeg_cmd, video_codec, output_format)
-            audio_codec = options.get('audio_codec')
-            if not audio_codec or audio_codec == 'auto':
-                audio_codec = get_default_audio_codec(output_format)
-            ffmpeg_cmd += ['-c:a', audio_codec]
-
-            # Resolution (e.g., '1920x1080')
-            if options.get('resolution') and isinstance(options['resolution'], str) and 'x' in options['resolution']:
-                ffmpeg_cmd += ['-s', options['resolution']]
-
-            # Target video bitrate in kbps
-            if options.get('bitrate'):
-                try:
-                    bitrate_kbps = int(options['bitrate'])
-                    if bitrate_kbps > 0:
-                        ffmpeg_cmd += ['-b:v', f"{bitrate_kbps}k"]
-                except Exception:
-                    pass
-
-            # Video filters (flip, rotate, fps, etc.)
-            vf_filters = []
-            if options.get('video_filter_flip') and options['video_filter_flip'] != 'no-change':
-                if options['video_filter_flip'] == 'horizontal':
-                    vf_filters.append('hflip')
-                elif options['video_filter_flip'] == 'vertical':
-                    vf_filters.append('vflip')
-            if options.get('video_filter_rotate') and options['video_filter_rotate'] != 'none':
-                if options['video_filter_rotate'] == '90':
-                    vf_filters.append('transpose=1')
-                elif options['video_filter_rotate'] == '180':
-                    vf_filters.append('transpose=2,transpose=2')
-                elif options['video_filter_rotate'] == '270':
-                    vf_filters.append('transpose=2')
-            if options.get('video_fps') and options['video_fps'] != 'no-change':
-                vf_filters.append(f"fps={options['video_fps']}")
-            if vf_filters:
-                ffmpeg_cmd += ['-vf', ','.join(vf_filters)]
-            # Audio filters (volume, fade in/out)
-            af_filters = []
-            if options.get('audio_filter_volume') and options['audio_filter_volume'] != 100:
-                af_filters.append(f"volume={options['audio_filter_volume']/100}")
-            if options.get('audio_filter_fade_in'):
-                af_filters.append('afade=t=in:ss=0:d=3')
-            if options.get('audio_filter_fade_out'):
-                af_filters.append('afade=t=out:st=3:d=3')
-            if af_filters:
-                ffmpeg_cmd += ['-af', ','.join(af_filters)]
-            # Remove video or audio
-            if options.get('video_audio_remove'):
-                if options['video_audio_remove'] == 'video':
-                    ffmpeg_cmd += ['-vn']
-                elif options['video_audio_remove'] == 'audio':
-                    ffmpeg_cmd += ['-an']
-            # Cut start/end
-            if options.get('cut_start') and options['cut_start'] != '00:00:00.00':
-                ffmpeg_cmd += ['-ss', options['cut_start']]
-            if options.get('cut_end') and options['cut_end'] != '00:00:00.00':
-                ffmpeg_cmd += ['-to', options['cut_end']]
-            # Explicitly set output format for some containers
-            if output_format == 'webm':
-                ffmpeg_cmd += ['-f', 'webm']
-            elif output_format == 'mkv':
-                ffmpeg_cmd += ['-f', 'matroska']
+            ffmpeg_cmd += ['-i', input_path]
+        ffmpeg_cmd += filter_args
+        
+        # Two-pass libx264 for a bitrate target: the first pass measures the video so the second spends
+        # the bits where they are needed. It reads the input twice, so a piped upload can't use it
+        two_pass = (options.get('two_pass') and len(output_formats) == 1 and not pipe_format
+                    and '-b:v' in output_args_list[0] and 'libx264' in output_args_list[0])
+        if two_pass:
+            output_args = list(output_args_list[0])
+            crf_index = output_args.index('-crf')
+            del output_args[crf_index:crf_index + 2]  # CRF would override the bitrate
+            passlog_dir = tempfile.mkdtemp(prefix='convert_passlog_')
+            passlog_file = os.path.join(passlog_dir, 'ffmpeg2pass')
+            try:
+                run_ffmpeg(ffmpeg_cmd + get_first_pass_args(output_args, passlog_file), timeout=300)
+            except subprocess.CalledProcessError as e:
+                raise Exception(f"Two-pass encoding failed on first pass: {e.stderr}")
+            output_args_list = [output_args + ['-pass', '2', '-passlogfile', passlog_file]]
+        outputs = []
+        for fmt, output_args in zip(output_formats, output_args_list):
+            output_filename = str(uuid.uuid4()) + f'.{fmt}'
+            output_path = os.path.join(EXPORT_DIR, output_filename)
+            ffmpeg_cmd += output_args + [output_path]
+            outputs.append({
+                **{key: template.format(output_filename) for key, template in OUTPUT_URL_TEMPLATES.items()},
+                'filename': output_filename,
+                'output_format': fmt,
+                'path': output_path
+            })
         
-        # Output file
-        ffmpeg_cmd += [output_path]
+        # Hardware encoding (NVENC) for the H.264/HEVC outputs when the host has it. It runs first; the
+        # CPU command is the fallback if the GPU can't take the input. Two-pass stays on libx264
+        ffmpeg_cmds = [ffmpeg_cmd]
+        if (options.get('hardware_accel', 'auto') not in ('none', 'off') and options.get('video_audio_remove') != 'video'
+                and not two_pass):
+            nvenc_cmd = get_nvenc_command(ffmpeg_cmd)
+            if nvenc_cmd:
+                # A piped upload has no fallback run, so its frames are not kept on the GPU:
+                # scale_cuda rejects the software frames of a stream NVDEC cannot decode,
+                # while plain NVENC takes them
+                if not pipe_format:
+                    nvenc_cmd = keep_frames_on_gpu(nvenc_cmd) or nvenc_cmd
+                ffmpeg_cmds.insert(0, nvenc_cmd)
+        # A piped upload is consumed by the first run, so it gets no fallback
+        if pipe_format:
+            ffmpeg_cmds = ffmpeg_cmds[:1]
 
         # Run ffmpeg
-        # print(f"Running FFmpeg command: {' '.join(ffmpeg_cmd)}")  # Debug logging
-        try:
-            result = subprocess.run(ffmpeg_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=300)
-            print(f"FFmpeg stdout: {result.stdout}")  # Debug logging
-        except subprocess.CalledProcessError as e:
-            print(f"FFmpeg failed with return code {e.returncode}")  # Debug logging
-            print(f"FFmpeg stderr: {e.stderr}")  # Debug logging
-            error_msg = f"FFmpeg conversion failed (return code {e.returncode}): {e.stderr}"
-            raise Exception(error_msg)
-        except FileNotFoundError:
-            print("FFmpeg binary not found in PATH")  # Debug logging
-            raise Exception("FFmpeg not found. Please install FFmpeg and ensure it's in your PATH.")
-        except subprocess.TimeoutExpired:
-            print("FFmpeg command timed out after 300 seconds")  # Debug logging
-            raise Exception("Video conversion timed out. The file might be too large or complex.")
-        except Exception as e:
-            print(f"Unexpected FFmpeg error: {str(e)}")  # Debug logging
-            raise Exception(f"Unexpected error during conversion: {str(e)}")
-
-        # Verify output file exists
-        if not os.path.exists(output_path):
-            raise Exception("Conversion completed but output file was not created")
+        for attempt, ffmpeg_cmd in enumerate(ffmpeg_cmds, 1):
+            # print(f"Running FFmpeg command: {' '.join(ffmpeg_cmd)}")  # Debug logging
+            try:
+                # Only the tail of FFmpeg's stderr is kept, for the error message
+                run_ffmpeg(ffmpeg_cmd, timeout=300, stdin_file=file.stream if pipe_format else None)
+                break
+            except subprocess.CalledProcessError as e:
+                print(f"FFmpeg failed with return code {e.returncode}")  # Debug logging
+                print(f"FFmpeg stderr: {e.stderr}")  # Debug logging
+                if attempt < len(ffmpeg_cmds):
+                    print("Hardware encoding failed, retrying with the software encoder")  # Debug logging
+                    continue
+                error_msg = f"FFmpeg conversion failed (return code {e.returncode}): {e.stderr}"
+                raise Exception(error_msg)
+            except FileNotFoundError:
+                print("FFmpeg binary not found in PATH")  # Debug logging
+                raise Exception("FFmpeg not found. Please install FFmpeg and ensure it's in your PATH.")
+            except subprocess.TimeoutExpired:
+                print("FFmpeg command timed out after 300 seconds")  # Debug logging
+                raise Exception("Video conversion timed out. The file might be too large or complex.")
+            except Exception as e:
+                print(f"Unexpected FFmpeg error: {str(e)}")  # Debug logging
+                raise Exception(f"Unexpected error during conversion: {str(e)}")
+
+        # Verify output files exist
+        for output in outputs:
+            if not os.path.exists(output.pop('path')):
+                raise Exception("Conversion completed but output file was not created")
 
         # Clean up temp file
-        os.remove(input_path)
+        if input_path:
+            os.remove(input_path)
 
         # Return export URL (using proper /export endpoint)
-        return {
+        response = {
             'success': True,
-            'export_url': f"/export/videos/{output_filename}?ngrok-skip-browser-warning=true",
-            'download_url': f"/download/videos/{output_filename}?ngrok-skip-browser-warning=true",
-            'ngrok_download_url': f"/ngrok-download/videos/{output_filename}?ngrok-skip-browser-warning=true",
-            'filename': output_filename,
+            'export_url': outputs[0]['export_url'],
+            'download_url': outputs[0]['download_url'],
+            'ngrok_download_url': outputs[0]['ngrok_download_url'],
+            'filename': outputs[0]['filename'],
             'output_format': output_format,
             'message': 'Video conversion completed successfully'
         }
+        if len(outputs) > 1:
+            response['outputs'] = outputs
+        return response
         
     except Exception as e:
         # Clean up temp file on error
-        if os.path.exists(input_path):
+        if input_path and os.path.exists(input_path):
             os.remove(input_path)
-        raise Exception(f"Video conversion error: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Video conversion error: {str(e)}")
+    finally:
+        if passlog_dir:
+            shutil.rmtree(passlog_dir, ignore_errors=True) 
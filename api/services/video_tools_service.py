@@ -4,6 +4,7 @@ import subprocess
 import tempfile
 from PIL import Image
 import json
+from api.services.video_compression_service import run_ffmpeg, get_nvenc_command, get_mp4_mux_args, ENCODE_THREADS, UPLOAD_COPY_BUFFER_SIZE
 
 EXPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'static', 'videos')
 os.makedirs(EXPORT_DIR, exist_ok=True)
@@ -12,11 +13,6 @@ SUPPORTED_VIDEO_FORMATS = ['mp4', 'avi', 'mov', 'webm', 'mkv', 'wmv']
 
 def crop_video(file, input_body):
     """Crop video to specified dimensions"""
-    # Save uploaded file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
-
     try:
         # Validate input structure
         if 'tasks' not in input_body or 'crop' not in input_body['tasks']:
@@ -42,27 +38,41 @@ def crop_video(file, input_body):
         if output_format not in SUPPORTED_VIDEO_FORMATS:
             raise Exception(f"Unsupported output format: {output_format}")
         
+        # Save uploaded file to a temporary file, once the request is known to be valid
+        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_input:
+            file.save(temp_input.name, buffer_size=UPLOAD_COPY_BUFFER_SIZE)
+            input_path = temp_input.name
+        
         output_filename = str(uuid.uuid4()) + f'.{output_format}'
         output_path = os.path.join(EXPORT_DIR, output_filename)
         
         # Build ffmpeg command for cropping
         ffmpeg_cmd = [
-            'ffmpeg', '-y', '-i', input_path,
+            'ffmpeg', '-y', '-filter_threads', str(ENCODE_THREADS), '-i', input_path,
             '-vf', f'crop={width}:{height}:{x}:{y}',
-            '-c:v', 'libx264', '-preset', 'medium', '-crf', '23',
+            '-c:v', 'libx264', '-preset', 'medium', '-crf', '23', '-threads', str(ENCODE_THREADS),
             '-c:a', 'aac', '-b:a', '128k',
+            *get_mp4_mux_args(output_format, options.get('mp4_mode')),
             output_path
         ]
         
-        print(f"Executing FFmpeg command: {' '.join(ffmpeg_cmd)}")
+        # NVENC first when the host has it; the crop filter runs on the CPU, so frames come back from the GPU decoder
+        ffmpeg_cmds = [ffmpeg_cmd]
+        nvenc_cmd = get_nvenc_command(ffmpeg_cmd) if options.get('hardware_accel', 'auto') not in ('none', 'off') else None
+        if nvenc_cmd:
+            ffmpeg_cmds.insert(0, nvenc_cmd)
         
-        # Execute ffmpeg command
-        result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, timeout=300)
-        
-        if result.returncode != 0:
-            print(f"FFmpeg stderr: {result.stderr}")
-            print(f"FFmpeg stdout: {result.stdout}")
-            raise Exception(f"FFmpeg error: {result.stderr}")
+        for attempt, ffmpeg_cmd in enumerate(ffmpeg_cmds, 1):
+            print(f"Executing FFmpeg command: {' '.join(ffmpeg_cmd)}")
+            
+            # Execute ffmpeg command, keeping only the tail of its stderr
+            try:
+                run_ffmpeg(ffmpeg_cmd, timeout=300)
+                break
+            except subprocess.CalledProcessError as e:
+                print(f"FFmpeg stderr: {e.stderr}")
+                if attempt == len(ffmpeg_cmds):
+                    raise Exception(f"FFmpeg error: {e.stderr}")
         
         # Verify output file exists and has size > 0
         if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
@@ -88,11 +98,6 @@ def crop_video(file, input_body):
 
 def trim_video(file, input_body):
     """Trim video to specified time range"""
-    # Save uploaded file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_input:
-        file.save(temp_input.name)
-        input_path = temp_input.name
-
     try:
         # Validate input structure
         if 'tasks' not in input_body or 'trim' not in input_body['tasks']:
@@ -114,6 +119,11 @@ def trim_video(file, input_body):
         if output_format not in SUPPORTED_VIDEO_FORMATS:
             raise Exception(f"Unsupported output format: {output_format}")
         
+        # Save uploaded file to a temporary file, once the request is known to be valid
+        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_input:
+            file.save(temp_input.name, buffer_size=UPLOAD_COPY_BUFFER_SIZE)
+            input_path = temp_input.name
+        
         output_filename = str(uuid.uuid4()) + f'.{output_format}'
         output_path = os.path.join(EXPORT_DIR, output_filename)
         
@@ -128,16 +138,35 @@ def trim_video(file, input_body):
             ffmpeg_cmd.extend(['-ss', str(start_time), '-t', str(duration)])
         
         ffmpeg_cmd.extend([
-            '-c:v', 'libx264', '-preset', 'medium', '-crf', '23',
+            '-c:v', 'libx264', '-preset', 'medium', '-crf', '23', '-threads', str(ENCODE_THREADS),
             '-c:a', 'aac', '-b:a', '128k',
+            *get_mp4_mux_args(output_format, options.get('mp4_mode')),
             output_path
         ])
         
-        # Execute ffmpeg command
-        result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, timeout=300)
-        
-        if result.returncode != 0:
-            raise Exception(f"FFmpeg error: {result.stderr}")
+        # NVENC first when the host has it; with no filters, decoded frames stay in GPU memory
+        ffmpeg_cmds = [ffmpeg_cmd]
+        nvenc_cmd = get_nvenc_command(ffmpeg_cmd, cuda_frames=True) if options.get('hardware_accel', 'auto') not in ('none', 'off') else None
+        if nvenc_cmd:
+            ffmpeg_cmds.insert(0, nvenc_cmd)
+        
+        # Fast cut: seek on the input and copy the streams without decoding anything. The cut snaps to
+        # the keyframe before start_time, so it is opt-in; encoding is the fallback when the output
+        # container can't hold the source codecs
+        if options.get('fast_cut'):
+            seek_args = ['-ss', str(start_time)] + (['-to', str(end_time)] if end_time else ['-t', str(duration)])
+            ffmpeg_cmds.insert(0, ['ffmpeg', '-y'] + seek_args + ['-i', input_path, '-c', 'copy',
+                                   '-avoid_negative_ts', 'make_zero',
+                                   *get_mp4_mux_args(output_format, options.get('mp4_mode')), output_path])
+        
+        # Execute ffmpeg command, keeping only the tail of its stderr
+        for attempt, ffmpeg_cmd in enumerate(ffmpeg_cmds, 1):
+            try:
+                run_ffmpeg(ffmpeg_cmd, timeout=300)
+                break
+            except subprocess.CalledProcessError as e:
+                if attempt == len(ffmpeg_cmds):
+                    raise Exception(f"FFmpeg error: {e.stderr}")
         
         return {
             'success': True,
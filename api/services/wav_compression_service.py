@@ -2,8 +2,20 @@ import os
 import subprocess
 import tempfile
 import shutil
+import wave
 from datetime import datetime
 
+# Copy buffer for saving the upload to disk (Werkzeug's default is 16 KiB)
+UPLOAD_COPY_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Output formats of a WAV compression: WAV resamples to PCM as before, FLAC is lossless at about half
+# the size, and Opus is lossy at the compression level's bitrate
+OUTPUT_FORMAT_CODECS = {
+    'wav': ['-c:a', 'pcm_s16le'],
+    'flac': ['-c:a', 'flac', '-compression_level', '8'],
+    'opus': ['-c:a', 'libopus']
+}
+
 def get_wav_compression_params(compression_level):
     """
     Get FFmpeg parameters based on compression level
@@ -37,6 +49,103 @@ def get_wav_compression_params(compression_level):
             'channels': '2'
         }
 
+def read_wav_format(path):
+    """Get (sample rate, channels, sample width in bytes) from a PCM WAV header, or None if it can't be read"""
+    try:
+        with wave.open(path, 'rb') as wav_file:
+            return wav_file.getframerate(), wav_file.getnchannels(), wav_file.getsampwidth()
+    except (wave.Error, EOFError, OSError):
+        return None
+
+def get_compress_options(input_body):
+    """Get (compression level, FFmpeg parameters, output format) from a compression request"""
+    compress_task = input_body.get('tasks', {}).get('compress', {})
+    options = compress_task.get('options', {})
+    compression_level = options.get('wav_compression_level', 'medium')
+    
+    # WAV unless the task asks for FLAC or Opus, which actually compress
+    output_format = (compress_task.get('output_format') or 'wav').lower()
+    if output_format not in OUTPUT_FORMAT_CODECS:
+        raise Exception(f"Unsupported output format: {output_format}. Supported formats: {', '.join(OUTPUT_FORMAT_CODECS)}")
+    return compression_level, get_wav_compression_params(compression_level), output_format
+
+def get_output_args(input_path, compression_params, output_format):
+    """Get the FFmpeg codec arguments that compress one input, skipping work the input doesn't need"""
+    # The WAV header says whether the input already has the target rate and channels
+    input_format = read_wav_format(input_path)
+    same_rate = input_format is not None and input_format[0] == int(compression_params['sample_rate'])
+    same_channels = input_format is not None and input_format[1] == int(compression_params['channels'])
+    
+    if output_format == 'wav' and same_rate and same_channels and input_format[2] == 2:
+        # Already 16-bit PCM at the target rate and channels: copy the samples without decoding
+        return ['-c:a', 'copy']
+    output_args = list(OUTPUT_FORMAT_CODECS[output_format])
+    if output_format == 'opus':
+        # Opus encodes at 48 kHz; the bitrate sets the size
+        output_args += ['-b:a', compression_params['bitrate']]
+    elif not same_rate:
+        output_args += ['-ar', compression_params['sample_rate']]
+    if not same_channels:
+        output_args += ['-ac', compression_params['channels']]
+    return output_args
+
+def get_output_filename(filename, output_format):
+    """Name of the compressed file for an upload"""
+    if output_format == 'wav':
+        return f"compressed_{filename}"
+    return f"compressed_{os.path.splitext(filename)[0]}.{output_format}"
+
+def run_compression(ffmpeg_cmd):
+    """Run a WAV compression command, raising with FFmpeg's stderr if it fails"""
+    print(f"FFmpeg command: {' '.join(ffmpeg_cmd)}")
+    
+    result = subprocess.run(
+        ffmpeg_cmd,
+        capture_output=True,
+        text=True,
+        timeout=300  # 5 minutes timeout
+    )
+    
+    if result.returncode != 0:
+        print(f"FFmpeg error: {result.stderr}")
+        raise Exception(f"FFmpeg compression failed: {result.stderr}")
+
+def publish_output(output_path, output_filename):
+    """Move a compressed file into static/audios, returning (download URL, file size)"""
+    # Check if output file exists and has size > 0
+    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        raise Exception("Compression failed - output file is empty or missing")
+    
+    # Create static directory if it doesn't exist
+    static_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'static', 'audios')
+    os.makedirs(static_dir, exist_ok=True)
+    
+    # Generate unique filename
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    unique_filename = f"wav_compressed_{timestamp}_{output_filename}"
+    final_path = os.path.join(static_dir, unique_filename)
+    
+    # Move compressed file to static directory
+    shutil.move(output_path, final_path)
+    
+    # Get file size
+    file_size = os.path.getsize(final_path)
+    
+    # Create download URL (use absolute URL for cross-domain requests)
+    # Try to get the base URL from the request context
+    try:
+        from flask import request
+        base_url = request.url_root.rstrip('/')
+        # Force HTTPS for ngrok URLs to avoid CORS redirect issues
+        if 'ngrok' in base_url and base_url.startswith('http://'):
+            base_url = base_url.replace('http://', 'https://')
+        download_url = f"{base_url}/static/audios/{unique_filename}"
+    except:
+        # Fallback to relative URL if request context is not available
+        download_url = f"/static/audios/{unique_filename}"
+    
+    return download_url, file_size
+
 def compress_wav(file, input_body):
     """
     Compress WAV audio files using FFmpeg
@@ -52,77 +161,26 @@ def compress_wav(file, input_body):
         # Create temporary directory for processing
         temp_dir = tempfile.mkdtemp()
         input_path = os.path.join(temp_dir, file.filename)
-        output_filename = f"compressed_{file.filename}"
-        output_path = os.path.join(temp_dir, output_filename)
-        
-        # Save uploaded file
-        file.save(input_path)
         
-        # Get compression options from input_body
-        tasks = input_body.get('tasks', {})
-        compress_task = tasks.get('compress', {})
-        options = compress_task.get('options', {})
+        # Get compression options from input_body, before the upload is written
+        compression_level, compression_params, output_format = get_compress_options(input_body)
         
-        # Get compression parameters
-        compression_level = options.get('wav_compression_level', 'medium')
-        compression_params = get_wav_compression_params(compression_level)
+        # Save uploaded file
+        file.save(input_path, buffer_size=UPLOAD_COPY_BUFFER_SIZE)
+        output_filename = get_output_filename(file.filename, output_format)
+        output_path = os.path.join(temp_dir, output_filename)
         
         # Build FFmpeg command for WAV compression
-        ffmpeg_cmd = [
-            'ffmpeg',
-            '-i', input_path,
-            '-c:a', 'pcm_s16le',  # WAV format
-            '-ar', compression_params['sample_rate'],
-            '-ac', compression_params['channels'],
+        ffmpeg_cmd = ['ffmpeg', '-i', input_path] + get_output_args(input_path, compression_params, output_format)
+        ffmpeg_cmd += [
             '-y',  # Overwrite output file
             output_path
         ]
         
-        print(f"FFmpeg command: {' '.join(ffmpeg_cmd)}")
-        
         # Execute FFmpeg command
-        result = subprocess.run(
-            ffmpeg_cmd,
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minutes timeout
-        )
-        
-        if result.returncode != 0:
-            print(f"FFmpeg error: {result.stderr}")
-            raise Exception(f"FFmpeg compression failed: {result.stderr}")
-        
-        # Check if output file exists and has size > 0
-        if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
-            raise Exception("Compression failed - output file is empty or missing")
-        
-        # Create static directory if it doesn't exist
-        static_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'static', 'audios')
-        os.makedirs(static_dir, exist_ok=True)
-        
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_filename = f"wav_compressed_{timestamp}_{output_filename}"
-        final_path = os.path.join(static_dir, unique_filename)
-        
-        # Move compressed file to static directory
-        shutil.move(output_path, final_path)
-        
-        # Get file size
-        file_size = os.path.getsize(final_path)
-        
-        # Create download URL (use absolute URL for cross-domain requests)
-        # Try to get the base URL from the request context
-        try:
-            from flask import request
-            base_url = request.url_root.rstrip('/')
-            # Force HTTPS for ngrok URLs to avoid CORS redirect issues
-            if 'ngrok' in base_url and base_url.startswith('http://'):
-                base_url = base_url.replace('http://', 'https://')
-            download_url = f"{base_url}/static/audios/{unique_filename}"
-        except:
-            # Fallback to relative URL if request context is not available
-            download_url = f"/static/audios/{unique_filename}"
+        run_compression(ffmpeg_cmd)
+        
+        download_url, file_size = publish_output(output_path, output_filename)
         
         # Prepare response data
         response_data = {
@@ -131,37 +189,119 @@ def compress_wav(file, input_body):
             'download_url': download_url,
             'export_url': download_url,
             'file_size': file_size,
-            'output_format': 'wav',
+            'output_format': output_format,
             'wav_compression_level': compression_level
         }
         
         print(f"WAV compression successful. Output format: {response_data['output_format']}")
         
-        # Clean up temporary directory
-        shutil.rmtree(temp_dir)
+        # Clean up temporary directory; the output was moved out, so only the upload is left
+        os.unlink(input_path)
+        os.rmdir(temp_dir)
         
         return response_data
         
     except subprocess.CalledProcessError as e:
         print(f"Subprocess error: {str(e)}")
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+        shutil.rmtree(temp_dir, ignore_errors=True)
         raise Exception(f"Compression process failed: {str(e)}")
         
     except subprocess.TimeoutExpired:
         print("Compression timeout")
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise Exception("Compression timed out")
+        
+    except FileNotFoundError:
+        print("FFmpeg not found")
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise Exception("FFmpeg is not installed or not in PATH")
+        
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise Exception(f"Compression failed: {str(e)}") 
+
+
+def compress_wav_batch(files, input_body):
+    """
+    Compress several WAV files with one FFmpeg process, one output per input
+    
+    Args:
+        files: Uploaded WAV files
+        input_body: JSON with compression options, applied to every file
+    
+    Returns:
+        dict: Result with success status and one download URL per file
+    """
+    if len(files) == 1:
+        return compress_wav(files[0], input_body)
+    
+    try:
+        # Create temporary directory for processing
+        temp_dir = tempfile.mkdtemp()
+        compression_level, compression_params, output_format = get_compress_options(input_body)
+        
+        # Uploads may share a name, so each gets its own subdirectory
+        ffmpeg_cmd = ['ffmpeg', '-y']
+        output_args = []
+        input_paths = []
+        outputs = []
+        for index, file in enumerate(files):
+            file_dir = os.path.join(temp_dir, str(index))
+            os.makedirs(file_dir)
+            input_path = os.path.join(file_dir, file.filename)
+            file.save(input_path, buffer_size=UPLOAD_COPY_BUFFER_SIZE)
+            input_paths.append(input_path)
+            
+            output_filename = get_output_filename(file.filename, output_format)
+            output_path = os.path.join(file_dir, output_filename)
+            ffmpeg_cmd += ['-i', input_path]
+            output_args += ['-map', f'{index}:a'] + get_output_args(input_path, compression_params, output_format) + [output_path]
+            outputs.append((output_path, f"{index}_{output_filename}"))
+        
+        # One process decodes and encodes every file, so FFmpeg starts up once for the batch
+        run_compression(ffmpeg_cmd + output_args)
+        
+        results = []
+        for output_path, output_filename in outputs:
+            download_url, file_size = publish_output(output_path, output_filename)
+            results.append({
+                'download_url': download_url,
+                'export_url': download_url,
+                'file_size': file_size
+            })
+        
+        response_data = {
+            'success': True,
+            'message': f'{len(files)} WAV files compressed successfully with {compression_level} compression level',
+            'download_url': results[0]['download_url'],
+            'export_url': results[0]['export_url'],
+            'files': results,
+            'output_format': output_format,
+            'wav_compression_level': compression_level
+        }
+        
+        print(f"WAV batch compression successful. Files: {len(files)}, output format: {output_format}")
+        
+        # Clean up temporary directory; the outputs were moved out, so only the uploads are left
+        for input_path in input_paths:
+            os.unlink(input_path)
+            os.rmdir(os.path.dirname(input_path))
+        os.rmdir(temp_dir)
+        
+        return response_data
+        
+    except subprocess.TimeoutExpired:
+        print("Compression timeout")
+        shutil.rmtree(temp_dir, ignore_errors=True)
         raise Exception("Compression timed out")
         
     except FileNotFoundError:
         print("FFmpeg not found")
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+        shutil.rmtree(temp_dir, ignore_errors=True)
         raise Exception("FFmpeg is not installed or not in PATH")
         
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-        raise Exception(f"Compression failed: {str(e)}") 
\ No newline at end of file
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise Exception(f"Compression failed: {str(e)}")
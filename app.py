@@ -1,5 +1,9 @@
 from flask import Flask, request, make_response, send_file, send_from_directory, jsonify
 from flask_cors import CORS
+try:
+    from flask_compress import Compress  # Response compression, optional
+except ImportError:
+    Compress = None
 from api.controller.video_to_video_controller import video_to_video_bp
 from api.controller.video_to_audio_controller import video_to_audio_bp
 from api.controller.audio_to_audio_controller import audio_to_audio_bp
@@ -18,10 +22,24 @@ from api.controller.jpeg_compression_controller import jpeg_compression_bp
 from api.controller.png_compression_controller import png_compression_bp
 from api.controller.pdf_compression_controller import pdf_compression_bp
 from api.controller.gif_compression_controller import gif_compression_bp
+from api.services.stream_upload_service import stage_stream_upload
 import os
+import stat
+import json
+import logging
 import mimetypes
+from urllib.parse import quote
 from flask import Response
 
+logger = logging.getLogger(__name__)
+
+# Log the details of requests arriving through ngrok (DEBUG_NGROK=1); off, requests skip the host check
+DEBUG_NGROK = os.environ.get('DEBUG_NGROK') == '1'
+NGROK_HOSTS = ('ngrok.io', 'ngrok-free.app', 'ngrok.app')
+if DEBUG_NGROK:
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.StreamHandler())
+
 app = Flask(__name__, static_folder=None, static_url_path=None)  # Disable default static serving
 # We'll handle static files through our custom routes
 app.config['STATIC_FOLDER'] = os.path.join(os.path.dirname(__file__), 'static')
@@ -33,13 +51,35 @@ app.config['FRONTEND_DIR'] = frontend_dist_dir if os.path.exists(os.path.join(fr
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB
 app.config['UPLOAD_FOLDER'] = app.config['STATIC_FOLDER']
 
+# Behind Apache (mod_xsendfile) or lighttpd, set USE_X_SENDFILE=1 so send_file answers with an
+# X-Sendfile header and the front end sends the bytes straight from disk, instead of a worker
+# streaming them through Python
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+
+# Behind nginx, set X_ACCEL_REDIRECT_PREFIX to an internal location aliasing static/ and have the proxy
+# mark the requests it forwards; downloads then return only an X-Accel-Redirect header and nginx sends
+# the file itself. Requests reaching Flask directly (no marker) still get the bytes from Python:
+#     location /_protected/ { internal; alias /app/static/; sendfile on; tcp_nopush on; }
+#     location / { proxy_pass http://127.0.0.1:5000; proxy_set_header X-Accel-Supported 1; }
+app.config['X_ACCEL_REDIRECT_PREFIX'] = os.environ.get('X_ACCEL_REDIRECT_PREFIX', '')
+
+# Compress JSON and HTML responses of 500+ bytes (gzip or brotli, as the client accepts). Media types
+# are left out: converted files are already compressed, and send_file responses stay direct
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html', 'text/css', 'application/javascript']
+app.config['COMPRESS_MIN_SIZE'] = 500
+app.config['COMPRESS_LEVEL'] = 4
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+if Compress:
+    Compress(app)
+
 # Initialize CORS with explicit configuration
 CORS(app, 
      origins=["*"],
      methods=["GET", "POST", "OPTIONS", "HEAD"],
      allow_headers=["*"],
      expose_headers=["Content-Disposition", "Content-Type"],
-     supports_credentials=False)
+     supports_credentials=False,
+     max_age=86400)
 
 # Error handler for file size limit exceeded
 @app.errorhandler(413)
@@ -59,35 +99,42 @@ def handle_ngrok_headers():
         return  # Continue with request
     
     # Add debug logging for ngrok requests
-    if any(host in request.host for host in ['ngrok.io', 'ngrok-free.app', 'ngrok.app']):
-        print(f"Ngrok request to: {request.method} {request.url}")
-        print(f"Headers: {dict(request.headers)}")
+    if DEBUG_NGROK and any(host in request.host for host in NGROK_HOSTS):
+        logger.debug("Ngrok request to: %s %s", request.method, request.url)
+        logger.debug("Headers: %s", dict(request.headers))
         
         # Check if this looks like ngrok's browser warning
         user_agent = request.headers.get('User-Agent', '')
         if 'Mozilla' in user_agent and request.method == 'GET' and not request.headers.get('ngrok-skip-browser-warning'):
-            print("Warning: This might be ngrok's browser warning page")
+            logger.debug("Warning: This might be ngrok's browser warning page")
     
     # Handle OPTIONS requests for CORS preflight
     if request.method == 'OPTIONS':
-        response = make_response()
+        response = app.response_class(status=204)  # No body: the canonical preflight answer
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS, HEAD'
-        response.headers['Access-Control-Allow-Headers'] = '*'
+        # Allow exactly the headers the browser asked about rather than '*', and let it cache the answer
+        # for a day, so each upload doesn't pay a preflight round trip first
+        response.headers['Access-Control-Allow-Headers'] = request.headers.get(
+            'Access-Control-Request-Headers', 'Content-Type, ngrok-skip-browser-warning')
+        response.headers['Access-Control-Max-Age'] = '86400'
         response.headers['ngrok-skip-browser-warning'] = 'true'
         return response
 
 @app.after_request
 def after_request(response):
     """Add headers to all responses"""
-    # Add ngrok header to skip browser warning
-    response.headers['ngrok-skip-browser-warning'] = 'true'
-    
-    # Ensure CORS headers are present for all responses
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS, HEAD'
-    response.headers['Access-Control-Allow-Headers'] = '*'
-    response.headers['Access-Control-Expose-Headers'] = 'Content-Disposition'
+    # Static files, downloads and preflights set their own CORS headers; stamping them again would
+    # only repeat or overwrite them (e.g. a download's exposed Content-Length)
+    if 'Access-Control-Allow-Origin' not in response.headers:
+        # Add ngrok header to skip browser warning
+        response.headers['ngrok-skip-browser-warning'] = 'true'
+        
+        # Ensure CORS headers are present for all responses
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS, HEAD'
+        response.headers['Access-Control-Allow-Headers'] = '*'
+        response.headers['Access-Control-Expose-Headers'] = 'Content-Disposition'
     
     # Only add cache control if it's not a download endpoint
     # Download endpoints set their own cache control headers
@@ -95,14 +142,19 @@ def after_request(response):
         response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
         response.headers['Pragma'] = 'no-cache'
         response.headers['Expires'] = '0'
+        # Nothing stores these responses, so validators for revalidating them are dead weight
+        response.headers.pop('ETag', None)
+        response.headers.pop('Last-Modified', None)
     
     return response
 
-# Test endpoint to verify CORS is working
+# Test endpoint to verify CORS is working; the body never changes, so it is encoded once
+_TEST_CORS_BODY = json.dumps({'message': 'CORS is working correctly!', 'status': 'success'}).encode()
+
 @app.route('/test-cors', methods=['GET'])
 def test_cors():
     """Test endpoint to verify CORS configuration"""
-    return {'message': 'CORS is working correctly!', 'status': 'success'}
+    return Response(_TEST_CORS_BODY, mimetype='application/json')
 
 @app.route('/test-static', methods=['GET'])
 def test_static():
@@ -267,11 +319,28 @@ def debug_request():
     }
 
 # Test download endpoints
+# Directory listings of test_download_endpoints by path, as (directory mtime, file names); adding or
+# removing a file changes the directory's mtime, so an unchanged mtime means the listing still holds
+_listing_cache = {}
+
+def _list_files(directory):
+    """Names of the regular files in a directory, or [] if it doesn't exist"""
+    try:
+        mtime = os.stat(directory).st_mtime_ns
+    except OSError:
+        return []
+    cached = _listing_cache.get(directory)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    # scandir knows each entry's type from the directory read, without a stat per file
+    with os.scandir(directory) as entries:
+        files = [entry.name for entry in entries if entry.is_file()]
+    _listing_cache[directory] = (mtime, files)
+    return files
+
 @app.route('/test/download-endpoints', methods=['GET'])
 def test_download_endpoints():
     """Test if download endpoints are working and list available files"""
-    static_dir = os.path.join(os.path.dirname(__file__), 'static')
-    
     result = {
         'endpoints': {
             'export': '/export/<file_type>/<filename>',
@@ -283,12 +352,7 @@ def test_download_endpoints():
     
     # Check each directory for available files
     for file_type in ['videos', 'images', 'audios', 'documents', 'gifs']:
-        directory = os.path.join(static_dir, file_type)
-        if os.path.exists(directory):
-            files = [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]
-            result['available_files'][file_type] = files
-        else:
-            result['available_files'][file_type] = []
+        result['available_files'][file_type] = _list_files(SERVED_FILE_DIRS[file_type])
     
     return jsonify(result)
 
@@ -314,53 +378,83 @@ def ngrok_download_file(file_type, filename):
     """Download files with ngrok-specific headers and optimizations"""
     return _serve_file(file_type, filename, as_attachment=True, ngrok_optimized=True)
 
-def _serve_file(file_type, filename, as_attachment=True, ngrok_optimized=False):
-    """Helper function to serve files with proper headers"""
-    static_dir = os.path.join(os.path.dirname(__file__), 'static')
+# Streaming upload for large video/audio files: the raw body (Content-Type: application/octet-stream,
+# filename in ?filename=) goes straight to disk without multipart parsing. Conversion endpoints then
+# take the returned upload_id form field in place of the file
+@app.route('/upload-stream/<kind>', methods=['POST'])
+def upload_stream(kind):
+    """Stage a raw video or audio upload for a later conversion request"""
+    if kind not in ('video', 'audio'):
+        return jsonify({'error': 'Invalid upload kind'}), 404
     
-    # Map file types to directories
-    type_mapping = {
-        'images': 'images',
-        'videos': 'videos', 
-        'audios': 'audios',
-        'documents': 'documents',
-        'gifs': 'gifs',
-        'archives': 'archives'
-    }
+    filename = request.args.get('filename') or request.headers.get('X-Filename')
+    try:
+        upload_id = stage_stream_upload(request.stream, filename)
+    except ValueError as e:
+        return jsonify({'error': 'Invalid upload', 'message': str(e)}), 400
     
-    if file_type not in type_mapping:
+    return jsonify({'success': True, 'upload_id': upload_id})
+
+# MIME types of the converters' usual outputs, looked up before falling back to the mimetypes registry
+EXT_MIME = {
+    '.mp4': 'video/mp4', '.webm': 'video/webm', '.mkv': 'video/x-matroska', '.mov': 'video/quicktime',
+    '.avi': 'video/x-msvideo', '.mp3': 'audio/mpeg', '.m4a': 'audio/mp4', '.aac': 'audio/aac',
+    '.wav': 'audio/wav', '.flac': 'audio/flac', '.ogg': 'audio/ogg', '.opus': 'audio/ogg',
+    '.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.webp': 'image/webp',
+    '.gif': 'image/gif', '.pdf': 'application/pdf', '.zip': 'application/zip'
+}
+
+# Directory of each file type served by the /export and /download routes
+SERVED_FILE_DIRS = {
+    file_type: os.path.join(os.path.dirname(__file__), 'static', file_type)
+    for file_type in ['images', 'videos', 'audios', 'documents', 'gifs', 'archives']
+}
+
+def _serve_file(file_type, filename, as_attachment=True, ngrok_optimized=False):
+    """Helper function to serve files with proper headers"""
+    directory = SERVED_FILE_DIRS.get(file_type)
+    if directory is None:
         return jsonify({'error': 'Invalid file type'}), 400
     
-    directory = os.path.join(static_dir, type_mapping[file_type])
-    file_path = os.path.join(directory, filename)
+    # A plain name only: no separators (the URL rule stops '/', not Windows' '\\') and no '..' or dotfiles
+    if os.sep in filename or (os.altsep and os.altsep in filename) or filename.startswith('.'):
+        return jsonify({'error': 'Invalid filename'}), 400
     
-    if not os.path.exists(file_path):
+    # One stat answers both "does it exist" and "is it a regular file"
+    file_path = os.path.join(directory, filename)
+    try:
+        is_file = stat.S_ISREG(os.stat(file_path).st_mode)
+    except OSError:
+        is_file = False
+    if not is_file:
         return jsonify({'error': 'File not found'}), 404
     
-    # Get file info
-    file_size = os.path.getsize(file_path)
-    
     # Detect MIME type
-    mime_type, _ = mimetypes.guess_type(filename)
+    mime_type = EXT_MIME.get(os.path.splitext(filename)[1].lower()) or mimetypes.guess_type(filename)[0]
     if not mime_type:
         mime_type = 'application/octet-stream'
     
     try:
-        # Create response
-        response = send_file(
-            file_path,
-            as_attachment=as_attachment,
-            download_name=filename,
-            mimetype=mime_type
-        )
+        accel_prefix = app.config['X_ACCEL_REDIRECT_PREFIX']
+        if accel_prefix and request.headers.get('X-Accel-Supported'):
+            # nginx sends the file from its internal location; the worker returns at once
+            response = Response('', mimetype=mime_type)
+            response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{file_type}/{quote(filename)}"
+        else:
+            # Create response
+            response = send_file(
+                file_path,
+                as_attachment=as_attachment,
+                download_name=filename,
+                mimetype=mime_type,
+                conditional=True  # Answer Range and If-None-Match, so downloads resume and players seek
+            )
         
-        # Add standard headers
-        response.headers['Content-Length'] = str(file_size)
+        # send_file sets Content-Length itself, for a range request too
         response.headers['Accept-Ranges'] = 'bytes'
         
         # Add ngrok-specific headers
         if ngrok_optimized:
-            response.headers['ngrok-skip-browser-warning'] = 'true'
             response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
             response.headers['Pragma'] = 'no-cache'
             response.headers['Expires'] = '0'
@@ -372,6 +466,7 @@ def _serve_file(file_type, filename, as_attachment=True, ngrok_optimized=False):
         # Add CORS headers for downloads
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Expose-Headers'] = 'Content-Disposition, Content-Length'
+        response.headers['ngrok-skip-browser-warning'] = 'true'
         
         return response
         
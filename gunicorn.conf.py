@@ -0,0 +1,26 @@
+# Gunicorn settings for serving the API in production:
+#     gunicorn -c gunicorn.conf.py wsgi:app
+# `python app.py` stays the development server.
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# Threaded workers: a download or a conversion waiting on FFmpeg holds a thread, not a process, and
+# send_file responses go out through the worker's sendfile path. Each process runs its own
+# MAX_CONCURRENT_ENCODES encodes, so keep the process count low and scale with threads
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# Conversions run for minutes (FFmpeg timeouts are 300-600 s)
+timeout = 600
+graceful_timeout = 60
+
+# Keep connections open between a conversion's upload and its download
+keepalive = 75
+# Connections a gthread worker keeps open at once, idle keep-alive ones included
+worker_connections = 1000
+
+# Worker heartbeats on tmpfs, so a busy disk can't make the arbiter think a worker hung
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'